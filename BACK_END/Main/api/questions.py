@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, File, UploadFile, BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
-import tempfile, shutil, os, json
+import tempfile, os, json
 from typing import List, Dict, Any, Optional
 from datetime import timedelta
 
 # Import dai moduli interni
 from Main.core.logger import logger
 from Main.core import config
+from Main.core.uploads import copy_upload
 from Main.api.auth import create_access_token, get_current_user
 from Main.api.routes_interview import load_script, SESSIONS
 from Main.api.models import QuestionResponse, ErrorResponse
@@ -27,10 +28,16 @@ async def load_questions(file: UploadFile = File(...), background_tasks: Optiona
         logger.info(f"User '{current_user}' is attempting to load questions from file: {file.filename}, type: {file.content_type}")
 
         # Salva il file caricato temporaneamente
+        # Copia a blocchi, con limite di dimensione (413 oltre MAX_QUESTIONS_UPLOAD_BYTES)
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp:
-            shutil.copyfileobj(file.file, tmp)
             tmp_path = tmp.name
-        logger.info(f"File temporaneo salvato in: {tmp_path}")
+            try:
+                size = await copy_upload(file, tmp, config.MAX_QUESTIONS_UPLOAD_BYTES)
+            except HTTPException:
+                tmp.close()
+                os.remove(tmp_path)
+                raise
+        logger.info(f"File temporaneo salvato in: {tmp_path} ({size} bytes)")
 
         # Carica le domande e genera i metadati usando QuestionImporter (supporta .docx, .csv, .xls, .json)
         try:
@@ -114,6 +121,9 @@ async def load_questions(file: UploadFile = File(...), background_tasks: Optiona
         logger.info(f"[DEBUG] Cookie 'token' impostato con valore (troncato): {updated_token[:20]}..., max_age={cookie_max_age}")
         logger.info(f"Domande caricate con successo per user '{current_user}'. Session token impostato.")
         return response
+    except HTTPException as he:
+        logger.error(f"Errore HTTP {he.status_code} durante il caricamento delle domande per user '{current_user}': {he.detail}")
+        return JSONResponse({"status": "error", "message": str(he.detail)}, status_code=he.status_code)
     except ValueError as ve:
         logger.error(f"Errore di validazione o importazione durante il caricamento delle domande per user '{current_user}': {ve}", exc_info=True)
         return JSONResponse({"status": "error", "message": str(ve)}, status_code=400)
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, Request, File, UploadFile, Form, Query, Cookie
+from fastapi import APIRouter, HTTPException, Depends, Request, File, UploadFile, Form, Query, Cookie, Header, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from typing import Dict, List, Any, Optional, Union
 import logging
 import uuid
@@ -6,6 +7,8 @@ from datetime import datetime
 
 
 
+import asyncio
+import math
 import json
 import tempfile
 import time
@@ -18,6 +21,19 @@ from Main.models import (
     InterviewQuestionResponse, InterviewResultResponse, AnswerRequest
 )
 from Main.application.interview_state_adapter_refactored import InterviewStateAdapter
+from Main.core.worker_state import (
+    DOMANDE, SCRIPT, SESSIONS, metadata_processing_status, publish_bank, save_state, sync_question_bank
+)
+from Main.core.session_locks import session_lock
+from Main.core.idempotency import TurnResultCache, completed_result, request_key, run_locked_turn, turn_marker
+from Main.core.admission import admit, slot as admission_slot, user_key as admission_user_key
+from Main.core import metrics
+from Main.core.turn_pipeline import StageTimings, run_in_background
+from Main.core.uploads import upload_digest
+from Main.services.incremental_transcriber import IncrementalTranscriber
+from Main.services.audio_processing import AudioSource, prepare_for_stt
+from Main.services.stt_scheduler import STTOverloadedError
+from Main.services.tts_service import get_polly_client, prefetch_speech, presynthesize, register_speech
 from .auth import get_current_user
 
 from fastapi.responses import JSONResponse
@@ -41,9 +57,8 @@ logger = logging.getLogger(__name__)
 # Router per l'intervista
 router = APIRouter(tags=["Interview"])
 
-SESSIONS: Dict[str, InterviewStateAdapter] = {}
-SCRIPT: List[Dict[str, Any]] = []
-DOMANDE = []
+# SESSIONS, SCRIPT, DOMANDE e metadata_processing_status sono in Main.core.worker_state
+# (condivisi tra worker con STATE_BACKEND=file) e vengono riesportati da qui
 METADATA_STATUS = {}
 
 try:
@@ -53,14 +68,48 @@ except ImportError:
     logger.warning("Non è stato possibile importare QuestionImporter")
     QuestionImporter = None
 
-metadata_processing_status = {
-    'total_questions': 0,
-    'processed_questions': 0,
-    'in_progress': False,
-    'start_time': None,
-    'end_time': None,
-    'error': None
-}
+# Risultati dei turni recenti, per rispondere ai reinvii senza rieseguirli
+TURN_RESULTS = TurnResultCache(config.IDEMPOTENCY_TTL_SECONDS)
+
+# Pre-sintesi dell'audio delle domande in corso (una sola: un nuovo script la sostituisce)
+_tts_presynthesis_stop: Optional[threading.Event] = None
+
+def start_tts_presynthesis(question_texts: List[str]) -> None:
+    """
+    Avvia in background la sintesi in cache dell'audio di tutte le domande,
+    così il primo candidato che arriva a una domanda la ascolta come un hit in cache.
+    L'avanzamento è in ``metadata_processing_status['tts_presynthesis']``.
+    """
+    global _tts_presynthesis_stop
+    if config.DEVELOPMENT_MODE or config.TTS_PRESYNTH_CONCURRENCY <= 0 or get_polly_client() is None:
+        return
+    if _tts_presynthesis_stop is not None:
+        _tts_presynthesis_stop.set()
+    stop = _tts_presynthesis_stop = threading.Event()
+    status = {'in_progress': True, 'total': 0, 'ready': 0, 'failed': 0,
+              'voices': config.TTS_PRESYNTH_VOICES, 'error': None}
+    metadata_processing_status['tts_presynthesis'] = status
+    last_publish = [0.0]
+
+    def progress(counts: Dict[str, int]) -> None:
+        status.update(total=counts['total'], ready=counts['cached'] + counts['synthesized'], failed=counts['failed'])
+        # Pubblica al più una volta al secondo: le frasi possono essere centinaia
+        if time.monotonic() - last_publish[0] >= 1.0:
+            last_publish[0] = time.monotonic()
+            publish_bank()
+
+    def run() -> None:
+        try:
+            counts = presynthesize(question_texts, config.TTS_PRESYNTH_VOICES, progress, stop)
+            logger.info(f"Pre-sintesi TTS completata: {counts}")
+        except Exception as e:
+            status['error'] = str(e)
+            logger.error(f"Errore nella pre-sintesi TTS delle domande: {e}")
+        finally:
+            status['in_progress'] = False
+            publish_bank()
+
+    threading.Thread(target=run, daemon=True).start()
 
 def get_state(uid: str) -> InterviewStateAdapter:
     """
@@ -72,6 +121,7 @@ def get_state(uid: str) -> InterviewStateAdapter:
     Returns:
         Istanza di InterviewState
     """
+    sync_question_bank()
     if uid not in SESSIONS:
         current_script_for_session = SCRIPT
         if not current_script_for_session:
@@ -89,6 +139,51 @@ def get_state(uid: str) -> InterviewStateAdapter:
     
     return SESSIONS[uid]
 
+async def run_idempotent_turn(user_id: str, idempotency_key: Optional[str], payload: bytes, turn, prepare=None) -> Any:
+    """
+    Esegue un turno una sola volta per richiesta, serializzato con il lock di sessione.
+
+    Args:
+        user_id: ID dell'utente
+        idempotency_key: Chiave inviata dal client (header ``Idempotency-Key`` o campo form)
+        payload: Contenuto della risposta, usato per derivare la chiave se il client non la invia
+        turn: Coroutine function che esegue il turno con il lock di sessione acquisito;
+            con ``prepare`` riceve il suo risultato
+        prepare: Coroutine function opzionale eseguita prima, senza lock (es. la trascrizione finale)
+
+    Returns:
+        Il risultato del turno, o quello del turno originale per un reinvio
+    """
+    marker = turn_marker(idempotency_key, payload)
+
+    async def once():
+        if prepare is None:
+            locked = turn
+        else:
+            # Reinvio di un turno già completato: niente lavoro preliminare
+            done = completed_result(get_state(user_id), marker, config.IDEMPOTENCY_TTL_SECONDS)
+            if done is not None:
+                metrics.increment("idempotent_replays")
+                return done
+            prepared = await prepare()
+
+            async def locked():
+                return await turn(prepared)
+        return await run_locked_turn(SESSIONS, user_id, marker, lambda: get_state(user_id), save_state,
+                                     locked, config.IDEMPOTENCY_TTL_SECONDS)
+
+    # I duplicati in corso attendono il turno originale (in questo processo); i
+    # reinvii dopo la fine ricevono il risultato salvato sulla sessione
+    if idempotency_key:
+        return await TURN_RESULTS.run(f"{user_id}:key:{idempotency_key}", once)
+
+    # Senza chiave: hash del contenuto + numero di turno della sessione. Vale solo
+    # per il turno corrente: la risposta successiva può avere gli stessi byte
+    # (un "sì" breve, il silenzio rimasto dopo la VAD) ed è una risposta nuova
+    session_turn = getattr(get_state(user_id), "turn_count", 0)
+    return await TURN_RESULTS.run(request_key(user_id, payload, session_turn), once)
+
+
 def has_active_session(uid: str) -> bool:
     """Verifica se esiste una sessione attiva per l'utente."""
     return uid in SESSIONS
@@ -118,7 +213,6 @@ def load_script(new_script: List[Dict[str, Any]]) -> bool:
     Carica un nuovo script globale e avvia l'elaborazione asincrona dei metadati.
     Popola la struttura DOMANDE con le domande e i relativi metadati man mano che vengono elaborati.
     """
-    global SCRIPT
     global DOMANDE  # Nuova struttura globale
     global metadata_processing_status
     
@@ -153,7 +247,7 @@ def load_script(new_script: List[Dict[str, Any]]) -> bool:
             return False
             
         # Assegna subito gli elementi validi per renderli disponibili immediatamente sia in SCRIPT che in DOMANDE
-        SCRIPT = valid_items  # Manteniamo SCRIPT per retrocompatibilità
+        SCRIPT[:] = valid_items  # Manteniamo SCRIPT per retrocompatibilità
         print("QUELLO CHE CI SERVE:",type(SCRIPT))
         
         # Inizializza DOMANDE con solo il testo delle domande (i metadati verranno aggiunti dopo)
@@ -171,6 +265,12 @@ def load_script(new_script: List[Dict[str, Any]]) -> bool:
             }
             DOMANDE.append(q_struct)
         
+        # Rende subito disponibili le domande anche agli altri worker
+        publish_bank()
+
+        # L'audio delle domande viene preparato in cache mentre si generano i metadati
+        start_tts_presynthesis([q['testo'] for q in DOMANDE])
+        
         # Stampa dettagli per debug
         logger.info(f"Nuovo script caricato con {len(valid_items)} domande valide su {len(new_script)} fornite.")
         
@@ -266,6 +366,7 @@ def load_script(new_script: List[Dict[str, Any]]) -> bool:
                                 
                                 # Aggiornamento contatore
                                 metadata_processing_status['processed_questions'] += 1
+                                publish_bank()
                                 
                                 # Breve pausa per non sovraccaricare il sistema
                                 time.sleep(0.01)
@@ -273,6 +374,7 @@ def load_script(new_script: List[Dict[str, Any]]) -> bool:
                         # Aggiornamento stato finale
                         metadata_processing_status['in_progress'] = False
                         metadata_processing_status['end_time'] = datetime.now()
+                        publish_bank()
                         logger.info(f"Completata generazione metadati per {len(question_metas)} domande")
                         
                         # Salva i metadati in un file JSON per visualizzazione
@@ -289,6 +391,7 @@ def load_script(new_script: List[Dict[str, Any]]) -> bool:
                             logger.error(f"Errore nel salvataggio dei metadati in file JSON: {e}")
                     except Exception as e:
                         metadata_processing_status['error'] = str(e)
+                        publish_bank()
                         logger.error(f"Errore nella generazione dei metadati con QuestionImporter: {e}")
                     finally:
                         # Pulizia del file temporaneo
@@ -375,6 +478,7 @@ async def get_next_question(interview_id: str) -> Dict[str, Any]:
     if all_questions_asked:
         # Segna l'intervista come completata
         session.completed = True
+        save_state(session)
         # Restituisci una risposta di completamento invece di un errore
         return InterviewQuestionResponse(
             status="completed",
@@ -415,6 +519,7 @@ async def get_next_question(interview_id: str) -> Dict[str, Any]:
     if not question or "id" not in question:
         # Tutte le domande sono state poste, segna l'intervista come completata
         session.completed = True
+        save_state(session)
         raise HTTPException(
             status_code=410,  # Gone - risorsa non più disponibile 
             detail="Tutte le domande sono state poste. L'intervista è completata."
@@ -432,12 +537,27 @@ async def get_next_question(interview_id: str) -> Dict[str, Any]:
 @router.post("/submit-answer/{interview_id}/{question_id}", response_model=InterviewResponse, responses={
     404: {"model": ErrorResponse},
     400: {"model": ErrorResponse}
-})
-async def submit_answer(interview_id: str, question_id: str, answer: AnswerRequest) -> InterviewResponse:
-    """Invia una risposta a una domanda dell'intervista"""
+}, dependencies=[Depends(admit("turn"))])
+async def submit_answer(
+    interview_id: str,
+    question_id: str,
+    answer: AnswerRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+) -> InterviewResponse:
+    """Invia una risposta a una domanda dell'intervista (i reinvii della stessa risposta non la registrano due volte)"""
     # Recupera l'utente associato all'intervista
     user_id = config.DEV_USERNAME  # Default per sviluppo
     
+    async def turn():
+        # Eseguito con il lock di sessione: le risposte alla stessa sessione vengono elaborate una alla volta
+        return await _submit_answer_turn(user_id, interview_id, question_id, answer)
+
+    payload = f"{question_id}\n{answer.answer_text}".encode("utf-8")
+    return await run_idempotent_turn(user_id, idempotency_key, payload, turn)
+
+
+async def _submit_answer_turn(user_id: str, interview_id: str, question_id: str, answer: AnswerRequest) -> InterviewResponse:
+    """Registra la risposta testuale sulla sessione (chiamata con il lock di sessione acquisito)."""
     # Ottieni lo stato dell'intervista
     session = get_state(user_id)
     
@@ -469,7 +589,7 @@ async def submit_answer(interview_id: str, question_id: str, answer: AnswerReque
     logger.debug(f">>>>>>>> SESSION: {session}")
     # Salva la risposta utilizzando l'adapter
     # DA VECCHIO interview_state_adapter
-    needed_followup, coverage, missing_topics = session.save_answer(answer.answer_text)
+    needed_followup, coverage, missing_topics = await asyncio.to_thread(session.save_answer, answer.answer_text)
 
     """if len(missing_topics)==0:
         self.questions= self.questions.pop(0) TODO"""
@@ -483,6 +603,7 @@ async def submit_answer(interview_id: str, question_id: str, answer: AnswerReque
     # Se non sono necessari follow-up, possiamo avanzare alla domanda successiva
     if not needed_followup:
         session.advance_to_next_question(session)
+    save_state(session)
     
     return InterviewResponse(
         status="success",
@@ -546,6 +667,7 @@ async def end_interview(interview_id: str) -> InterviewResultResponse:
     # Assegna un punteggio fittizio (in una versione reale, questo verrebbe calcolato in base alle risposte)
     import random
     session.score = random.randint(60, 100)
+    save_state(session)
     
     # In una versione reale, qui salveremmo il risultato finale nel database
     if not config.DEVELOPMENT_MODE and config.MONGODB_ENABLED:
@@ -566,182 +688,211 @@ async def end_interview(interview_id: str) -> InterviewResultResponse:
         answers_provided=len(session.answers)
     )
 
-@router.post("/transcribe", response_model=Dict[str, Any])
+@router.post("/transcribe", response_model=Dict[str, Any], dependencies=[Depends(admit("turn"))])
 async def transcribe_audio(
     audio: UploadFile = File(...),
     user_id: str = Form(...),
     audio_only: bool = Form(False),
-    token_query: Optional[str] = Form(None)
+    token_query: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Form(None),
+    idempotency_header: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Riceve un file audio di risposta, simula una trascrizione (per ora), e restituisce la prossima domanda come audio.
+    I turni della stessa sessione vengono serializzati; un reinvio della stessa
+    risposta (stessa chiave di idempotenza o stesso audio nello stesso turno)
+    riceve il risultato del turno originale.
     """
+    logger.info(f"Ricevuto file audio da utente: {user_id}, dimensione: {audio.size} bytes")
+    # L'audio resta nello spool dell'upload e viene letto a blocchi (dimensione già
+    # limitata da UploadLimitMiddleware); per l'idempotenza basta il suo hash
+    digest = await upload_digest(audio)
+
+    async def turn():
+        return await _transcribe_turn(audio.file, user_id)
+
+    return await run_idempotent_turn(user_id, idempotency_key or idempotency_header, digest.encode(), turn)
+
+
+async def _transcribe_turn(audio_content: AudioSource, user_id: str) -> Dict[str, Any]:
+    """Esegue un turno di /transcribe: trascrizione, analisi della risposta e prossima domanda."""
+    timings = StageTimings()
+    # Silenzio rimosso e conversione in Opus mono 16 kHz prima dello STT;
+    # una registrazione senza voce non viene trascritta
+    with timings.stage("prepare_audio"):
+        audio_content = await prepare_for_stt(audio_content)
+    if audio_content is None:
+        return await _clarification_turn(user_id)
+    with timings.stage("stt"):
+        transcription = await _transcribe_answer(audio_content)
+    return await _answer_turn(transcription, user_id, timings)
+
+
+async def _clarification_turn(user_id: str) -> Dict[str, Any]:
+    """Risposta senza voce: chiede al candidato di ripetere, senza registrare la risposta."""
+    from Main.services.llm_service import generate_llm_clarification_request
+
+    session = get_state(user_id)
+    question_data = session.get_current_question() or {}
+    message = await generate_llm_clarification_request(question_data.get("text", ""))
+    audio_id = await register_speech(message, "Bianca")
+    return {
+        "status": "success",
+        "message": "Nessuna voce rilevata nella risposta",
+        "transcription": "",
+        "audio_content": "",
+        "text": message,
+        "audio_url": f"/tts/audio/{audio_id}",
+        "audio_id": audio_id,
+        "type": "clarification",
+        "question_id": question_data.get("id", "")
+    }
+
+
+async def _transcribe_answer(audio_content: bytes) -> str:
+    """Trascrive l'audio di una risposta (o di un suo segmento) con il backend STT configurato."""
     try:
-        logger.info(f"Ricevuto file audio da utente: {user_id}, dimensione: {audio.size} bytes")
+        logger.debug(f"Audio ricevuto: {len(audio_content)} bytes")
         
-        # Trascriviamo l'audio usando il servizio OpenAI Whisper
-        try:
-            # Leggiamo il contenuto del file audio
-            audio_content = await audio.read()
-            logger.debug(f"Audio ricevuto: {len(audio_content)} bytes")
-            
-            # Importiamo il servizio di trascrizione
-            from Main.services.whisper_service import speech_to_text_openai
-            
-            # Verifichiamo se siamo in modalità di sviluppo
-            if config.DEVELOPMENT_MODE:
-                logger.warning("DEVELOPMENT_MODE attivo: utilizzo trascrizione simulata")
-                transcription = "Risposta simulata dell'utente"
-            else:
-                logger.info("Trascrizione con OpenAI Whisper in corso...")
-                transcription = await speech_to_text_openai(audio_content)
-                logger.info(f"Trascrizione completata: {transcription[:100]}...")
-        except Exception as e:
-            logger.error(f"Errore durante la trascrizione: {e}", exc_info=True)
-            # Fallback alla trascrizione simulata in caso di errore
-            transcription = "Risposta simulata (errore trascrizione)"
-            logger.warning(f"Utilizzata trascrizione fallback: {transcription}")
+        # Importiamo il servizio di trascrizione (backend scelto con STT_BACKEND)
+        from Main.services.stt_backends import speech_to_text
         
+        # Verifichiamo se siamo in modalità di sviluppo
+        if config.DEVELOPMENT_MODE:
+            logger.warning("DEVELOPMENT_MODE attivo: utilizzo trascrizione simulata")
+            transcription = "Risposta simulata dell'utente"
+        else:
+            logger.info(f"Trascrizione con backend '{config.STT_BACKEND}' in corso...")
+            transcription = await speech_to_text(audio_content)
+            logger.info(f"Trascrizione completata: {transcription[:100]}...")
+    except STTOverloadedError as e:
+        # Servizio saturo: meglio un rifiuto rapido che una trascrizione simulata
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servizio di trascrizione sovraccarico: {e}",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except Exception as e:
+        logger.error(f"Errore durante la trascrizione: {e}", exc_info=True)
+        # Fallback alla trascrizione simulata in caso di errore
+        transcription = "Risposta simulata (errore trascrizione)"
+        logger.warning(f"Utilizzata trascrizione fallback: {transcription}")
+    return transcription
+
+
+async def _answer_turn(transcription: str, user_id: str, timings: Optional[StageTimings] = None) -> Dict[str, Any]:
+    """
+    Registra la risposta trascritta e prepara la prossima domanda (con il lock di sessione acquisito).
+
+    Sul percorso critico restano solo l'analisi della risposta (da cui dipende la
+    prossima domanda) e il salvataggio dello stato. La sintesi audio della
+    prossima domanda parte appena il testo è noto; riflessione e log di debug
+    della sessione vengono eseguiti dopo la risposta.
+    """
+    timings = timings or StageTimings()
+    try:
         # Recupera la sessione dell'utente
         session = get_state(user_id)
-        print()
         logger.info(f"Sessione recuperata per {user_id}: {session.session_id}")
-        
-        # Salviamo la risposta dell'utente
-        #from Main.application.interview_state_adapter import save_answer, advance_to_next_question
-        #from Main.application.interview_state_adapter_refactored import save_answer, advance_to_next_question
-        
-        # Aumento del livello di log globale per debug
-        import logging
-        root_logger = logging.getLogger()
-        previous_level = root_logger.level
-        root_logger.setLevel(logging.DEBUG)
 
-        logger.debug(f"SESSION PRIMA DI SAVE ANSWER: {session}")
-        
         try:
             # Salviamo la risposta e verifichiamo se è necessario un follow-up
             # NOTA: save_answer internamente avanza già alla prossima domanda se necessario
             # e restituisce i valori in quest'ordine: (needs_followup, coverage_percent, missing_topics)
-            needed_followup, coverage, missing_topics = session.save_answer(transcription)
-            logger.info(f"ANALISI RISPOSTA: needed_followup={needed_followup}, coverage={coverage:.1f}%, missing_topics={missing_topics}")            
-            
-            logger.debug("TO STRING DOPO LA RISPOSTA")
-            print(session.to_string())
-            
-            # Verifichiamo i metadati della domanda corrente
-            if hasattr(session, 'current_topic') and session.current_topic:
-                print()
-                logger.debug(f"Metadati domanda: topic={session.current_topic}, subtopics={session.current_subtopics}")
-                if hasattr(session, 'current_keywords') and session.current_keywords:
-                    print()
-                    logger.debug(f"Keywords domanda: {session.current_keywords}")
-            print()
+            # save_answer esegue chiamate LLM sincrone: in un thread per non bloccare le altre sessioni
+            with timings.stage("analysis"):
+                needed_followup, coverage, missing_topics = await asyncio.to_thread(session.save_answer, transcription)
+            logger.info(f"ANALISI RISPOSTA: needed_followup={needed_followup}, coverage={coverage:.1f}%, missing_topics={missing_topics}")
+
             # Se è richiesto un follow-up, la domanda successiva sarà di tipo follow-up
             # altrimenti procediamo con la domanda successiva dello script
+            # NOTA: l'avanzamento alla prossima domanda è gestito internamente da save_answer
             if needed_followup:
                 follow_up_subtopic = getattr(session, 'current_question_is_follow_up_for_subtopic', 'attributo non disponibile')
                 logger.info(f"Domanda di follow-up necessaria per subtopic: {follow_up_subtopic}")
-                print()
             else:
                 logger.info("Nessun follow-up necessario, procedo con la prossima domanda")
-                # NOTA: L'avanzamento alla prossima domanda ora viene gestito internamente
-                # nella funzione save_answer, quindi non è più necessario chiamare next_question qui
         except Exception as e:
-            print("This error:", e)
-        finally:
-            # Ripristiniamo il livello di log precedente
-            root_logger.setLevel(previous_level)
-        
+            logger.error(f"Errore nell'analisi della risposta: {e}", exc_info=True)
+
         # Ottieni la prossima domanda (se c'è)
         next_question = None
-        
-        # Otteniamo la domanda corrente dalla sessione
-        #from Main.application.interview_state_adapter import get_current_question
-        #from Main.application.interview_state_adapter_refactored import get_current_question
-        
+
         # Recuperiamo i dati della domanda corrente
-        try:
-            # Verifichiamo se la domanda è di tipo follow-up
-            is_follow_up = hasattr(session, 'current_question_is_follow_up_for_subtopic') and session.current_question_is_follow_up_for_subtopic is not None
-            
-            # Recuperiamo la domanda corrente (che può essere una domanda principale o un follow-up)
-            question_data = session.get_current_question()
-            logger.debug(f"Question data recuperati: {question_data}")
-            
-            if question_data and 'text' in question_data:
-                next_question = {
-                    'id': question_data.get('id', 'q1'),
-                    'Domanda': question_data.get('text', ''),
-                    'is_follow_up': is_follow_up
-                }
-                logger.info(f"Prossima domanda ({'FOLLOW-UP' if is_follow_up else 'PRINCIPALE'}): {next_question['Domanda'][:50]}...")
-                
-                if is_follow_up:
-                    subtopic = getattr(session, 'current_question_is_follow_up_for_subtopic', 'attributo non disponibile')
-                    logger.info(f"Domanda di follow-up per subtopic: {subtopic}")
-            else:
-                logger.warning("Nessuna domanda disponibile dalla sessione")
+        with timings.stage("next_question"):
+            try:
+                # Verifichiamo se la domanda è di tipo follow-up
+                is_follow_up = hasattr(session, 'current_question_is_follow_up_for_subtopic') and session.current_question_is_follow_up_for_subtopic is not None
+
+                # Recuperiamo la domanda corrente (che può essere una domanda principale o un follow-up)
+                question_data = session.get_current_question()
+                logger.debug(f"Question data recuperati: {question_data}")
+
+                if question_data and 'text' in question_data:
+                    next_question = {
+                        'id': question_data.get('id', 'q1'),
+                        'Domanda': question_data.get('text', ''),
+                        'is_follow_up': is_follow_up
+                    }
+                    logger.info(f"Prossima domanda ({'FOLLOW-UP' if is_follow_up else 'PRINCIPALE'}): {next_question['Domanda'][:50]}...")
+
+                    if is_follow_up:
+                        subtopic = getattr(session, 'current_question_is_follow_up_for_subtopic', 'attributo non disponibile')
+                        logger.info(f"Domanda di follow-up per subtopic: {subtopic}")
+                else:
+                    logger.warning("Nessuna domanda disponibile dalla sessione")
+                    next_question = None
+            except Exception as e:
+                logger.error(f"Errore nel recupero della domanda corrente: {e}")
                 next_question = None
-        except Exception as e:
-            logger.error(f"Errore nel recupero della domanda corrente: {e}")
-            next_question = None
-        
+
+        # Il testo da leggere è noto: la sintesi parte subito, prima che il client la chieda
+        voice = "Bianca"  # Usa la voce italiana predefinita per il TTS interno
+        if next_question:
+            question_text = next_question.get('Domanda', 'Non ci sono altre domande disponibili.')
+        else:
+            question_text = "Non ci sono altre domande disponibili. L'intervista è terminata."
+        prefetch_speech(question_text, voice)
+
+        with timings.stage("save_state"):
+            save_state(session)
+        # Riflessione e dump della sessione non servono alla prossima domanda
+        run_in_background("reflection", _after_turn(user_id))
+
+        # Non generiamo audio qui: il client lo chiede all'endpoint TTS interno per ID,
+        # senza il testo della domanda nell'URL
+        logger.info(f"Utilizzo TTS interno per il testo: '{question_text[:50]}...' con voce {voice}")
+        audio_id = await register_speech(question_text, voice)
+        tts_url = f"/tts/audio/{audio_id}"
+
         # Se non ci sono domande disponibili, usa una risposta generica
         if not next_question:
             logger.warning(f"Nessuna domanda disponibile per l'utente: {user_id}")
-            generic_response = "Non ci sono altre domande disponibili. L'intervista è terminata."
-            
-            # Non generiamo più l'audio direttamente qui, utilizziamo solo l'endpoint TTS interno
-            voice = "Bianca"  # Usa la voce italiana predefinita per il TTS interno
-            logger.info(f"Utilizzo TTS interno per il testo: '{generic_response[:50]}...' con voce {voice}")
-            
-            # Non generiamo più audio qui, solo l'URL per il TTS
-            audio_content = ""  # Nessun audio embedded
-            
-            # Prepariamo l'URL per il TTS con i parametri necessari
-            encoded_text = urllib.parse.quote(generic_response)
-            tts_url = f"/tts/speak?voice_id={voice}&text={encoded_text}"
-            
             return {
                 "status": "end",
                 "message": "Intervista terminata",
-                "audio_content": audio_content,
-                "text": generic_response,
+                "audio_content": "",
+                "text": question_text,
                 "audio_url": tts_url,
-                "type": "end"
+                "audio_id": audio_id,
+                "type": "end",
+                "timings": timings.as_dict()
             }
-        
-        # Altrimenti, prepara la prossima domanda
-        question_text = next_question.get('Domanda', 'Non ci sono altre domande disponibili.')
-        
-        # Non generiamo più l'audio direttamente qui, utilizziamo solo l'endpoint TTS interno
-        voice = "Bianca"  # Usa la voce italiana predefinita per il TTS interno
-        logger.info(f"Utilizzo TTS interno per il testo: '{question_text[:50]}...' con voce {voice}")
-        
-        # Non generiamo audio qui
-        audio_content = ""  # Nessun audio embedded
-        
-        # Prepariamo l'URL per il TTS con i parametri necessari
-        encoded_text = urllib.parse.quote(question_text)
-        tts_url = f"/tts/speak?voice_id={voice}&text={encoded_text}"
-
 
-        
         # Prepara la risposta
-        response = {
+        return {
             "status": "success",
             "message": "Audio processato con successo",
             "transcription": transcription,
-            "audio_content": audio_content,
+            "audio_content": "",  # Nessun audio embedded
             "text": question_text,
             "audio_url": tts_url,
+            "audio_id": audio_id,
             "type": "question",
-            "question_id": next_question.get('id', '')
+            "question_id": next_question.get('id', ''),
+            "timings": timings.as_dict()
         }
-        
-        return response
-        
+
     except Exception as e:
         logger.error(f"Errore nella trascrizione dell'audio: {e}", exc_info=True)
         raise HTTPException(
@@ -750,6 +901,102 @@ async def transcribe_audio(
         )
 
 
+async def _after_turn(user_id: str) -> None:
+    """Lavoro del turno fuori dal percorso critico: riflessione rimandata e log della sessione."""
+    async with session_lock(user_id, SESSIONS):
+        session = get_state(user_id)
+        snapshot = session.deferred_reflection_snapshot()
+    if snapshot is not None:
+        # La chiamata LLM (sincrona, in un thread) avviene senza lock: il turno
+        # successivo della sessione non la attende. Il risultato si unisce poi
+        # allo stato corrente, riletto sotto il lock
+        summary = await asyncio.to_thread(session.summarize_reflection, snapshot)
+        async with session_lock(user_id, SESSIONS):
+            session = get_state(user_id)
+            if session.merge_deferred_reflection(snapshot, summary):
+                save_state(session)
+
+    if logger.isEnabledFor(logging.DEBUG):
+        async with session_lock(user_id, SESSIONS):
+            session = get_state(user_id)
+            logger.debug(f"Sessione dopo il turno:\n{session.to_string()}")
+            if getattr(session, 'current_topic', None):
+                logger.debug(f"Metadati domanda: topic={session.current_topic}, subtopics={session.current_subtopics}, "
+                             f"keywords={getattr(session, 'current_keywords', None)}")
+
+
+@router.websocket("/transcribe/stream")
+async def transcribe_stream(websocket: WebSocket, user_id: str = Query(...)):
+    """
+    Variante in streaming di /transcribe.
+
+    Il client invia i chunk audio di MediaRecorder come messaggi binari mentre
+    il candidato parla, poi un messaggio di testo ``{"event": "end"}``
+    (eventualmente con ``idempotency_key``). I segmenti già completati vengono
+    trascritti durante la registrazione; dopo la fine resta solo l'ultimo.
+    La risposta finale ha lo stesso formato di /transcribe.
+    """
+    await websocket.accept()
+    try:
+        transcriber = IncrementalTranscriber(_transcribe_answer, incremental=not config.DEVELOPMENT_MODE)
+        end_message: Dict[str, Any] = {}
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    logger.info(f"Client {user_id} disconnesso prima della fine della risposta")
+                    transcriber.cancel()
+                    return
+                if message.get("bytes"):
+                    transcriber.feed(message["bytes"])
+                    if transcriber.size > config.MAX_AUDIO_UPLOAD_BYTES:
+                        metrics.increment("upload_rejected_too_large")
+                        raise HTTPException(status_code=413, detail="Risposta audio troppo lunga")
+                elif message.get("text"):
+                    end_message = json.loads(message["text"])
+                    if end_message.get("event") == "end":
+                        break
+        except BaseException:
+            transcriber.cancel()
+            raise
+
+        audio_content = transcriber.audio
+        logger.info(f"Risposta in streaming da {user_id}: {len(audio_content)} bytes, "
+                    f"{transcriber.segments_started} segmenti già avviati")
+
+        timings = StageTimings()
+
+        async def finish():
+            # Ultimo segmento trascritto senza lock di sessione
+            with metrics.timed("transcribe_stream_final_seconds"), timings.stage("stt"):
+                return await transcriber.finish()
+
+        async def turn(transcription):
+            if not transcription.strip():
+                return await _clarification_turn(user_id)
+            return await _answer_turn(transcription, user_id, timings)
+
+        try:
+            # Lo slot del turno si prende solo a fine risposta: mentre il candidato
+            # parla la connessione non occupa capacità (i segmenti passano dallo
+            # scheduler STT)
+            with admission_slot("turn", admission_user_key(websocket)):
+                result = await run_idempotent_turn(user_id, end_message.get("idempotency_key"), audio_content, turn,
+                                                   prepare=finish)
+        finally:
+            # Un reinvio servito dalla cache (o un turno rifiutato) non attende i segmenti avviati
+            transcriber.cancel()
+        await websocket.send_json(jsonable_encoder(result))
+        await websocket.close()
+    except HTTPException as e:
+        # Quote esaurite o errore del turno: il client ricade sull'upload classico
+        await websocket.send_json({"status": "error", "code": e.status_code, "detail": e.detail})
+        close_codes = {429: 1013, 503: 1013, 413: 1009}
+        await websocket.close(code=close_codes.get(e.status_code, 1011))
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket di {user_id} chiuso durante il turno")
+
+
 @router.get("/first_prompt", response_model=Dict[str, Any], responses={
     401: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
@@ -833,24 +1080,26 @@ async def get_first_prompt(
         
         # Ottieni la sessione dell'utente o creane una nuova
         logger.info(f"Recupero sessione per user_id: {current_user}")
-        session = get_state(current_user)
+        async with session_lock(current_user, SESSIONS):
+            session = get_state(current_user)
         
-        # Controlla se le domande sono state caricate
-        if not session.questions or len(session.questions) == 0:
-            # Se non ci sono domande nella sessione, verifica se ci sono domande globali in SCRIPT
-            if SCRIPT and len(SCRIPT) > 0:
-                logger.info(f"Nessuna domanda nella sessione, ma SCRIPT globale ha {len(SCRIPT)} domande. Le uso per questa sessione.")
-                session.questions = SCRIPT  # Copia le domande globali nella sessione
-            else:
-                logger.info(f"Nessuna domanda caricata per user: {current_user}, restituisco messaggio informativo")
-                return {
-                    "message": "Nessuna domanda caricata. Caricare le domande prima di iniziare il colloquio.",
-                    "audio_url": None,
-                    "question_text": "Nessuna domanda disponibile",
-                    "question_type": "info",
-                    "question_index": 0,
-                    "questions_loaded": False
-                }
+            # Controlla se le domande sono state caricate
+            if not session.questions or len(session.questions) == 0:
+                # Se non ci sono domande nella sessione, verifica se ci sono domande globali in SCRIPT
+                if SCRIPT and len(SCRIPT) > 0:
+                    logger.info(f"Nessuna domanda nella sessione, ma SCRIPT globale ha {len(SCRIPT)} domande. Le uso per questa sessione.")
+                    session.questions = SCRIPT  # Copia le domande globali nella sessione
+                    save_state(session)
+                else:
+                    logger.info(f"Nessuna domanda caricata per user: {current_user}, restituisco messaggio informativo")
+                    return {
+                        "message": "Nessuna domanda caricata. Caricare le domande prima di iniziare il colloquio.",
+                        "audio_url": None,
+                        "question_text": "Nessuna domanda disponibile",
+                        "question_type": "info",
+                        "question_index": 0,
+                        "questions_loaded": False
+                    }
         
         # Preparare il testo introduttivo per l'intervista
         intro_text = "Benvenuto all'intervista X. Mettiti comodo. Rilàssati. Sono qui per farti alcune domande. Non è un esame, quindi non ci sono domande giuste o sbagliate. Detto questo, iniziamo con la prima domanda: "
@@ -889,10 +1138,9 @@ async def get_first_prompt(
         audio_content = ""  # Nessun audio embedded
         logger.info("Audio sarà generato tramite endpoint TTS separato")
             
-        # Prepara URL per il TTS con i parametri necessari (voce e testo)
-        import urllib.parse
-        encoded_text = urllib.parse.quote(full_text)
-        tts_url = f"{config.API_BASE_URL}/tts/speak?voice_id={voice}&text={encoded_text}"
+        # Prepara URL per il TTS: l'audio è registrato lato server e richiesto per ID
+        audio_id = await register_speech(full_text, voice)
+        tts_url = f"{config.API_BASE_URL}/tts/audio/{audio_id}"
         
         logger.info(f"Primo prompt pronto per l'utente {current_user}: {full_text[:50]}...")
         
@@ -902,6 +1150,7 @@ async def get_first_prompt(
             "text": full_text,
             "audio_content": audio_content,  # Audio già generato in base64
             "audio_url": tts_url,  # URL del servizio TTS (backup)
+            "audio_id": audio_id,
             "question_id": question_id
         }
         
@@ -915,6 +1164,7 @@ async def get_first_prompt(
 @router.get("/load_questions_status")
 async def load_questions_status():
     """Controlla se ci sono domande caricate nel sistema."""
+    sync_question_bank()
     script_size = len(SCRIPT)
     first_question = None
     questions_loaded = script_size > 0
@@ -953,6 +1203,7 @@ def get_question_metadata_status(question_id: str) -> Dict[str, Any]:
     Returns:
         Dizionario con lo stato dei metadati e, se disponibili, i metadati stessi
     """
+    sync_question_bank()
     # Cerca la domanda nella nuova struttura DOMANDE per indice
     found_index = -1
     for i, q in enumerate(DOMANDE):
@@ -1131,6 +1382,7 @@ def get_metadata_processing_status() -> Dict[str, Any]:
     """
     global metadata_processing_status
     global DOMANDE
+    sync_question_bank()
     
     # Base result dal dizionario di stato
     result = metadata_processing_status.copy()
@@ -5,6 +5,10 @@ import tempfile
 import os
 from pydantic import BaseModel
 
+from Main.core import config
+from Main.core.admission import admit
+from Main.core.uploads import copy_upload
+
 # Configurazione logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,7 +39,7 @@ router = APIRouter(tags=["Questions"])
     200: {"model": QuestionResponse},
     400: {"model": ErrorResponse},
     500: {"model": ErrorResponse}
-})
+}, dependencies=[Depends(admit("import"))])
 async def load_questions(file: UploadFile = File(...)) -> Dict[str, Any]:
     """Endpoint per caricare domande da un file CSV (semplificato per sviluppo)"""
     try:
@@ -43,16 +47,16 @@ async def load_questions(file: UploadFile = File(...)) -> Dict[str, Any]:
         # In una versione reale, qui leggeremmo il contenuto del file
         global questions_db
         
-        # Log della richiesta
-        file_size = 0
-        contents = await file.read()
-        file_size = len(contents)
-        logger.info(f"Ricevuto file '{file.filename}' di {file_size} bytes")
-        
-        # Salva il file UploadFile in un file temporaneo
+        # Salva il file UploadFile in un file temporaneo, copiandolo a blocchi
         with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp:
-            tmp.write(contents)
             tmp_path = tmp.name
+            try:
+                file_size = await copy_upload(file, tmp, config.MAX_QUESTIONS_UPLOAD_BYTES)
+            except HTTPException:
+                tmp.close()
+                os.remove(tmp_path)
+                raise
+        logger.info(f"Ricevuto file '{file.filename}' di {file_size} bytes")
         try:
             from Importazioni import QuestionImporter
             questions_text = QuestionImporter.import_questions(tmp_path)
@@ -183,7 +187,8 @@ async def get_metadata_status() -> Dict[str, Any]:
                 "processed_questions": status.get('processed_questions', 0),
                 "completion_percentage": status.get('completion_percentage', 0),
                 "elapsed_seconds": status.get('elapsed_seconds', 0),
-                "domande_structure": status.get('domande_structure', {})
+                "domande_structure": status.get('domande_structure', {}),
+                "tts_presynthesis": status.get('tts_presynthesis', {})
             }
         }
     except Exception as e:
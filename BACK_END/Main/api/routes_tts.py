@@ -1,18 +1,23 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
-from fastapi.responses import StreamingResponse
-from typing import Dict, Optional
+from fastapi import APIRouter, Query, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import AsyncIterator, Dict, Optional
 import logging
 import base64
 import sys
 import asyncio
 import random
+import re
 from io import BytesIO
 
 # Import dai moduli interni
 from Main.core import config
+from Main.core.admission import AdmittedResponse, AdmittedStreamingResponse, admit
 from Main.models import TTSRequest, TTSResponse, ErrorResponse
-from Main.services.tts_service import text_to_speech_polly, get_polly_client
-from italian_tts_processor import optimize_italian_tts
+from Main.core.file_responses import immutable_bytes_response, immutable_file_response, not_modified
+from Main.services.tts_service import (
+    get_polly_client, speak_audio, speech_file, speech_from_memory, stream_speech, take_prefetched
+)
+from Main.services.audio_cache import audio_cache
 
 # Configurazione logger
 logger = logging.getLogger(__name__)
@@ -25,16 +30,43 @@ router = APIRouter(tags=["TTS"])  # Rimuoviamo il prefix dal router perché è g
 VALID_BEEP_WAV_BASE64 = "UklGRioFAABXQVZFZm10IBAAAAABAAEARKwAABCxAgAECBAAZGF0YQYFAAAAAJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJj///8AAACYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiYmJiY"
 
 
+async def _stream_response(http_request: Request, chunks: AsyncIterator[bytes]) -> StreamingResponse:
+    """Risposta in streaming dai blocchi di audio, inoltrati man mano che sono pronti.
+
+    Il primo blocco è atteso qui, così un errore di sintesi emerge prima di
+    inviare lo stato HTTP. Lo slot di ammissione "tts" resta occupato finché
+    lo stream non è concluso.
+    """
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise ValueError("Nessun audio restituito da AWS Polly")
+
+    async def relay() -> AsyncIterator[bytes]:
+        yield first_chunk
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # Lo stato HTTP è già stato inviato: si può solo chiudere lo stream
+            logger.error(f"Sintesi interrotta durante lo streaming: {e}")
+
+    return AdmittedStreamingResponse(http_request, relay(), media_type=f"audio/{config.AWS_POLLY_FORMAT}")
+
+
 @router.api_route("/speak", methods=["POST", "GET"], response_model=None, responses={
     500: {"model": ErrorResponse}
-})
-async def speak(request: TTSRequest = None, voice_id: str = Query(None), text: str = Query(None)):
+}, dependencies=[Depends(admit("tts"))])
+async def speak(http_request: Request, request: TTSRequest = None, voice_id: str = Query(None), text: str = Query(None)):
     # Determina se è una richiesta GET o POST
     is_get_request = request is None and text is not None
     
     # Per le richieste GET, crea un oggetto request dai parametri della query
     if is_get_request:
         request = TTSRequest(text=text, voice_id=voice_id)
+    # Audio binario per le GET e per le POST con "Accept: audio/*"; JSON con
+    # audio_base64 (un terzo più grande) solo per i client che non lo chiedono
+    binary_response = is_get_request or "audio/" in http_request.headers.get("accept", "")
     """Converte testo in audio utilizzando l'ottimizzatore italiano e il servizio TTS."""
     # Log di debug
     logger.info(f"=== ENDPOINT /speak - Inizio richiesta TTS ===")
@@ -54,12 +86,9 @@ async def speak(request: TTSRequest = None, voice_id: str = Query(None), text: s
             audio_bytes = base64.b64decode(audio_base64)
             logger.info(f"Audio WAV beep: {len(audio_bytes)} bytes")
             
-            # Per richieste GET, restituisce direttamente l'audio come stream binario
-            if is_get_request:
-                return StreamingResponse(
-                    BytesIO(audio_bytes),
-                    media_type=f"audio/wav"
-                )
+            # Per richieste GET, restituisce direttamente l'audio binario
+            if binary_response:
+                return Response(audio_bytes, media_type="audio/wav")
             # Per richieste POST, restituisce la risposta JSON con audio_base64
             else:
                 return TTSResponse(
@@ -75,23 +104,30 @@ async def speak(request: TTSRequest = None, voice_id: str = Query(None), text: s
         if not config.AWS_ACCESS_KEY_ID or not config.AWS_SECRET_ACCESS_KEY:
             raise ValueError("Credenziali AWS non configurate")
         
-        # Ottimizza il testo per la sintesi vocale italiana se necessario
-        final_text = request.text
-        is_ssml = final_text.strip().startswith('<speak>') and final_text.strip().endswith('</speak>')
-        if not is_ssml:
-            final_text = optimize_italian_tts(final_text, wrap_speak=True)
-            logger.debug(f"Testo ottimizzato con SSML: {final_text[:100]}...")
-        
+        # Audio della prossima domanda già sintetizzato durante il turno
+        audio_bytes = await take_prefetched(request.text, voice)
+        if audio_bytes:
+            logger.info(f"Audio pre-sintetizzato: {len(audio_bytes)} bytes")
+            if binary_response:
+                return Response(audio_bytes, media_type=f"audio/{config.AWS_POLLY_FORMAT}")
+            return TTSResponse(
+                status="success",
+                message="Audio generato con successo",
+                audio_base64=base64.b64encode(audio_bytes).decode('utf-8')
+            )
+
         # Ottieni client Polly
         polly_client = get_polly_client()
         if not polly_client:
             raise ValueError("Client Polly non disponibile")
         
-        # Chiamata a Polly
-        # logger.info(f"TTS: generazione audio per testo ottimizzato con voce {voice}, motore {config.AWS_POLLY_ENGINE}")
-        
-        # Ottieni i bytes dell'audio
-        audio_bytes = text_to_speech_polly(final_text, voice)
+        # In binario l'audio viene inviato frase per frase, appena pronto
+        if binary_response:
+            return await _stream_response(http_request, stream_speech(request.text, voice))
+
+        # Ottieni i bytes dell'audio (dalla cache audio se già sintetizzato;
+        # il testo non SSML viene ottimizzato per l'italiano)
+        audio_bytes = await speak_audio(request.text, voice)
         if not audio_bytes:
             raise ValueError("Nessun audio restituito da AWS Polly")
         
@@ -99,20 +135,12 @@ async def speak(request: TTSRequest = None, voice_id: str = Query(None), text: s
         audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
         # logger.info(f"Audio generato con successo: {len(audio_bytes)} bytes, {len(audio_base64)} chars base64")
         
-        # Per le richieste GET, restituisci direttamente lo stream audio
-        if is_get_request:
-            logger.info(f"Restituisco stream audio binario diretto: {len(audio_bytes)} bytes")
-            return StreamingResponse(
-                BytesIO(audio_bytes),
-                media_type=f"audio/{config.AWS_POLLY_FORMAT}"
-            )
         # Per le richieste POST, restituisci la risposta JSON con audio_base64 
-        else:
-            return TTSResponse(
-                status="success",
-                message="Audio generato con successo",
-                audio_base64=audio_base64
-            )
+        return TTSResponse(
+            status="success",
+            message="Audio generato con successo",
+            audio_base64=audio_base64
+        )
             
     except Exception as e:
         # Gestione errori con audio di fallback
@@ -126,12 +154,9 @@ async def speak(request: TTSRequest = None, voice_id: str = Query(None), text: s
             fallback_audio_bytes = base64.b64decode(fallback_audio_base64)
             
             # Per richieste GET, restituisci direttamente l'audio di fallback
-            if is_get_request:
-                logger.info(f"GET Fallback: stream audio WAV: {len(fallback_audio_bytes)} bytes")
-                return StreamingResponse(
-                    BytesIO(fallback_audio_bytes),
-                    media_type="audio/wav"
-                )
+            if binary_response:
+                logger.info(f"GET Fallback: audio WAV: {len(fallback_audio_bytes)} bytes")
+                return Response(fallback_audio_bytes, media_type="audio/wav")
             # Per richieste POST, restituisci JSON con l'audio di fallback
             else:
                 logger.info("POST Fallback: JSON con audio_base64")
@@ -148,6 +173,43 @@ async def speak(request: TTSRequest = None, voice_id: str = Query(None), text: s
                 detail=f"Errore durante la sintesi vocale: {str(e)}. Fallback fallito: {str(fallback_error)}"
             )
 
+@router.get("/audio/{audio_id}", response_model=None, responses={
+    404: {"model": ErrorResponse}
+}, dependencies=[Depends(admit("tts"))])
+async def audio_by_id(audio_id: str, request: Request):
+    """Audio registrato con ``register_speech``, per ID (hash del contenuto).
+
+    Il contenuto di un ID non cambia mai: ETag forte, cache immutabile per
+    browser e CDN, 304 con ``If-None-Match`` e richieste Range per il seek.
+    Un audio nel livello in memoria della cache viene servito senza leggere il
+    file; lo slot di ammissione resta occupato fino all'invio del corpo.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", audio_id):
+        raise HTTPException(status_code=404, detail="Audio non trovato")
+    unchanged = not_modified(request, audio_id)
+    if unchanged is not None:
+        return unchanged
+
+    if config.DEVELOPMENT_MODE:
+        return Response(base64.b64decode(VALID_BEEP_WAV_BASE64), media_type="audio/wav")
+
+    media_type = f"audio/{config.AWS_POLLY_FORMAT}"
+    audio_bytes = speech_from_memory(audio_id)
+    if audio_bytes is not None:
+        return AdmittedResponse(request, immutable_bytes_response(request, audio_bytes, media_type, audio_id))
+
+    try:
+        path = await speech_file(audio_id)
+    except Exception as e:
+        # Come /speak: audio di fallback, senza farlo finire nelle cache HTTP
+        logger.error(f"Errore durante la sintesi vocale dell'audio {audio_id}: {e}")
+        return Response(base64.b64decode(VALID_BEEP_WAV_BASE64), media_type="audio/wav",
+                        headers={"Cache-Control": "no-store"})
+    if path is None:
+        raise HTTPException(status_code=404, detail="Audio non trovato")
+    return AdmittedResponse(request, immutable_file_response(request, path, media_type, audio_id))
+
+
 @router.get("/status", response_model=TTSResponse)
 async def tts_status() -> TTSResponse:
     """Verifica lo stato del servizio TTS"""
@@ -165,14 +227,13 @@ async def tts_status() -> TTSResponse:
         service_type = "unavailable"
         description = "Nessun servizio TTS configurato (AWS Polly)"
     
-    # Include informazioni sulla cache TTS
-    import os
-    cache_dir = config.TTS_CACHE_DIR
-    cache_files = len(os.listdir(cache_dir)) if os.path.exists(cache_dir) else 0
+    # Include informazioni sulla cache TTS (dall'indice, senza scorrere la directory)
+    cache = await asyncio.to_thread(audio_cache.stats)
     
     return TTSResponse(
         status="success",
-        message=f"Servizio TTS {service_type} disponibile | Cache files: {cache_files}",
+        message=(f"Servizio TTS {service_type} disponibile | Cache files: {cache['entries']} "
+                 f"({cache['bytes'] / 1024 / 1024:.1f} MB, hit ratio {cache['hit_ratio']:.0%})"),
         audio_base64="" # Campo vuoto per l'endpoint di status
     )
 
@@ -203,8 +264,8 @@ async def available_voices():
             detail=f"Errore nel recupero delle voci disponibili: {str(e)}"
         )
 
-@router.post("/stream", response_class=StreamingResponse)
-async def stream_tts(request: TTSRequest):
+@router.post("/stream", response_class=StreamingResponse, dependencies=[Depends(admit("tts"))])
+async def stream_tts(request: TTSRequest, http_request: Request):
     """Converte testo in audio e lo restituisce come stream di byte.
     
     Questo endpoint è particolarmente utile per file audio più grandi,
@@ -226,27 +287,9 @@ async def stream_tts(request: TTSRequest):
                 media_type=f"audio/{config.AWS_POLLY_FORMAT}"
             )
 
-        # Genera audio con Amazon Polly
-        # Ottimizza il testo se necessario
-        final_text = request.text
-        is_ssml = final_text.strip().startswith('<speak>') and final_text.strip().endswith('</speak>')
-        if not is_ssml:
-            final_text = optimize_italian_tts(final_text, wrap_speak=True)
-            
-        audio_bytes = text_to_speech_polly(
-            text=final_text,
-            voice_id=voice
-        )
-        
-        if not audio_bytes:
-            logger.error("Nessun dato audio generato")
-            raise HTTPException(status_code=500, detail="Errore nella generazione dell'audio")
-        
-        # Crea uno streaming response direttamente dai byte
-        return StreamingResponse(
-            BytesIO(audio_bytes),
-            media_type=f"audio/{config.AWS_POLLY_FORMAT}"
-        )
+        # Genera audio con Amazon Polly (testo ottimizzato se necessario, cache audio):
+        # i blocchi vengono inoltrati man mano che Polly li produce
+        return await _stream_response(http_request, stream_speech(request.text, voice))
         
     except Exception as e:
         logger.error(f"Errore durante la sintesi vocale in streaming: {e}")
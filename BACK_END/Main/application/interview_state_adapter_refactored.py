@@ -8,6 +8,7 @@ import logging
 import uuid
 from typing import Dict, List, Any, Optional, Union, Tuple
 from interviewer_reflection import InterviewerReflection
+from Main.core.bounded_history import BoundedHistory
 import os
 from topic_detection import (
     COVERAGE_THRESHOLD_PERCENT as TD_COVERAGE_THRESHOLD_PERCENT,
@@ -60,6 +61,7 @@ class InterviewStateAdapter:
         self.script: List[Dict[str, Union[str, List[str]]]] = script
         self.idx: int = 0  # domanda corrente
         self.rm: InterviewerReflection = InterviewerReflection()  # gestore riflessioni
+        self.rm.bind(self.user_id, self.session_id)
         self.questions: List[Dict[str, Any]] = []
 
         # Nuovi campi per la struttura della domanda corrente generata dall'LLM
@@ -69,18 +71,27 @@ class InterviewStateAdapter:
         self.current_question_is_follow_up_for_subtopic: Optional[str] = None
         self.missing_topics: List[str] = []
 
-        # Lista per memorizzare le risposte dell'utente e i relativi metadati
-        self.user_responses: List[Dict[str, Any]] = []
+        # Risposte dell'utente e relativi metadati (finestra in memoria, resto in persistenza)
+        self.user_responses: BoundedHistory = self._history("user_responses")
+
+        # Numero di risposte ricevute: identifica il turno (chiavi di idempotenza)
+        self.turn_count: int = 0
 
         # Campi provenienti da InterviewState presente in user_session_service
         self.interview_id = str(uuid.uuid4())
         self.start_time = datetime.now()
         self.current_question_id = None
         self.questions_asked = []  # ID delle domande già poste
-        self.answers = {}  # Risposte fornite (question_id -> answer_text)
+        self.answers = {}  # Risposte fornite (question_id -> BoundedHistory delle risposte)
         self.completed = False
         self.score = None
 
+    def _history(self, stream: str) -> BoundedHistory:
+        """Crea uno storico a finestra limitata legato a questa sessione."""
+        history = BoundedHistory(stream)
+        history.bind(self.user_id, self.session_id)
+        return history
+
     def to_string(self) -> str:
         return (
             f"user_id: {self.user_id}\n"
@@ -149,8 +160,29 @@ class InterviewStateAdapter:
             return "Domanda non disponibile"
 
     def save_user_response_and_reflect(self, text: str) -> None:
-        """Salva risposta utente + riflettore."""
-        self.rm.add_turn("user", text)
+        """Salva risposta utente + riflettore.
+
+        La riflessione (chiamata LLM) non serve per scegliere la prossima
+        domanda: viene solo segnata ed eseguita dopo il turno con
+        ``run_deferred_reflection()``.
+        """
+        self.rm.add_turn("user", text, defer_reflection=True)
+
+    def run_deferred_reflection(self) -> bool:
+        """Esegue la riflessione rimandata dall'ultimo turno, se dovuta."""
+        return self.rm.reflect_if_due()
+
+    def deferred_reflection_snapshot(self) -> Optional[dict]:
+        """Dati della riflessione rimandata (da leggere sotto il lock della sessione), o None."""
+        return self.rm.reflection_snapshot()
+
+    def summarize_reflection(self, snapshot: dict) -> str:
+        """Chiamata LLM della riflessione: bloccante, da eseguire senza lock e in un thread."""
+        return self.rm.summarize(snapshot)
+
+    def merge_deferred_reflection(self, snapshot: dict, summary: str) -> bool:
+        """Aggiunge la riflessione calcolata (sotto il lock della sessione)."""
+        return self.rm.merge_reflection(snapshot, summary)
 
     def find_missing_topics(self, user_response = "") -> Tuple[List[str], float]:
         """Restituisce (subtopic mancanti, coverage_percent).
@@ -313,6 +345,7 @@ class InterviewStateAdapter:
         #        - Percentuale di copertura dei sottotopici
         #        - Lista dei topic mancanti
         
+        self.turn_count = getattr(self, "turn_count", 0) + 1
         try:
             # Salva la risposta nell'oggetto InterviewStateAdapter
             self.save_user_response_and_reflect(user_response)
@@ -326,7 +359,7 @@ class InterviewStateAdapter:
             if self.answers is None:
                 self.answers = {}
             if self.answers.get(current_id,None) is None:
-                self.answers[current_id]=[]
+                self.answers[current_id] = self._history(f"answers:{current_id}")
             from Main.api.routes_interview import get_question_metadata_status
             try:
                 if current_id is not None:                
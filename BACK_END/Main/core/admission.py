@@ -0,0 +1,233 @@
+"""
+Controllo di ammissione per gli endpoint costosi.
+
+Ogni endpoint appartiene a una classe (``turn`` per i turni dell'intervista
+live, ``tts`` per la sintesi vocale, ``import`` per il caricamento delle
+domande) con una quota di concorrenza propria e una quota per utente
+(concorrenza e richieste al minuto). Tutte le classi condividono un budget
+globale di operazioni contemporanee di cui una parte è riservata ai turni
+live: un picco di import o di TTS non può quindi occupare gli slot che
+servono alle interviste in corso.
+
+Quando un budget è esaurito la richiesta viene rifiutata subito (nessuna coda):
+429 se è l'utente ad aver superato la propria quota, 503 se è il servizio a
+essere saturo, sempre con l'header ``Retry-After``.
+
+Uso come dipendenza FastAPI::
+
+    @router.post("/transcribe", dependencies=[Depends(admit("turn"))])
+"""
+
+from typing import Dict, Tuple
+from collections import deque
+from contextlib import contextmanager
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from Main.core import config, metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+# Priorità delle classi: numero più basso = più importante
+PRIORITIES: Dict[str, int] = {"turn": 0, "tts": 1, "import": 2}
+
+RATE_WINDOW_SECONDS = 60.0
+
+
+class AdmissionController:
+    """Contatori di concorrenza e finestre di rate, protetti da un unico lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global_active = 0
+        self._class_active: Dict[str, int] = {}
+        self._user_active: Dict[Tuple[str, str], int] = {}
+        self._user_requests: Dict[Tuple[str, str], deque] = {}
+        self._last_sweep = time.monotonic()
+
+    def _reject(self, status_code: int, retry_after: float, reason: str, endpoint_class: str) -> None:
+        metrics.increment(f"admission_rejected_{endpoint_class}")
+        logger.warning(f"Richiesta '{endpoint_class}' rifiutata ({status_code}): {reason}")
+        raise HTTPException(
+            status_code=status_code,
+            detail=reason,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def acquire(self, endpoint_class: str, user_key: str) -> None:
+        """Ammette la richiesta o solleva HTTPException 429/503."""
+        key = (endpoint_class, user_key)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= RATE_WINDOW_SECONDS:
+                self._sweep_windows(now)
+
+            # Quota di rate per utente (finestra scorrevole di un minuto).
+            # La finestra viene creata solo quando la richiesta è ammessa
+            window = self._user_requests.get(key)
+            while window and window[0] <= now - RATE_WINDOW_SECONDS:
+                window.popleft()
+            if window and len(window) >= config.ADMISSION_USER_RATE[endpoint_class]:
+                self._reject(429, window[0] + RATE_WINDOW_SECONDS - now,
+                             "Troppe richieste: riprova tra poco", endpoint_class)
+
+            # Concorrenza per utente
+            if self._user_active.get(key, 0) >= config.ADMISSION_USER_CONCURRENCY[endpoint_class]:
+                self._reject(429, 1, "Troppe operazioni in corso per questo utente", endpoint_class)
+
+            # Concorrenza della classe
+            if self._class_active.get(endpoint_class, 0) >= config.ADMISSION_CLASS_CONCURRENCY[endpoint_class]:
+                self._reject(503, 2, "Servizio temporaneamente saturo", endpoint_class)
+
+            # Budget globale: le classi meno prioritarie non usano gli slot riservati ai turni
+            limit = config.ADMISSION_MAX_CONCURRENT
+            if PRIORITIES[endpoint_class] > PRIORITIES["turn"]:
+                limit -= config.ADMISSION_RESERVED_TURN_SLOTS
+            if self._global_active >= limit:
+                self._reject(503, 2, "Servizio temporaneamente saturo", endpoint_class)
+
+            if window is None:
+                window = self._user_requests[key] = deque()
+            window.append(now)
+            self._global_active += 1
+            self._class_active[endpoint_class] = self._class_active.get(endpoint_class, 0) + 1
+            self._user_active[key] = self._user_active.get(key, 0) + 1
+        metrics.increment(f"admission_admitted_{endpoint_class}")
+
+    def release(self, endpoint_class: str, user_key: str) -> None:
+        key = (endpoint_class, user_key)
+        with self._lock:
+            self._global_active -= 1
+            self._class_active[endpoint_class] -= 1
+            self._user_active[key] -= 1
+            if self._user_active[key] == 0:
+                del self._user_active[key]
+
+    def _sweep_windows(self, now: float) -> None:
+        """Elimina le finestre di rate scadute (chiamata con il lock acquisito)."""
+        expired = [key for key, window in self._user_requests.items()
+                   if not window or window[-1] <= now - RATE_WINDOW_SECONDS]
+        for key in expired:
+            del self._user_requests[key]
+        self._last_sweep = now
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {"active": self._global_active, "per_class": dict(self._class_active)}
+
+
+controller = AdmissionController()
+
+
+def user_key(connection: HTTPConnection) -> str:
+    """Identifica il chiamante: token di autorizzazione se presente, altrimenti IP."""
+    auth = connection.headers.get("authorization")
+    if auth:
+        return hashlib.sha256(auth.encode("utf-8")).hexdigest()[:16]
+    return connection.client.host if connection.client else "anonimo"
+
+
+@contextmanager
+def slot(endpoint_class: str, key: str):
+    """
+    Occupa uno slot della classe ``endpoint_class`` per la durata del blocco.
+
+    Solleva HTTPException 429/503 se le quote sono esaurite. Usato direttamente
+    dove una dipendenza non è applicabile (WebSocket).
+    """
+    if not config.ADMISSION_ENABLED:
+        yield
+        return
+    controller.acquire(endpoint_class, key)
+    try:
+        yield
+    finally:
+        controller.release(endpoint_class, key)
+
+
+def admit(endpoint_class: str):
+    """
+    Dipendenza FastAPI che applica le quote della classe ``endpoint_class``.
+
+    Args:
+        endpoint_class: Una delle chiavi di ``PRIORITIES``
+
+    Returns:
+        Dipendenza da usare con ``Depends``; lo slot viene rilasciato a fine richiesta
+    """
+    if endpoint_class not in PRIORITIES:
+        raise ValueError(f"Classe di ammissione sconosciuta: {endpoint_class}")
+
+    async def dependency(request: Request):
+        if not config.ADMISSION_ENABLED:
+            yield
+            return
+        held = (endpoint_class, user_key(request))
+        controller.acquire(*held)
+        request.state.admission_slot = held
+        try:
+            yield
+        finally:
+            # Una risposta in streaming può aver preso in carico lo slot
+            if request.state.admission_slot is held:
+                request.state.admission_slot = None
+                controller.release(*held)
+
+    return dependency
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse che tiene lo slot di ammissione della richiesta fino alla fine del corpo.
+
+    Le dipendenze con ``yield`` terminano prima che il corpo venga inviato: senza
+    questo passaggio lo slot verrebbe rilasciato mentre l'audio è ancora in
+    sintesi e le risposte in streaming sfuggirebbero ai limiti di concorrenza.
+    """
+
+    def __init__(self, request: Request, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._held = getattr(request.state, "admission_slot", None)
+        request.state.admission_slot = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self._held is not None:
+                controller.release(*self._held)
+                self._held = None
+
+
+class AdmittedResponse(Response):
+    """
+    Avvolge una risposta già pronta (file o byte) tenendo lo slot di ammissione fino all'invio del corpo.
+
+    Come ``AdmittedStreamingResponse``, per le risposte che non sono generatori:
+    stato e header sono quelli della risposta avvolta.
+    """
+
+    def __init__(self, request: Request, response: Response):
+        self._response = response
+        self.status_code = response.status_code
+        self.raw_headers = response.raw_headers
+        self.background = response.background
+        self._held = getattr(request.state, "admission_slot", None)
+        request.state.admission_slot = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self._response(scope, receive, send)
+        finally:
+            if self._held is not None:
+                controller.release(*self._held)
+                self._held = None
@@ -0,0 +1,155 @@
+"""
+Storico a finestra limitata per transcript, riflessioni e risposte di una sessione.
+
+In memoria resta solo la finestra di lavoro (gli ultimi ``HISTORY_WINDOW``
+elementi, più che sufficienti per i prompt che usano gli ultimi 6-10 turni);
+gli elementi più vecchi vengono riversati nel livello di persistenza. Lo
+storico completo resta recuperabile con ``full_history()``, ad esempio per i
+report. La memoria occupata da una sessione non cresce quindi con la durata
+dell'intervista.
+
+Le scritture dei riversamenti avvengono in un thread dedicato, in ordine e
+fuori dal loop: un turno non attende mai MongoDB. ``full_history()`` attende
+quelle ancora in coda prima di rileggere lo storico. Senza MongoDB (sviluppo)
+gli elementi riversati finiscono su disco in ``HISTORY_SPILL_DIR``
+(``FileHistoryStore``), non in memoria.
+
+L'oggetto è serializzabile con pickle (nessun callback), così può viaggiare
+nello store condiviso delle sessioni.
+"""
+
+from typing import Any, Iterator, List, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import pickle
+import threading
+import urllib.parse
+
+from Main.core import config
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+# Un solo thread: i riversamenti di uno storico vengono scritti nell'ordine di arrivo
+_spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-spill")
+
+
+def _save_spilled(user_id: str, session_id: str, stream: str, index: int, item: Any) -> None:
+    try:
+        from Main.services.persistence_service import save_history_item
+        save_history_item(user_id, session_id, stream, index, item)
+    except Exception as e:
+        logger.error(f"Impossibile riversare l'elemento {index} di '{stream}': {e}")
+
+
+def _load_spilled(user_id: str, session_id: str, stream: str) -> List[Any]:
+    from Main.services.persistence_service import load_history
+    return load_history(user_id, session_id, stream)
+
+
+def flush_spills() -> None:
+    """Attende che i riversamenti già in coda siano scritti."""
+    _spill_executor.submit(lambda: None).result()
+
+
+class FileHistoryStore:
+    """
+    Elementi riversati su disco, un file per (utente, sessione, storico).
+
+    Ogni elemento è un record pickle ``(indice, elemento)`` aggiunto in coda al
+    file: la memoria non cresce con la durata dell'intervista.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, user_id: str, session_id: str, stream: str) -> str:
+        name = "-".join(urllib.parse.quote(str(part), safe="") for part in (user_id, session_id, stream))
+        return os.path.join(self.directory, name + ".pkl")
+
+    def append(self, user_id: str, session_id: str, stream: str, index: int, item: Any) -> None:
+        record = pickle.dumps((index, item), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(user_id, session_id, stream), "ab") as f:
+                f.write(record)
+
+    def load(self, user_id: str, session_id: str, stream: str) -> List[Any]:
+        records = {}
+        try:
+            with open(self._path(user_id, session_id, stream), "rb") as f:
+                while True:
+                    try:
+                        index, item = pickle.load(f)
+                    except EOFError:
+                        break
+                    records[index] = item
+        except FileNotFoundError:
+            return []
+        return [records[index] for index in sorted(records)]
+
+
+class BoundedHistory:
+    """
+    Lista append-only che tiene in memoria solo gli ultimi ``window`` elementi.
+
+    Indici e slice (``history[-6:]``), ``len``, iterazione e ``reversed``
+    operano sulla finestra in memoria, come su una normale lista. ``total``
+    conta invece tutti gli elementi aggiunti, compresi quelli riversati.
+    """
+
+    def __init__(self, stream: str, window: Optional[int] = None):
+        self.stream = stream
+        self.user_id: Optional[str] = None
+        self.session_id: Optional[str] = None
+        self.total = 0
+        self._items: deque = deque(maxlen=max(1, window or config.HISTORY_WINDOW))
+
+    def bind(self, user_id: str, session_id: str) -> None:
+        """Associa lo storico alla sessione sotto cui riversare gli elementi vecchi."""
+        self.user_id = user_id
+        self.session_id = session_id
+
+    # ---------- interfaccia di lista ----------
+    def append(self, item: Any) -> None:
+        if len(self._items) == self._items.maxlen:
+            self._spill(self.total - len(self._items), self._items[0])
+        self._items.append(item)
+        self.total += 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._items)[index]
+        return self._items[index]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._items)
+
+    def __reversed__(self) -> Iterator[Any]:
+        return reversed(self._items)
+
+    def __repr__(self) -> str:
+        return f"BoundedHistory({self.stream}, total={self.total}, window={list(self._items)!r})"
+
+    # ---------- storico completo ----------
+    def _spill(self, index: int, item: Any) -> None:
+        """Riversa nel livello di persistenza (in background) l'elemento che esce dalla finestra."""
+        _spill_executor.submit(_save_spilled, self.user_id, self.session_id, self.stream, index, item)
+
+    def full_history(self) -> List[Any]:
+        """Restituisce tutti gli elementi: quelli riversati seguiti dalla finestra in memoria."""
+        spilled_count = self.total - len(self._items)
+        older: List[Any] = []
+        if spilled_count:
+            try:
+                flush_spills()
+                older = _load_spilled(self.user_id, self.session_id, self.stream)[:spilled_count]
+            except Exception as e:
+                logger.error(f"Impossibile recuperare lo storico di '{self.stream}': {e}")
+        return older + list(self._items)
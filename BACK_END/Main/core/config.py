@@ -39,6 +39,115 @@ TTS_CACHE_DIR = os.path.join(BACK_END_ROOT, "tts_cache")
 AUDIO_CACHE_DIR = os.path.join(BACK_END_ROOT, "audio")
 os.makedirs(TTS_CACHE_DIR, exist_ok=True)
 os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+# Spazio massimo della cache audio TTS: oltre, vengono eliminate le voci usate meno di recente
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Livello in memoria della cache audio (byte per worker) e clip più richieste da precaricare all'avvio
+AUDIO_HOT_CACHE_BYTES = int(os.getenv("AUDIO_HOT_CACHE_BYTES", str(64 * 1024 * 1024)))
+AUDIO_HOT_PRELOAD = int(os.getenv("AUDIO_HOT_PRELOAD", "50"))
+
+# -----------------------------------------------------------------------------
+# Deployment multi-worker
+# -----------------------------------------------------------------------------
+
+# Backend dello stato condiviso: "memory" (singolo processo, default) oppure
+# "file" (sessioni e banca domande su disco, condivisi tra worker uvicorn/pod)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", os.path.join(BACK_END_ROOT, "shared_state"))
+
+# Per quanti secondi il risultato di un turno resta disponibile per i reinvii
+# della stessa richiesta (chiave di idempotenza)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "300"))
+
+# Elementi di transcript/riflessioni/risposte tenuti in memoria per sessione;
+# i più vecchi vengono riversati nel livello di persistenza. I prompt usano
+# al massimo gli ultimi 10 turni, quindi il valore non deve scendere sotto 10
+HISTORY_WINDOW = max(10, int(os.getenv("HISTORY_WINDOW", "20")))
+# Senza MongoDB (sviluppo) gli elementi riversati vengono scritti qui, su disco
+HISTORY_SPILL_DIR = os.getenv("HISTORY_SPILL_DIR", os.path.join(SHARED_STATE_DIR, "history"))
+
+# -----------------------------------------------------------------------------
+# Elaborazione audio e trascrizione in streaming
+# -----------------------------------------------------------------------------
+
+# Eseguibile ffmpeg (nel PATH o percorso assoluto)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+# Conversioni ffmpeg contemporanee e bitrate Opus delle risposte (mono 16 kHz)
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(os.cpu_count() or 2)))
+TRANSCODE_OPUS_BITRATE = os.getenv("TRANSCODE_OPUS_BITRATE", "24k")
+
+# Limiti degli upload (byte): le richieste più grandi vengono rifiutate con 413
+# prima di leggerne il corpo; i file vengono letti a blocchi di UPLOAD_CHUNK_SIZE
+MAX_AUDIO_UPLOAD_BYTES = int(os.getenv("MAX_AUDIO_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_QUESTIONS_UPLOAD_BYTES = int(os.getenv("MAX_QUESTIONS_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Backend di trascrizione: "openai" (API whisper-1) oppure "local"
+# (faster-whisper quantizzato su CPU, richiede il pacchetto faster-whisper)
+STT_BACKEND = os.getenv("STT_BACKEND", "openai").lower()
+# Con il backend locale saturo o in errore si usa l'API remota (false negli ambienti air-gapped)
+STT_REMOTE_FALLBACK = os.getenv("STT_REMOTE_FALLBACK", "true").lower() in ("true", "1", "yes")
+LOCAL_STT_MODEL = os.getenv("LOCAL_STT_MODEL", "small")
+LOCAL_STT_COMPUTE_TYPE = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+LOCAL_STT_WORKERS = int(os.getenv("LOCAL_STT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+LOCAL_STT_THREADS_PER_WORKER = int(os.getenv("LOCAL_STT_THREADS_PER_WORKER", "2"))
+# Trascrizioni in attesa oltre ai worker occupati prima di ripiegare sull'API remota
+LOCAL_STT_MAX_QUEUE = int(os.getenv("LOCAL_STT_MAX_QUEUE", "2"))
+
+# Scheduler delle chiamate STT remote: trascrizioni contemporanee, richieste in
+# coda e attesa massima (in secondi) dei turni live e delle ritrascrizioni batch
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", "8"))
+STT_QUEUE_SIZE = int(os.getenv("STT_QUEUE_SIZE", "32"))
+STT_LIVE_DEADLINE_SECONDS = float(os.getenv("STT_LIVE_DEADLINE_SECONDS", "10"))
+STT_BATCH_DEADLINE_SECONDS = float(os.getenv("STT_BATCH_DEADLINE_SECONDS", "120"))
+
+# Rimozione del silenzio prima della trascrizione: sotto VAD_MIN_SPEECH_SECONDS
+# di voce la registrazione non viene trascritta e si chiede di ripetere; le
+# pause interne vengono accorciate a VAD_MAX_PAUSE_SECONDS; se il taglio è
+# inferiore a VAD_MIN_TRIM_SECONDS si mantiene l'audio non tagliato
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("true", "1", "yes")
+VAD_MIN_SPEECH_SECONDS = float(os.getenv("VAD_MIN_SPEECH_SECONDS", "0.4"))
+VAD_MAX_PAUSE_SECONDS = float(os.getenv("VAD_MAX_PAUSE_SECONDS", "0.8"))
+VAD_MIN_TRIM_SECONDS = float(os.getenv("VAD_MIN_TRIM_SECONDS", "1.0"))
+
+# Cache delle trascrizioni (chiave: hash dell'audio, modello, lingua): voci in
+# memoria, durata in secondi e directory del livello su disco (vuota = disattivato)
+TRANSCRIPT_CACHE_SIZE = int(os.getenv("TRANSCRIPT_CACHE_SIZE", "512"))
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", str(7 * 24 * 3600)))
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "")
+
+# Risposte inviate a blocchi (/interview/transcribe/stream): ogni quanti secondi
+# cercare segmenti completati e durata minima/massima di un segmento
+STREAM_CHECK_INTERVAL = float(os.getenv("STREAM_CHECK_INTERVAL", "2"))
+STREAM_SEGMENT_SECONDS = float(os.getenv("STREAM_SEGMENT_SECONDS", "8"))
+STREAM_MAX_SEGMENT_SECONDS = float(os.getenv("STREAM_MAX_SEGMENT_SECONDS", "20"))
+
+# -----------------------------------------------------------------------------
+# Controllo di ammissione (quote per gli endpoint costosi)
+# -----------------------------------------------------------------------------
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("true", "1", "yes")
+
+# Operazioni costose contemporanee in tutto il worker e slot riservati ai turni live
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+ADMISSION_RESERVED_TURN_SLOTS = int(os.getenv("ADMISSION_RESERVED_TURN_SLOTS", "8"))
+
+# Quote per classe di endpoint: turn (/transcribe, /submit-answer), tts (/tts/*), import (/load_questions)
+ADMISSION_CLASS_CONCURRENCY = {
+    "turn": int(os.getenv("ADMISSION_TURN_CONCURRENCY", "24")),
+    "tts": int(os.getenv("ADMISSION_TTS_CONCURRENCY", "16")),
+    "import": int(os.getenv("ADMISSION_IMPORT_CONCURRENCY", "2")),
+}
+ADMISSION_USER_CONCURRENCY = {
+    "turn": int(os.getenv("ADMISSION_USER_TURN_CONCURRENCY", "2")),
+    "tts": int(os.getenv("ADMISSION_USER_TTS_CONCURRENCY", "4")),
+    "import": int(os.getenv("ADMISSION_USER_IMPORT_CONCURRENCY", "1")),
+}
+# Richieste al minuto per utente
+ADMISSION_USER_RATE = {
+    "turn": int(os.getenv("ADMISSION_USER_TURN_RATE", "30")),
+    "tts": int(os.getenv("ADMISSION_USER_TTS_RATE", "120")),
+    "import": int(os.getenv("ADMISSION_USER_IMPORT_RATE", "5")),
+}
 
 # -----------------------------------------------------------------------------
 # Credenziali e configurazioni API
@@ -65,6 +174,26 @@ AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 AWS_POLLY_VOICE_ID = os.getenv("AWS_POLLY_VOICE_ID", "Bianca")
 AWS_POLLY_ENGINE = os.getenv("AWS_POLLY_ENGINE", "neural")
 AWS_POLLY_FORMAT = os.getenv("AWS_POLLY_FORMAT", "mp3")
+# Client Polly: sintesi contemporanee (pool di thread e connessioni), timeout e tentativi
+POLLY_MAX_CONCURRENCY = int(os.getenv("POLLY_MAX_CONCURRENCY", "16"))
+POLLY_CONNECT_TIMEOUT = float(os.getenv("POLLY_CONNECT_TIMEOUT", "3"))
+POLLY_READ_TIMEOUT = float(os.getenv("POLLY_READ_TIMEOUT", "15"))
+POLLY_MAX_ATTEMPTS = int(os.getenv("POLLY_MAX_ATTEMPTS", "3"))
+# Pre-sintesi in cache dell'audio di tutte le domande al caricamento dello script:
+# voci (separate da virgola) e sintesi contemporanee (0 la disabilita)
+TTS_PRESYNTH_VOICES = [v.strip() for v in os.getenv("TTS_PRESYNTH_VOICES", AWS_POLLY_VOICE_ID).split(",") if v.strip()]
+TTS_PRESYNTH_CONCURRENCY = int(os.getenv("TTS_PRESYNTH_CONCURRENCY", "4"))
+
+# Richieste "hedged" ai provider esterni (Whisper, Polly/OpenAI TTS, chat):
+# se la risposta tarda oltre il percentile HEDGE_QUANTILE delle latenze
+# osservate (tra HEDGE_MIN_DELAY e HEDGE_MAX_DELAY secondi) parte una richiesta
+# duplicata o al provider alternativo; le richieste extra sono al massimo
+# HEDGE_MAX_EXTRA_RATIO delle richieste recenti
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() in ("true", "1", "yes")
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.9"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.3"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "5.0"))
+HEDGE_MAX_EXTRA_RATIO = float(os.getenv("HEDGE_MAX_EXTRA_RATIO", "0.1"))
 
 # MongoDB
 MONGODB_URI = os.getenv("MONGODB_URI")
@@ -0,0 +1,145 @@
+"""
+Risposte HTTP per file immutabili (audio in cache), cacheabili da browser e CDN.
+
+* ETag forte dal contenuto: con ``If-None-Match`` corrispondente si risponde
+  304 senza corpo.
+* ``Range: bytes=a-b`` (un solo intervallo) restituisce 206 con la parte
+  richiesta: serve ai browser per il seek dell'audio. Più intervalli o un
+  header non valido ricevono il file intero; un intervallo oltre la fine 416.
+* Il corpo non passa dalla memoria del processo quando il server lo permette:
+  con l'estensione ASGI ``http.response.zerocopysend`` il server invia il file
+  con sendfile (anche per gli intervalli), con ``http.response.pathsend`` gli
+  basta il percorso. Altrimenti il file viene letto a blocchi grandi
+  (``FILE_CHUNK_SIZE``) in un thread.
+* Un audio già in memoria (livello caldo della cache) si serve con
+  ``immutable_bytes_response``, con gli stessi header e lo stesso Range.
+"""
+
+from typing import Dict, Optional, Tuple
+import os
+import re
+
+import anyio
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Blocchi letti dal disco quando il server non supporta l'invio diretto del file
+FILE_CHUNK_SIZE = 256 * 1024
+# Contenuto indirizzato per hash: non cambia mai per lo stesso URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Intervallo (inizio, fine inclusa) richiesto da ``header``.
+
+    Returns:
+        None per servire il file intero; solleva ValueError se l'intervallo
+        non è soddisfacibile
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffisso: gli ultimi N byte
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Intervallo non soddisfacibile")
+    return start, end
+
+
+class AudioFileResponse(Response):
+    """File (o una sua parte) inviato senza copiarlo in memoria quando il server lo consente."""
+
+    def __init__(self, path: str, size: int, media_type: str, headers: Dict[str, str],
+                 byte_range: Optional[Tuple[int, int]] = None):
+        self.path = path
+        self.start, self.end = byte_range or (0, size - 1)
+        self.partial = byte_range is not None
+        super().__init__(status_code=206 if self.partial else 200, media_type=media_type, headers=headers)
+        self.headers["content-length"] = str(self.end - self.start + 1)
+        if self.partial:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        extensions = scope.get("extensions") or {}
+        count = self.end - self.start + 1
+        if "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f,
+                            "offset": self.start, "count": count, "more_body": False})
+            return
+        if "http.response.pathsend" in extensions and not self.partial:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            remaining = count
+            more_body = True
+            while more_body:
+                chunk = await f.read(min(FILE_CHUNK_SIZE, remaining)) if remaining > 0 else b""
+                remaining -= len(chunk)
+                more_body = remaining > 0 and bool(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": f'"{etag}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 se il client ha già la versione ``etag`` (``If-None-Match``), altrimenti None."""
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or f'"{etag}"' in if_none_match:
+        return Response(status_code=304, headers=_cache_headers(etag))
+    return None
+
+
+def _conditional(request: Request, etag: str, size: int
+                 ) -> Tuple[Optional[Response], Dict[str, str], Optional[Tuple[int, int]]]:
+    """304/416 già pronti, oppure header di cache e intervallo richiesto."""
+    headers = _cache_headers(etag)
+    cached = not_modified(request, etag)
+    if cached is not None:
+        return cached, headers, None
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"}), headers, None
+    return None, headers, byte_range
+
+
+def immutable_file_response(request: Request, path: str, media_type: str, etag: str) -> Response:
+    """Risposta per il file ``path`` con ETag ``etag``, cache immutabile e supporto Range."""
+    size = os.path.getsize(path)
+    early, headers, byte_range = _conditional(request, etag, size)
+    if early is not None:
+        return early
+    return AudioFileResponse(path, size, media_type, headers, byte_range)
+
+
+def immutable_bytes_response(request: Request, body: bytes, media_type: str, etag: str) -> Response:
+    """Come ``immutable_file_response``, per un audio già in memoria (nessun accesso al disco)."""
+    early, headers, byte_range = _conditional(request, etag, len(body))
+    if early is not None:
+        return early
+    if byte_range is None:
+        return Response(body, media_type=media_type, headers=headers)
+    start, end = byte_range
+    return Response(body[start:end + 1], status_code=206, media_type=media_type,
+                    headers={**headers, "Content-Range": f"bytes {start}-{end}/{len(body)}"})
@@ -0,0 +1,233 @@
+"""
+Richieste "hedged" verso i provider esterni (STT, TTS, LLM).
+
+Se la risposta di un provider tarda oltre il ritardo di hedging (il percentile
+``HEDGE_QUANTILE`` delle latenze osservate, limitato tra ``HEDGE_MIN_DELAY`` e
+``HEDGE_MAX_DELAY``) parte una seconda richiesta, duplicata o verso un provider
+alternativo: vince la prima che riesce e l'altra viene annullata. Se la prima
+richiesta fallisce prima del ritardo e c'è un provider alternativo, si passa
+subito a quello.
+
+Le richieste extra sono limitate a ``HEDGE_MAX_EXTRA_RATIO`` delle richieste
+recenti, così un provider lento non raddoppia il carico. Contatori e ritardi
+correnti sono esposti da ``/metrics``.
+
+Le chiamate sincrone (client boto3 e OpenAI sincrono) usano ``run_sync``:
+girano in thread, e il thread perdente non può essere interrotto, ma il suo
+risultato viene scartato. Se il risultato tiene una risorsa (lo stream di
+Polly tiene una connessione), ``discard`` la rilascia quando il perdente
+termina.
+
+Ogni uso ha il proprio hedger (nome): il ritardo dipende dalle latenze di
+quella chiamata e il budget delle richieste extra non è condiviso tra una
+richiesta duplicata e un provider alternativo.
+"""
+
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+from collections import deque
+from concurrent import futures
+import asyncio
+import logging
+import threading
+import time
+
+from Main.core import config, metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Latenze e richieste considerate per il percentile e per il limite di richieste extra
+WINDOW = 200
+# Campioni necessari prima di usare il percentile (prima si usa HEDGE_MAX_DELAY)
+MIN_SAMPLES = 20
+
+_sync_pool = futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+
+
+class Hedger:
+    """Ritardo di hedging e budget di richieste extra per un provider."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._latencies: Deque[float] = deque(maxlen=WINDOW)
+        self._hedged: Deque[bool] = deque(maxlen=WINDOW)
+        self._lock = threading.Lock()
+
+    # ---------- statistiche ----------
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        """Attesa prima della richiesta extra: percentile delle latenze osservate."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < MIN_SAMPLES:
+            return config.HEDGE_MAX_DELAY
+        observed = samples[min(len(samples) - 1, int(len(samples) * config.HEDGE_QUANTILE))]
+        return min(config.HEDGE_MAX_DELAY, max(config.HEDGE_MIN_DELAY, observed))
+
+    def _start_request(self) -> None:
+        metrics.increment(f"hedge_{self.name}_requests")
+        with self._lock:
+            self._hedged.append(False)
+
+    def _allow_extra(self) -> bool:
+        with self._lock:
+            extra = sum(self._hedged)
+            if extra + 1 > config.HEDGE_MAX_EXTRA_RATIO * max(len(self._hedged), 1):
+                return False
+            self._hedged[-1] = True
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            hedged = sum(self._hedged)
+            total = len(self._hedged)
+        return {"delay": round(self.delay(), 3), "extra_rate": round(hedged / total, 3) if total else 0.0}
+
+    # ---------- esecuzione ----------
+    def _fire_extra(self, reason: str) -> bool:
+        if reason == "failover":
+            metrics.increment(f"hedge_{self.name}_failover")
+            return True
+        if not self._allow_extra():
+            metrics.increment(f"hedge_{self.name}_skipped_budget")
+            return False
+        metrics.increment(f"hedge_{self.name}_fired")
+        return True
+
+    def _winner(self, index: int) -> None:
+        if index > 0:
+            metrics.increment(f"hedge_{self.name}_won")
+            logger.info(f"Hedging '{self.name}': ha risposto prima la richiesta extra")
+
+    async def run(self, primary: Callable[[], Awaitable[T]],
+                  alternate: Optional[Callable[[], Awaitable[T]]] = None) -> T:
+        """
+        Esegue ``primary`` con hedging.
+
+        Args:
+            primary: Coroutine function della richiesta principale
+            alternate: Richiesta verso il provider alternativo; se assente la
+                richiesta extra è un duplicato di ``primary``
+        """
+        if not config.HEDGING_ENABLED:
+            return await primary()
+        self._start_request()
+
+        async def timed(call: Callable[[], Awaitable[T]]) -> T:
+            t0 = time.perf_counter()
+            result = await call()
+            self.record(time.perf_counter() - t0)
+            return result
+
+        tasks: List[asyncio.Task] = [asyncio.create_task(timed(primary))]
+        errors: List[BaseException] = []
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.delay())
+            if done and tasks[0].exception() is None:
+                return tasks[0].result()
+            if done:
+                errors.append(tasks[0].exception())
+                if alternate is None:
+                    raise errors[0]
+                self._fire_extra("failover")
+            elif not self._fire_extra("slow"):
+                return await tasks[0]
+            tasks.append(asyncio.create_task(timed(alternate or primary)))
+
+            pending = {task for task in tasks if not task.done()}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._winner(tasks.index(task))
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _drop(self, call: futures.Future, discard: Optional[Callable[[T], None]]) -> None:
+        """Scarta una chiamata perdente: annullata se non è partita, altrimenti ``discard`` sul risultato."""
+        call.cancel()  # ha effetto solo se non è ancora partita
+        if discard is None:
+            return
+
+        def release(finished: futures.Future) -> None:
+            if finished.cancelled() or finished.exception() is not None:
+                return
+            try:
+                discard(finished.result())
+            except Exception as e:
+                logger.warning(f"Hedging '{self.name}': errore nel rilascio del risultato scartato: {e}")
+
+        call.add_done_callback(release)
+
+    def run_sync(self, primary: Callable[[], T], alternate: Optional[Callable[[], T]] = None,
+                 discard: Optional[Callable[[T], None]] = None) -> T:
+        """Come ``run``, per chiamate bloccanti (eseguite in thread).
+
+        Args:
+            discard: Rilascia il risultato di una chiamata perdente (es. chiude uno stream)
+        """
+        if not config.HEDGING_ENABLED:
+            return primary()
+        self._start_request()
+
+        def timed(call: Callable[[], T]) -> T:
+            t0 = time.perf_counter()
+            result = call()
+            self.record(time.perf_counter() - t0)
+            return result
+
+        calls = [_sync_pool.submit(timed, primary)]
+        errors: List[BaseException] = []
+        done, _ = futures.wait(calls, timeout=self.delay())
+        if done and calls[0].exception() is None:
+            return calls[0].result()
+        if done:
+            errors.append(calls[0].exception())
+            if alternate is None:
+                raise errors[0]
+            self._fire_extra("failover")
+        elif not self._fire_extra("slow"):
+            return calls[0].result()
+        calls.append(_sync_pool.submit(timed, alternate or primary))
+
+        pending = {call for call in calls if not call.done()}
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for call in done:
+                if call.exception() is None:
+                    self._winner(calls.index(call))
+                    for other in calls:
+                        if other is not call:
+                            self._drop(other, discard)
+                    return call.result()
+                errors.append(call.exception())
+        raise errors[0]
+
+
+_hedgers: Dict[str, Hedger] = {}
+_hedgers_lock = threading.Lock()
+
+
+def hedger(name: str) -> Hedger:
+    """Restituisce l'hedger del provider ``name`` (creato al primo uso)."""
+    with _hedgers_lock:
+        if name not in _hedgers:
+            _hedgers[name] = Hedger(name)
+        return _hedgers[name]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Ritardo corrente e tasso di richieste extra per provider."""
+    with _hedgers_lock:
+        items = list(_hedgers.items())
+    return {name: h.snapshot() for name, h in items}
@@ -0,0 +1,146 @@
+"""
+Cache dei risultati dei turni per rendere idempotenti gli invii ripetuti.
+
+Le reti mobili instabili fanno reinviare la stessa risposta: il primo invio
+esegue il turno, i duplicati ricevono lo stesso risultato. Un duplicato che
+arriva mentre l'originale è ancora in corso ne attende il completamento
+invece di rieseguire trascrizione e chiamate LLM.
+
+``TurnResultCache`` è locale al processo e la sua chiave senza
+``Idempotency-Key`` dipende dal numero di turno, che cambia appena il turno
+termina. Per questo l'ultimo turno completato (chiave o hash del contenuto e
+risultato) viene salvato anche sulla sessione: ``run_locked_turn`` lo
+controlla con il lock di sessione, così un reinvio arrivato dopo la fine del
+turno, anche su un altro worker, riceve il risultato invece di rieseguirlo.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, MutableMapping, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import time
+
+from Main.core import metrics
+from Main.core.session_locks import session_lock
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+
+def request_key(user_id: str, payload: bytes, turn: int) -> str:
+    """Chiave derivata dal contenuto della richiesta e dal numero di turno della sessione."""
+    return f"{user_id}:{turn}:{hashlib.sha256(payload).hexdigest()}"
+
+
+def turn_marker(idempotency_key: Optional[str], payload: bytes) -> str:
+    """Identificativo della richiesta salvato sulla sessione: la chiave del client o l'hash del contenuto."""
+    if idempotency_key:
+        return f"key:{idempotency_key}"
+    return f"sha256:{hashlib.sha256(payload).hexdigest()}"
+
+
+def completed_result(session: Any, marker: str, ttl: float) -> Optional[Any]:
+    """
+    Risultato dell'ultimo turno completato della sessione, se è stato prodotto dalla stessa richiesta.
+
+    Senza ``Idempotency-Key`` una risposta identica arrivata entro ``ttl``
+    secondi viene trattata come un reinvio: i client che possono inviare due
+    volte gli stessi byte come risposte diverse devono usare la chiave.
+    """
+    last = getattr(session, "last_turn", None)
+    if not last or last["marker"] != marker or time.time() - last["at"] > ttl:
+        return None
+    return last["result"]
+
+
+def record_result(session: Any, marker: str, result: Any) -> None:
+    """Memorizza sulla sessione l'ultimo turno completato (va poi salvata nello store)."""
+    session.last_turn = {"marker": marker, "result": result, "at": time.time()}
+
+
+async def run_locked_turn(
+    sessions: MutableMapping[str, Any],
+    user_id: str,
+    marker: str,
+    load: Callable[[], Any],
+    save: Callable[[Any], None],
+    turn: Callable[[], Awaitable[Any]],
+    ttl: float,
+) -> Any:
+    """
+    Esegue ``turn`` con il lock di sessione, a meno che la sessione non l'abbia già completato.
+
+    Args:
+        sessions: Store delle sessioni (per il lock inter-processo)
+        user_id: ID dell'utente
+        marker: Identificativo della richiesta (``turn_marker``)
+        load: Legge la sessione dallo store
+        save: Salva la sessione nello store
+        turn: Coroutine function che esegue il turno (e ne salva lo stato)
+        ttl: Secondi entro cui un reinvio riceve il risultato memorizzato
+
+    Returns:
+        Il risultato del turno, o quello memorizzato sulla sessione per un reinvio
+    """
+    async with session_lock(user_id, sessions):
+        result = completed_result(load(), marker, ttl)
+        if result is not None:
+            metrics.increment("idempotent_replays")
+            logger.info(f"Turno già completato per {user_id}: riuso il risultato salvato sulla sessione")
+            return result
+        result = await turn()
+        # Il turno ha salvato il proprio stato: il risultato va sulla versione salvata
+        session = load()
+        record_result(session, marker, result)
+        save(session)
+        return result
+
+
+class TurnResultCache:
+    """Risultati dei turni conservati per ``ttl`` secondi, con attesa sui turni in corso."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # chiave -> (scadenza, future del risultato); scadenza None = turno in corso
+        self._entries: Dict[str, Tuple[Any, asyncio.Future]] = {}
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, (exp, _) in self._entries.items() if exp is not None and exp <= now]
+        for k in expired:
+            del self._entries[k]
+
+    async def run(self, key: str, turn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Esegue ``turn`` una sola volta per chiave.
+
+        Args:
+            key: Chiave di idempotenza della richiesta
+            turn: Funzione che esegue il turno e restituisce la risposta
+
+        Returns:
+            Il risultato del turno, eventualmente quello già calcolato per la stessa chiave
+        """
+        self._purge()
+        entry = self._entries.get(key)
+        if entry is not None:
+            metrics.increment("idempotent_replays")
+            logger.info(f"Richiesta duplicata ({key[:40]}...): riuso il risultato del turno originale")
+            return await asyncio.shield(entry[1])
+
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = (None, future)
+        try:
+            result = await turn()
+        except BaseException as e:
+            # Un turno fallito non viene memorizzato: un nuovo invio lo riesegue
+            del self._entries[key]
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # evita il warning se nessuno è in attesa
+            else:
+                future.cancel()
+            raise
+        future.set_result(result)
+        self._entries[key] = (time.monotonic() + self.ttl, future)
+        return result
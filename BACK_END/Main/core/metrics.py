@@ -0,0 +1,52 @@
+"""
+Metriche applicative in-process: contatori e tempi osservati.
+
+Sono volutamente semplici (nessuna dipendenza esterna) e vengono esposte
+dall'endpoint ``/metrics``. Ogni worker espone le proprie.
+"""
+
+from typing import Any, Dict
+from contextlib import contextmanager
+import threading
+import time
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1.0) -> None:
+    """Incrementa il contatore ``name``."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0.0) + value
+
+
+def observe(name: str, seconds: float) -> None:
+    """Registra una durata (o un'altra grandezza) nella serie ``name``."""
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            stats = _timings[name] = {"count": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+        stats["count"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+        stats["last"] = seconds
+
+
+@contextmanager
+def timed(name: str):
+    """Context manager che registra in ``name`` la durata del blocco."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def snapshot() -> Dict[str, Any]:
+    """Restituisce una copia serializzabile di tutte le metriche."""
+    with _lock:
+        timings = {}
+        for name, stats in _timings.items():
+            timings[name] = dict(stats, avg=stats["total"] / stats["count"] if stats["count"] else 0.0)
+        return {"counters": dict(_counters), "timings": timings}
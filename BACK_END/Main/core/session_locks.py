@@ -0,0 +1,119 @@
+"""
+Lock asincroni per sessione.
+
+Le richieste che modificano la stessa sessione (stesso ``user_id``) vengono
+serializzate, mentre sessioni diverse restano completamente parallele.
+Con lo store condiviso su file (STATE_BACKEND=file) al lock asincrono si
+aggiunge un lock di file, così la serializzazione vale anche tra worker.
+"""
+
+from typing import Any, Dict, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import time
+
+from Main.core import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo lock in-process
+    fcntl = None
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+# user_id -> lock e numero di richieste che lo stanno usando (o aspettando)
+_locks: Dict[str, asyncio.Lock] = {}
+_holders: Dict[str, int] = {}
+
+
+def _release_ref(user_id: str) -> None:
+    """Rimuove il lock quando nessuna richiesta lo usa più."""
+    _holders[user_id] -= 1
+    if _holders[user_id] == 0:
+        del _holders[user_id]
+        del _locks[user_id]
+
+
+# Intervallo di polling del lock di file (raddoppia fino al massimo)
+FILE_LOCK_POLL_SECONDS = 0.005
+FILE_LOCK_MAX_POLL_SECONDS = 0.1
+
+
+async def _acquire_file_lock(path: str):
+    """
+    Lock esclusivo sul file ``path``, con tentativi non bloccanti.
+
+    Niente ``flock`` bloccante in un thread: se l'attesa viene annullata (client
+    disconnesso) il thread prenderebbe comunque il lock senza che nessuno lo
+    rilasci, bloccando per sempre la sessione in tutti i worker.
+    """
+    f = open(path, "a+")
+    delay = FILE_LOCK_POLL_SECONDS
+    try:
+        while True:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, FILE_LOCK_MAX_POLL_SECONDS)
+    except BaseException:
+        f.close()
+        raise
+
+
+def _release_file_lock(f) -> None:
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    finally:
+        f.close()
+
+
+@asynccontextmanager
+async def session_lock(user_id: str, store: Optional[Any] = None):
+    """
+    Serializza i turni di una sessione.
+
+    Args:
+        user_id: ID dell'utente proprietario della sessione
+        store: Store delle sessioni; se espone ``lock_path`` viene preso anche
+            il lock inter-processo
+
+    Il tempo di attesa viene registrato nella metrica ``session_lock_wait_seconds``.
+    """
+    lock = _locks.get(user_id)
+    if lock is None:
+        lock = _locks[user_id] = asyncio.Lock()
+    _holders[user_id] = _holders.get(user_id, 0) + 1
+
+    contended = lock.locked()
+    t0 = time.perf_counter()
+    file_lock = None
+    try:
+        await lock.acquire()
+        try:
+            lock_path = getattr(store, "lock_path", None)
+            if fcntl is not None and lock_path is not None:
+                file_lock = await _acquire_file_lock(lock_path(user_id))
+        except BaseException:
+            lock.release()
+            raise
+    except BaseException:
+        _release_ref(user_id)
+        raise
+
+    wait = time.perf_counter() - t0
+    metrics.observe("session_lock_wait_seconds", wait)
+    if contended:
+        metrics.increment("session_lock_contended")
+        logger.info(f"Richiesta concorrente per la sessione {user_id}: attesa {wait:.3f}s")
+
+    try:
+        yield
+    finally:
+        if file_lock is not None:
+            _release_file_lock(file_lock)
+        lock.release()
+        _release_ref(user_id)
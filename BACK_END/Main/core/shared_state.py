@@ -0,0 +1,175 @@
+"""
+Stato condiviso tra più worker (uvicorn --workers N o più pod).
+
+Con il backend ``memory`` (default) sessioni e banca domande restano nei
+globali del processo, esattamente come prima. Con il backend ``file``:
+
+* le sessioni vengono serializzate (pickle) in ``SHARED_STATE_DIR/sessions``,
+  un file per utente, scritto in modo atomico (file temporaneo + rename);
+* la banca domande (SCRIPT, DOMANDE e stato dei metadati) viene pubblicata
+  come artefatto JSON ``SHARED_STATE_DIR/question_bank.json`` che ogni worker
+  rilegge solo quando cambia.
+
+La directory può essere un volume condiviso tra i pod.
+"""
+
+from typing import Any, Dict, Iterator, Optional
+from collections.abc import MutableMapping
+from datetime import datetime
+import json
+import logging
+import os
+import pickle
+import tempfile
+import urllib.parse
+
+from Main.core import config
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_FILE = "question_bank.json"
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Scrive ``data`` in ``path`` tramite file temporaneo e rename atomico."""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileSessionStore(MutableMapping):
+    """
+    Store delle sessioni su file, con la stessa interfaccia di un ``dict``.
+
+    Ogni accesso in lettura restituisce una copia deserializzata: dopo aver
+    modificato una sessione bisogna riassegnarla (``store[uid] = session``)
+    perché le modifiche siano visibili agli altri worker.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = os.path.join(directory, "sessions")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, uid: str) -> str:
+        return os.path.join(self.directory, urllib.parse.quote(uid, safe="") + ".pkl")
+
+    def lock_path(self, uid: str) -> str:
+        """Percorso del file usato per il lock inter-processo della sessione."""
+        return os.path.join(self.directory, urllib.parse.quote(uid, safe="") + ".lock")
+
+    def __getitem__(self, uid: str) -> Any:
+        try:
+            with open(self._path(uid), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            raise KeyError(uid)
+
+    def __setitem__(self, uid: str, session: Any) -> None:
+        atomic_write(self._path(uid), pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def __delitem__(self, uid: str) -> None:
+        try:
+            os.unlink(self._path(uid))
+        except FileNotFoundError:
+            raise KeyError(uid)
+
+    def __contains__(self, uid: object) -> bool:
+        return isinstance(uid, str) and os.path.exists(self._path(uid))
+
+    def __iter__(self) -> Iterator[str]:
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                yield urllib.parse.unquote(name[:-4])
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".pkl"))
+
+
+def is_shared() -> bool:
+    """True se lo stato è condiviso tra processi (backend ``file``)."""
+    return config.STATE_BACKEND == "file"
+
+
+def create_session_store() -> MutableMapping:
+    """Crea lo store delle sessioni in base a ``STATE_BACKEND``."""
+    if is_shared():
+        logger.info(f"Sessioni condivise su file in {config.SHARED_STATE_DIR}")
+        return FileSessionStore(config.SHARED_STATE_DIR)
+    if config.STATE_BACKEND != "memory":
+        logger.warning(f"STATE_BACKEND '{config.STATE_BACKEND}' non riconosciuto, uso 'memory'")
+    return {}
+
+
+# -----------------------------------------------------------------------------
+# Banca domande condivisa
+# -----------------------------------------------------------------------------
+
+def _question_bank_path() -> str:
+    return os.path.join(config.SHARED_STATE_DIR, QUESTION_BANK_FILE)
+
+
+def _json_default(value: Any) -> Any:
+    """Serializza datetime e array numpy (vettori dei metadati)."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def publish_question_bank(script: list, domande: list, status: Dict[str, Any]) -> Optional[int]:
+    """
+    Pubblica SCRIPT, DOMANDE e lo stato dei metadati per gli altri worker.
+
+    Returns:
+        La versione pubblicata (mtime dell'artefatto) o None se lo stato non è condiviso
+    """
+    if not is_shared():
+        return None
+    os.makedirs(config.SHARED_STATE_DIR, exist_ok=True)
+    payload = {"script": script, "domande": domande, "status": status}
+    path = _question_bank_path()
+    atomic_write(path, json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8"))
+    return os.stat(path).st_mtime_ns
+
+
+def load_question_bank(known_version: Optional[int]) -> Optional[Dict[str, Any]]:
+    """
+    Rilegge la banca domande condivisa se è cambiata rispetto a ``known_version``.
+
+    Returns:
+        Dizionario con ``script``, ``domande``, ``status`` e ``version``,
+        oppure None se non c'è nulla di nuovo (o lo stato non è condiviso)
+    """
+    if not is_shared():
+        return None
+    path = _question_bank_path()
+    try:
+        version = os.stat(path).st_mtime_ns
+        if version == known_version:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            bank = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Errore nella lettura della banca domande condivisa: {e}")
+        return None
+
+    # I datetime dello stato tornano oggetti datetime come nel worker d'origine
+    status = bank.get("status", {})
+    for key in ("start_time", "end_time"):
+        if isinstance(status.get(key), str):
+            status[key] = datetime.fromisoformat(status[key])
+    bank["version"] = version
+    return bank
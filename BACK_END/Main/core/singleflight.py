@@ -0,0 +1,94 @@
+"""
+Coalescenza di richieste identiche contemporanee ("single flight").
+
+La prima richiesta per una chiave esegue il lavoro; quelle che arrivano mentre
+è in corso ne attendono il risultato invece di ripeterlo. Serve quando una
+coorte di candidati avvia la stessa intervista: decine di richieste per lo
+stesso audio mancano la cache nello stesso istante e senza coalescenza
+chiamerebbero tutte il provider.
+
+Le chiamate in corso sono ``concurrent.futures.Future``, così thread (pool di
+Polly, pre-sintesi) e coroutine condividono lo stesso lavoro. Il lavoro del
+leader non viene annullato se il suo client si disconnette: altri possono
+attenderlo e il risultato finisce comunque in cache. Contatori
+``singleflight_<nome>_leader`` e ``singleflight_<nome>_coalesced``.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+from concurrent import futures
+import asyncio
+import logging
+import threading
+
+from Main.core import metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Registro delle chiamate in corso per chiave."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, futures.Future] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Tuple[futures.Future, bool]:
+        """
+        Restituisce la chiamata in corso per ``key`` e se il chiamante ne è il leader.
+
+        Il leader deve concluderla con ``resolve``; gli altri ne attendono il risultato.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                metrics.increment(f"singleflight_{self.name}_coalesced")
+                return call, False
+            call = self._calls[key] = futures.Future()
+        metrics.increment(f"singleflight_{self.name}_leader")
+        return call, True
+
+    def resolve(self, key: str, call: futures.Future, result: Any = None, error: BaseException = None) -> None:
+        """Conclude la chiamata del leader e la rimuove dal registro."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if call.done():
+            return
+        if error is not None:
+            call.set_exception(error)
+        else:
+            call.set_result(result)
+
+    async def run(self, key: str, work: Callable[[], Awaitable[T]]) -> T:
+        """Esegue ``work`` una sola volta per le richieste contemporanee con la stessa chiave."""
+        call, leader = self.claim(key)
+        if leader:
+            task = asyncio.ensure_future(work())
+
+            def done(t: asyncio.Future) -> None:
+                if t.cancelled():
+                    self.resolve(key, call, error=futures.CancelledError())
+                else:
+                    self.resolve(key, call, result=t.result() if t.exception() is None else None,
+                                 error=t.exception())
+
+            task.add_done_callback(done)
+        # shield: la disconnessione di un client non annulla il lavoro condiviso
+        return await asyncio.shield(asyncio.wrap_future(call))
+
+    def run_sync(self, key: str, work: Callable[[], T]) -> T:
+        """Come ``run``, per codice bloccante (in un thread)."""
+        call, leader = self.claim(key)
+        if leader:
+            try:
+                result = work()
+            except BaseException as e:
+                self.resolve(key, call, error=e)
+                raise
+            self.resolve(key, call, result=result)
+            return result
+        return call.result()
@@ -0,0 +1,74 @@
+"""
+Strumenti per il percorso critico di un turno d'intervista.
+
+Un turno deve restituire al candidato la prossima domanda il prima possibile:
+solo le fasi da cui dipende (trascrizione, analisi della risposta, scelta
+della domanda) restano nella richiesta. Il resto (riflessioni, log di debug
+della sessione) viene eseguito dopo la risposta con ``run_in_background``.
+
+``StageTimings`` misura le singole fasi: i tempi finiscono nelle metriche
+(``turn_stage_<fase>_seconds``) e nella risposta del turno, così si vede
+quanto pesa ogni fase sul percorso critico.
+"""
+
+from typing import Awaitable, Dict, Set
+from contextlib import contextmanager
+import asyncio
+import logging
+import time
+
+from Main.core import metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+# Riferimenti ai task in background, altrimenti il garbage collector può interromperli
+_background: Set[asyncio.Task] = set()
+
+
+class StageTimings:
+    """Durate delle fasi di un turno, in ordine di esecuzione."""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._stages[name] = self._stages.get(name, 0.0) + elapsed
+            metrics.observe(f"turn_stage_{name}_seconds", elapsed)
+
+    def as_dict(self) -> Dict[str, float]:
+        """Durate in millisecondi, più il totale del percorso critico."""
+        result = {name: round(seconds * 1000, 1) for name, seconds in self._stages.items()}
+        result["critical_path"] = round((time.perf_counter() - self._start) * 1000, 1)
+        return result
+
+
+def run_in_background(name: str, work: Awaitable) -> asyncio.Task:
+    """
+    Esegue ``work`` fuori dal percorso critico, registrandone durata ed errori.
+
+    Args:
+        name: Nome della fase (per log e metriche)
+        work: Coroutine da eseguire
+    """
+    async def runner():
+        t0 = time.perf_counter()
+        try:
+            await work
+        except Exception as e:
+            metrics.increment(f"turn_background_{name}_errors")
+            logger.error(f"Errore nella fase in background '{name}': {e}", exc_info=True)
+        finally:
+            metrics.observe(f"turn_background_{name}_seconds", time.perf_counter() - t0)
+
+    task = asyncio.create_task(runner())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
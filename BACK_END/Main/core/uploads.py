@@ -0,0 +1,110 @@
+"""
+Gestione degli upload senza caricare interi file in memoria.
+
+* ``UploadLimitMiddleware`` rifiuta con 413 i corpi oltre il limite del
+  percorso: subito se ``Content-Length`` lo dichiara, altrimenti appena i
+  byte ricevuti lo superano (upload chunked), senza attendere la fine.
+* Starlette salva i file multipart in uno spool (su disco oltre 1 MB): le
+  funzioni di questo modulo lo leggono a blocchi di ``UPLOAD_CHUNK_SIZE``,
+  così la memoria usata da una richiesta non dipende dalla dimensione del file.
+"""
+
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+import hashlib
+import logging
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from Main.core import config, metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+
+def _too_large(limit: int) -> HTTPException:
+    metrics.increment("upload_rejected_too_large")
+    return HTTPException(status_code=413, detail=f"Upload troppo grande (massimo {limit} byte)")
+
+
+class UploadLimitMiddleware:
+    """Middleware ASGI con un limite di dimensione del corpo per prefisso di percorso."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        # Prefissi più lunghi prima, così vince il limite più specifico
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit_for(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            error = _too_large(limit)
+            logger.warning(f"Upload rifiutato su {scope['path']}: {int(content_length)} byte dichiarati")
+            response = JSONResponse({"detail": error.detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    logger.warning(f"Upload interrotto su {scope['path']}: oltre {limit} byte")
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def iter_upload(upload: UploadFile, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Legge un file caricato a blocchi, dall'inizio."""
+    chunk_size = chunk_size or config.UPLOAD_CHUNK_SIZE
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def upload_digest(upload: UploadFile) -> str:
+    """sha256 del contenuto di un file caricato, calcolato a blocchi."""
+    digest = hashlib.sha256()
+    async for chunk in iter_upload(upload):
+        digest.update(chunk)
+    await upload.seek(0)
+    return digest.hexdigest()
+
+
+async def copy_upload(upload: UploadFile, destination: BinaryIO, max_bytes: int) -> int:
+    """
+    Copia un file caricato su ``destination`` a blocchi.
+
+    Returns:
+        Il numero di byte copiati
+
+    Raises:
+        HTTPException: 413 se il file supera ``max_bytes``
+    """
+    copied = 0
+    async for chunk in iter_upload(upload):
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise _too_large(max_bytes)
+        destination.write(chunk)
+    return copied
@@ -0,0 +1,72 @@
+"""
+Stato dell'intervista tenuto da ogni worker: sessioni e banca domande.
+
+Con STATE_BACKEND=memory (default) sono semplici globali del processo. Con
+STATE_BACKEND=file ``SESSIONS`` è lo store condiviso su file (dopo ogni
+modifica la sessione va salvata con ``save_state``) e la banca domande viene
+pubblicata con ``publish_bank`` e riallineata con ``sync_question_bank``.
+
+``SCRIPT`` e ``DOMANDE`` vengono aggiornate sul posto: gli altri moduli ne
+tengono il riferimento (``from Main.api.routes_interview import DOMANDE``).
+Il modulo non dipende dalle librerie NLP, così lo si può usare (e
+verificare) anche nei processi che non caricano i modelli.
+"""
+
+from typing import Any, Dict, List, MutableMapping, Optional
+import logging
+import threading
+
+from Main.core.shared_state import create_session_store, load_question_bank, publish_question_bank
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+# Con STATE_BACKEND=file le sessioni sono condivise tra worker: dopo ogni
+# modifica vanno salvate con save_state()
+SESSIONS: MutableMapping[str, Any] = create_session_store()
+SCRIPT: List[Dict[str, Any]] = []
+DOMANDE: List[Dict[str, Any]] = []
+
+metadata_processing_status = {
+    'total_questions': 0,
+    'processed_questions': 0,
+    'in_progress': False,
+    'start_time': None,
+    'end_time': None,
+    'error': None
+}
+
+# Versione della banca domande condivisa già caricata da questo worker
+_question_bank_version: Optional[int] = None
+_question_bank_lock = threading.Lock()
+
+
+def publish_bank() -> None:
+    """Pubblica SCRIPT/DOMANDE/stato metadati per gli altri worker (solo backend 'file')."""
+    global _question_bank_version
+    with _question_bank_lock:
+        try:
+            version = publish_question_bank(SCRIPT, DOMANDE, metadata_processing_status)
+            if version is not None:
+                _question_bank_version = version
+        except Exception as e:
+            logger.error(f"Errore nella pubblicazione della banca domande condivisa: {e}")
+
+
+def sync_question_bank() -> None:
+    """Allinea SCRIPT e DOMANDE di questo worker con la banca domande condivisa, se cambiata."""
+    global _question_bank_version
+    with _question_bank_lock:
+        bank = load_question_bank(_question_bank_version)
+        if bank is None:
+            return
+        SCRIPT[:] = bank["script"]
+        DOMANDE[:] = bank["domande"]
+        metadata_processing_status.update(bank["status"])
+        _question_bank_version = bank["version"]
+        logger.info(f"Banca domande condivisa sincronizzata: {len(DOMANDE)} domande")
+
+
+def save_state(session: Any) -> None:
+    """Rende persistenti le modifiche a una sessione (necessario con lo store condiviso)."""
+    SESSIONS[session.user_id] = session
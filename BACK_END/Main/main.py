@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 import os
 import sys
@@ -8,6 +9,11 @@ import atexit
 
 # Configurazione centralizzata
 from Main.core import config
+from Main.core import metrics
+from Main.core import hedging
+from Main.core.admission import controller as admission_controller
+from Main.core.uploads import UploadLimitMiddleware
+from Main.services.audio_cache import audio_cache
 from Main.services.persistence_service import dump_dev_storage_to_file
 
 # Configurazione di logging centralizzata
@@ -67,6 +73,15 @@ origins = ["*"] if config.DEVELOPMENT_MODE else [
     "https://aiint.app"         # Dominio di produzione
 ]
 
+# Limiti di dimensione degli upload (aggiunto prima di CORS, così anche i 413 hanno gli header CORS)
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/api/interview/transcribe": config.MAX_AUDIO_UPLOAD_BYTES,
+        "/api/questions/load": config.MAX_QUESTIONS_UPLOAD_BYTES,
+    }
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -88,6 +103,12 @@ app.include_router(interview_router, prefix="/api/interview", tags=["interview"]
 #app.include_router(interview_router, prefix="/api", tags=["first_prompt"])
 #app.include_router(interview_router, prefix="/api/transcribe", tags=["transcribe"])
 
+@app.on_event("startup")
+async def preload_audio_cache():
+    """Rimuove i file delle vecchie cache e porta in memoria le clip più richieste prima delle prime interviste."""
+    await asyncio.to_thread(audio_cache.remove_legacy_files)
+    await asyncio.to_thread(audio_cache.preload, config.AUDIO_HOT_PRELOAD)
+
 # Endpoint informativi
 @app.get("/")
 async def root():
@@ -99,6 +120,7 @@ async def root():
             "/api/token - Autenticazione (username: admin, password: admin)",
             "/api/check-token - Verifica validità token",
             "/api/tts/speak - Sintesi vocale (versione semplificata)",
+            "/api/tts/audio/{audio_id} - Audio di una domanda per ID (cacheabile, con Range)",
             "/api/tts/status - Stato del servizio TTS",
             "/api/questions/load - Carica domande (mock)",
             "/api/questions/list - Elenco domande disponibili",
@@ -108,7 +130,8 @@ async def root():
             "/api/interview/next-question/{interview_id} - Ottieni prossima domanda",
             "/api/interview/submit-answer/{interview_id}/{question_id} - Invia risposta",
             "/api/interview/status/{interview_id} - Stato intervista",
-            "/api/interview/end/{interview_id} - Termina intervista"
+            "/api/interview/end/{interview_id} - Termina intervista",
+            "/metrics - Metriche del worker"
         ],
         "nota": "Implementazione incrementale - funzionalità in espansione"
     }
@@ -117,6 +140,17 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Metriche del worker corrente (attese sui lock di sessione, tempi, contatori)."""
+    return {
+        "pid": os.getpid(),
+        "admission": admission_controller.snapshot(),
+        "hedging": hedging.snapshot(),
+        "audio_cache": await asyncio.to_thread(audio_cache.stats),
+        **metrics.snapshot()
+    }
+
 # Avvio del server
 if __name__ == "__main__":
     try:
@@ -0,0 +1,373 @@
+"""
+Cache unica dell'audio sintetizzato (Polly e OpenAI TTS).
+
+* Chiave canonica: sha256 di provider, voce, motore/modello, formato e testo
+  normalizzato (Unicode NFC, spazi compattati), così lo stesso contenuto ha la
+  stessa chiave qualunque sia il percorso che lo richiede.
+* File in sottocartelle ``ab/cd/<chiave>.<formato>`` (nessuna directory enorme
+  da scorrere), scritti con file temporaneo e rename atomico: sicuri anche con
+  più worker.
+* Indice SQLite (``index.sqlite3``, in WAL) con dimensione, ultimo accesso e
+  hit di ogni voce: quando la cache supera ``AUDIO_CACHE_MAX_BYTES`` vengono
+  eliminate le voci usate meno di recente. Il totale dei byte è un contatore
+  aggiornato nella stessa transazione di ogni scrittura ed eliminazione. Hit
+  e miss sono contati nell'indice e sono condivisi tra i worker.
+* L'indice conserva anche voce e testo degli audio registrati per ID
+  (``set_source``), così ogni worker può generare e servire ``/tts/audio/{id}``.
+
+Davanti al disco c'è un livello in memoria (LRU con budget in byte,
+``AUDIO_HOT_CACHE_BYTES``) per le clip servite a ogni intervista: intro,
+follow-up e richieste di chiarimento ricorrenti. Un hit in memoria non tocca
+né il disco né l'indice, e nemmeno un hit su disco scrive nell'indice: gli
+accessi (ultimo uso, hit) si accumulano nel worker e vengono riportati a
+blocchi alla scrittura successiva o al più ogni ``ACCESS_FLUSH_SECONDS``.
+All'avvio ``preload`` carica le clip più richieste e ``remove_legacy_files``
+elimina i file delle vecchie cache.
+
+Le operazioni su disco sono sincrone (file e SQLite); dai contesti asincroni si
+usano ``get_async`` e ``put_async``, che le eseguono in un thread solo se
+l'audio non è già in memoria.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from Main.core import config, metrics
+from Main.core.shared_state import atomic_write
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.sqlite3"
+# Dopo un'eliminazione la cache scende a questa frazione del limite
+EVICT_TARGET_RATIO = 0.9
+# Intervallo massimo tra due aggiornamenti a blocchi degli accessi nell'indice
+ACCESS_FLUSH_SECONDS = 5.0
+# Testi registrati per gli ID audio: dopo questo tempo l'ID non è più risolvibile
+SOURCE_TTL_SECONDS = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    provider TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sources (
+    key TEXT PRIMARY KEY,
+    voice TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sources_created ON sources(created);
+"""
+
+
+def normalize_text(text: str) -> str:
+    """Forma canonica del testo per la chiave: NFC e spazi compattati."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class AudioCache:
+    """Cache dell'audio su disco con indice SQLite ed eliminazione LRU per dimensione."""
+
+    def __init__(self, directory: str, max_bytes: int, hot_bytes: int = 0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, INDEX_FILENAME)
+        self._local = threading.local()
+        # Livello in memoria: chiave -> audio, con budget in byte
+        self.hot_bytes = hot_bytes
+        self._hot: "OrderedDict[str, bytes]" = OrderedDict()
+        self._hot_size = 0
+        self._hot_hits = 0
+        self._hot_lock = threading.Lock()
+        # Accessi non ancora riportati nell'indice (protetti da _hot_lock):
+        # chiave -> hit, più hit e miss su disco per i contatori condivisi
+        self._pending_access: Dict[str, int] = {}
+        self._pending_counts: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+            # Totale dei byte in cache: calcolato una volta, poi aggiornato a ogni scrittura
+            db.execute("INSERT OR IGNORE INTO counters(name, value) "
+                       "SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+
+    def remove_legacy_files(self) -> None:
+        """
+        Rimuove i file delle vecchie cache (md5 nella radice), non più raggiungibili.
+
+        Passo di migrazione esplicito, eseguito all'avvio del server: creare la
+        cache (import del modulo, test, strumenti) non elimina nulla.
+        """
+        removed = 0
+        for name in os.listdir(self.directory):
+            if re.fullmatch(r"[0-9a-f]{32}\.\w+", name):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Cache audio: rimossi {removed} file del vecchio formato")
+
+    @staticmethod
+    def key(provider: str, voice: str, engine: str, audio_format: str, text: str) -> str:
+        """Chiave canonica di un audio sintetizzato."""
+        canonical = "\x1f".join([provider, voice or "", engine or "", audio_format, normalize_text(text)])
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    # ---------- indice ----------
+    def _db(self) -> sqlite3.Connection:
+        """Connessione SQLite del thread corrente (usata come context manager transazionale)."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self._index_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _count(self, db: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        db.execute(
+            "INSERT INTO counters(name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def _record_access(self, key: Optional[str], counter: Optional[str] = None) -> None:
+        """Annota un accesso da riportare nell'indice con ``_flush_access``."""
+        with self._hot_lock:
+            if key is not None:
+                self._pending_access[key] = self._pending_access.get(key, 0) + 1
+            if counter is not None:
+                self._pending_counts[counter] = self._pending_counts.get(counter, 0) + 1
+            due = time.monotonic() - self._last_flush >= ACCESS_FLUSH_SECONDS
+        if due:
+            with self._db() as db:
+                self._flush_access(db)
+
+    def _file_path(self, key: str, audio_format: str) -> str:
+        return os.path.join(self.directory, key[:2], key[2:4], f"{key}.{audio_format}")
+
+    # ---------- livello in memoria ----------
+    def _hot_get(self, key: str) -> Optional[bytes]:
+        with self._hot_lock:
+            audio = self._hot.get(key)
+            if audio is None:
+                return None
+            self._hot.move_to_end(key)
+            self._hot_hits += 1
+        self._record_access(key)
+        metrics.increment("audio_cache_hit_memory")
+        return audio
+
+    def _hot_put(self, key: str, audio_bytes: bytes) -> None:
+        # Le clip più grandi di un quarto del budget resterebbero da sole in memoria
+        if len(audio_bytes) > self.hot_bytes // 4:
+            return
+        with self._hot_lock:
+            previous = self._hot.pop(key, None)
+            if previous is not None:
+                self._hot_size -= len(previous)
+            self._hot[key] = audio_bytes
+            self._hot_size += len(audio_bytes)
+            while self._hot_size > self.hot_bytes:
+                _, evicted = self._hot.popitem(last=False)
+                self._hot_size -= len(evicted)
+
+    def _flush_access(self, db: sqlite3.Connection) -> None:
+        """Riporta nell'indice, in una sola transazione, gli accessi accumulati dal worker."""
+        with self._hot_lock:
+            touched, self._pending_access = self._pending_access, {}
+            counts, self._pending_counts = self._pending_counts, {}
+            self._last_flush = time.monotonic()
+        if touched:
+            now = time.time()
+            db.executemany("UPDATE entries SET last_access = ?, hits = hits + ? WHERE key = ?",
+                           [(now, hits, key) for key, hits in touched.items()])
+        for name, amount in counts.items():
+            self._count(db, name, amount)
+
+    def get_memory(self, key: str) -> Optional[bytes]:
+        """Audio di ``key`` se è nel livello in memoria (nessun accesso a disco o indice), o None."""
+        return self._hot_get(key)
+
+    def preload(self, limit: int) -> int:
+        """Carica in memoria le ``limit`` clip più richieste, nel budget del livello in memoria."""
+        if not self.hot_bytes or limit <= 0:
+            return 0
+        with self._db() as db:
+            rows = db.execute("SELECT key, path FROM entries ORDER BY hits DESC LIMIT ?", (limit,)).fetchall()
+        loaded = 0
+        for key, path in rows:
+            try:
+                with open(path, "rb") as f:
+                    self._hot_put(key, f.read())
+                loaded += 1
+            except OSError:
+                continue
+        logger.info(f"Cache audio: {loaded} clip precaricate in memoria ({self._hot_size} bytes)")
+        return loaded
+
+    # ---------- API ----------
+    def path(self, key: str) -> Optional[str]:
+        """Percorso del file in cache (per lo streaming), o None se assente."""
+        with self._db() as db:
+            row = db.execute("SELECT path, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and not os.path.exists(row[0]):
+                # File eliminato da un altro worker o a mano: la voce non serve più
+                if db.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount:
+                    self._count(db, "bytes", -row[1])
+                row = None
+        if row is None:
+            self._record_access(None, "misses")
+            metrics.increment("audio_cache_miss")
+            return None
+        self._record_access(key, "hits")
+        metrics.increment("audio_cache_hit")
+        return row[0]
+
+    def contains(self, key: str) -> bool:
+        """Vero se ``key`` è in cache (senza contarlo come hit o miss)."""
+        with self._hot_lock:
+            if key in self._hot:
+                return True
+        with self._db() as db:
+            row = db.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+        return row is not None and os.path.exists(row[0])
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Audio in cache per ``key`` (dalla memoria se presente), o None."""
+        audio = self._hot_get(key)
+        if audio is not None:
+            return audio
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            # Eliminato da un altro worker tra la lettura dell'indice e l'apertura
+            return None
+        self._hot_put(key, audio)
+        return audio
+
+    def put(self, key: str, audio_bytes: bytes, audio_format: str, provider: str = "") -> Optional[str]:
+        """Salva l'audio e restituisce il percorso del file (None in caso di errore)."""
+        path = self._file_path(key, audio_format)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, audio_bytes)
+            now = time.time()
+            with self._db() as db:
+                self._flush_access(db)
+                previous = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries(key, path, size, provider, created, last_access, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, COALESCE((SELECT hits FROM entries WHERE key = ?), 0))",
+                    (key, path, len(audio_bytes), provider, now, now, key),
+                )
+                self._count(db, "bytes", len(audio_bytes) - (previous[0] if previous else 0))
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Impossibile salvare l'audio in cache: {e}")
+            return None
+        self._hot_put(key, audio_bytes)
+        self._evict()
+        return path
+
+    def set_source(self, key: str, voice: str, text: str) -> None:
+        """Registra voce e testo da cui si genera l'audio di ``key`` (per servirlo per ID)."""
+        now = time.time()
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO sources(key, voice, text, created) VALUES (?, ?, ?, ?)",
+                       (key, voice, text, now))
+            db.execute("DELETE FROM sources WHERE created < ?", (now - SOURCE_TTL_SECONDS,))
+
+    def source(self, key: str) -> Optional[Tuple[str, str]]:
+        """Voce e testo registrati per ``key``, o None."""
+        with self._db() as db:
+            row = db.execute("SELECT voice, text FROM sources WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _evict(self) -> None:
+        """Elimina le voci usate meno di recente finché la cache rientra nel limite."""
+        with self._db() as db:
+            (total,) = db.execute("SELECT value FROM counters WHERE name = 'bytes'").fetchone()
+            if total <= self.max_bytes:
+                return
+            target = int(self.max_bytes * EVICT_TARGET_RATIO)
+            victims = []
+            for key, path, size in db.execute("SELECT key, path, size FROM entries ORDER BY last_access"):
+                if total <= target:
+                    break
+                victims.append((key, path, size))
+                total -= size
+            freed = 0
+            for key, _, size in victims:
+                # Una voce già eliminata da un altro worker non va sottratta due volte
+                if db.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount:
+                    freed += size
+            self._count(db, "bytes", -freed)
+        # I file vengono rimossi dopo l'indice: un lettore concorrente vede al più un miss
+        for _, path, _ in victims:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        metrics.increment("audio_cache_evicted", len(victims))
+        logger.info(f"Cache audio: eliminate {len(victims)} voci usate meno di recente")
+
+    def stats(self) -> Dict[str, Any]:
+        """Voci, byte occupati e hit ratio (condivisi tra i worker)."""
+        with self._db() as db:
+            self._flush_access(db)
+            (entries,) = db.execute("SELECT COUNT(*) FROM entries").fetchone()
+            counters = dict(db.execute("SELECT name, value FROM counters").fetchall())
+        size = counters.get("bytes", 0)
+        with self._hot_lock:
+            hot = {"entries": len(self._hot), "bytes": self._hot_size,
+                   "max_bytes": self.hot_bytes, "hits": self._hot_hits}
+        # Gli hit in memoria sono del worker corrente, quelli su disco di tutti i worker
+        hits, misses = counters.get("hits", 0) + hot["hits"], counters.get("misses", 0)
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "memory": hot,
+        }
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        # Un hit in memoria non passa da un thread
+        audio = self._hot_get(key)
+        if audio is not None:
+            return audio
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, audio_bytes: bytes, audio_format: str, provider: str = "") -> Optional[str]:
+        return await asyncio.to_thread(self.put, key, audio_bytes, audio_format, provider)
+
+
+audio_cache = AudioCache(config.TTS_CACHE_DIR, config.AUDIO_CACHE_MAX_BYTES, config.AUDIO_HOT_CACHE_BYTES)
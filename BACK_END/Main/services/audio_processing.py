@@ -0,0 +1,598 @@
+"""
+Elaborazione audio con ffmpeg tramite pipe (nessun file temporaneo).
+
+Le registrazioni arrivano nel formato scelto dal browser (webm/opus stereo a
+48 kHz, ogg, mp4...). Per l'analisi, la segmentazione e la rimozione del
+silenzio (VAD) vengono decodificate in PCM mono 16 bit a 16 kHz, il formato
+nativo di Whisper; lo stesso PCM viene poi ricodificato in Opus mono 16 kHz a
+bitrate vocale per l'upload allo STT e per l'archiviazione. Per le risposte
+complete decodifica, VAD e ricodifica avvengono in streaming
+(``transcode_streaming``), a blocchi di PCM di dimensione fissa.
+
+I processi ffmpeg contemporanei sono limitati a ``TRANSCODE_WORKERS``. Un
+upload può essere passato come file (lo spool di ``UploadFile``): viene
+inviato a ffmpeg a blocchi, senza caricarlo tutto in memoria.
+"""
+
+from typing import BinaryIO, Deque, List, Optional, Tuple, Union
+from collections import deque
+import asyncio
+import io
+import logging
+import math
+import struct
+
+import numpy as np
+
+from Main.core import config, metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # PCM s16le
+
+# Finestra usata per cercare la pausa in cui tagliare un segmento
+FRAME_SECONDS = 0.02
+# Un frame è una pausa se la sua energia è sotto questa frazione della media
+PAUSE_ENERGY_RATIO = 0.1
+# Blocchi letti dallo stdout del decoder (~2 s di PCM a 16 kHz)
+PCM_CHUNK_SIZE = 64 * 1024
+
+
+class AudioDecodeError(RuntimeError):
+    """ffmpeg non è riuscito a decodificare l'audio."""
+
+
+# Pool di processi ffmpeg: limita le conversioni contemporanee (create alla prima richiesta,
+# perché il semaforo va legato all'event loop del server)
+_ffmpeg_slots: Optional[asyncio.Semaphore] = None
+
+
+# Audio in memoria oppure file letto a blocchi
+AudioSource = Union[bytes, BinaryIO]
+
+
+async def _feed_stdin(stdin: asyncio.StreamWriter, source: BinaryIO) -> None:
+    """Scrive ``source`` su stdin a blocchi, rispettando il backpressure della pipe."""
+    try:
+        source.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(source.read, config.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            stdin.write(chunk)
+            await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # ffmpeg ha chiuso l'ingresso (audio non decodificabile): l'errore arriva da stderr
+    finally:
+        stdin.close()
+
+
+def _read_source(source: AudioSource) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    source.seek(0)
+    return source.read()
+
+
+def _source_head(source: AudioSource, size: int = 4096 + 16) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:size])
+    source.seek(0)
+    head = source.read(size)
+    source.seek(0)
+    return head
+
+
+def _source_size(source: AudioSource) -> int:
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return source.seek(0, 2)
+
+
+async def _spawn_ffmpeg(args: List[str]) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        config.FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+
+
+async def _run_ffmpeg(args: List[str], data: AudioSource) -> Tuple[int, bytes, bytes]:
+    """Esegue ffmpeg con ``data`` su stdin e restituisce (exit code, stdout, stderr)."""
+    global _ffmpeg_slots
+    if _ffmpeg_slots is None:
+        _ffmpeg_slots = asyncio.Semaphore(config.TRANSCODE_WORKERS)
+    async with _ffmpeg_slots:
+        process = await _spawn_ffmpeg(args)
+        if isinstance(data, (bytes, bytearray)):
+            out, err = await process.communicate(data)
+        else:
+            _, out, err = await asyncio.gather(
+                _feed_stdin(process.stdin, data), process.stdout.read(), process.stderr.read()
+            )
+            await process.wait()
+        return process.returncode, out, err
+
+
+async def decode_to_pcm(audio_bytes: AudioSource, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Decodifica un audio qualsiasi supportato da ffmpeg in PCM s16le mono.
+
+    Args:
+        audio_bytes: Contenuto del file audio (anche un webm troncato durante la
+            registrazione), o un file da leggere a blocchi
+        sample_rate: Frequenza di campionamento di uscita
+
+    Returns:
+        I campioni PCM grezzi
+    """
+    returncode, pcm, err = await _run_ffmpeg(
+        ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"], audio_bytes
+    )
+    # Un webm ancora in registrazione termina a metà cluster: ffmpeg segnala
+    # l'errore ma restituisce comunque i campioni decodificati fino a lì
+    if returncode != 0 and not pcm:
+        raise AudioDecodeError(err.decode("utf-8", "replace").strip() or f"ffmpeg exit {returncode}")
+    return pcm[: len(pcm) - len(pcm) % SAMPLE_WIDTH]
+
+
+async def encode_opus(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Codifica PCM s16le mono in Opus (contenitore webm) a bitrate vocale.
+
+    Returns:
+        Il file webm/opus, da 6 a 10 volte più piccolo del WAV equivalente
+    """
+    returncode, audio, err = await _run_ffmpeg(
+        ["-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", config.TRANSCODE_OPUS_BITRATE, "-application", "voip",
+         "-f", "webm", "pipe:1"],
+        pcm,
+    )
+    if returncode != 0 or not audio:
+        raise AudioDecodeError(err.decode("utf-8", "replace").strip() or f"ffmpeg exit {returncode}")
+    return audio
+
+
+class StreamingDecoder:
+    """
+    Decodifica in PCM s16le mono un audio che arriva a blocchi (la registrazione
+    di MediaRecorder), con un solo processo ffmpeg: ogni byte viene decodificato
+    una volta sola.
+
+    Il PCM prodotto si accumula in ``pcm``; chi lo usa ne rimuove la parte già
+    elaborata con ``consume``. Il processo resta aperto per tutta la
+    registrazione e decodifica al suo ritmo, per questo non occupa uno slot di
+    ``TRANSCODE_WORKERS``.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.pcm = bytearray()
+        self._chunks: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def feed(self, chunk: bytes) -> None:
+        """Accoda un blocco dell'audio (il processo viene avviato al primo)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._chunks.put_nowait(chunk)
+
+    def consume(self, n_bytes: int) -> None:
+        """Scarta i primi ``n_bytes`` di PCM, già elaborati."""
+        del self.pcm[:n_bytes]
+
+    async def _run(self) -> None:
+        process = await _spawn_ffmpeg(
+            ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(self.sample_rate),
+             "-flush_packets", "1", "pipe:1"]
+        )
+        decoded = 0
+
+        async def write() -> None:
+            try:
+                while (chunk := await self._chunks.get()) is not None:
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg ha chiuso l'ingresso: l'errore arriva da stderr
+            finally:
+                process.stdin.close()
+
+        async def read() -> None:
+            nonlocal decoded
+            while data := await process.stdout.read(PCM_CHUNK_SIZE):
+                decoded += len(data)
+                self.pcm.extend(data)
+
+        try:
+            _, _, err = await asyncio.gather(write(), read(), process.stderr.read())
+            await process.wait()
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        # Come in decode_to_pcm: un webm troncato produce comunque i campioni fino al taglio
+        if process.returncode != 0 and not decoded:
+            raise AudioDecodeError(err.decode("utf-8", "replace").strip() or f"ffmpeg exit {process.returncode}")
+        if len(self.pcm) % SAMPLE_WIDTH:
+            del self.pcm[-1:]
+
+    def failed(self) -> bool:
+        """True se il processo è già terminato con un errore (es. ffmpeg mancante)."""
+        return self._task is not None and self._task.done() and (
+            self._task.cancelled() or self._task.exception() is not None)
+
+    async def close(self) -> None:
+        """
+        Chiude l'ingresso e attende la decodifica dei blocchi rimasti.
+
+        Raises:
+            AudioDecodeError: ffmpeg non ha prodotto alcun campione
+            OSError: ffmpeg non disponibile
+        """
+        if self._task is None:
+            return
+        self._chunks.put_nowait(None)
+        await self._task
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+def is_compact_opus(audio_bytes: bytes) -> bool:
+    """
+    True se l'audio è già Opus mono a 16 kHz o meno (nessuna conversione necessaria).
+
+    Legge l'intestazione ``OpusHead`` all'inizio del file (webm o ogg): canali
+    al byte 9, frequenza di ingresso little-endian ai byte 12-15.
+    """
+    pos = audio_bytes.find(b"OpusHead", 0, 4096)
+    if pos < 0 or len(audio_bytes) < pos + 16:
+        return False
+    channels = audio_bytes[pos + 9]
+    (input_rate,) = struct.unpack_from("<I", audio_bytes, pos + 12)
+    return channels == 1 and 0 < input_rate <= SAMPLE_RATE
+
+
+def pcm_duration(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> float:
+    """Durata in secondi di un buffer PCM s16le mono."""
+    return len(pcm) / (SAMPLE_WIDTH * sample_rate)
+
+
+def find_pause(pcm: bytes, start: int, min_samples: int, max_samples: int,
+               sample_rate: int = SAMPLE_RATE) -> Optional[int]:
+    """
+    Cerca il punto più silenzioso in cui tagliare un segmento.
+
+    Args:
+        pcm: Buffer PCM s16le mono
+        start: Campione da cui inizia il segmento
+        min_samples: Lunghezza minima del segmento
+        max_samples: Lunghezza massima del segmento (o fine del buffer se precede)
+
+    Returns:
+        L'indice (in campioni) del centro del frame a energia minima, o None se
+        il buffer non contiene ancora un segmento lungo almeno ``min_samples``
+        che termini in una pausa
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    end = min(len(samples), start + max_samples)
+    if end - start < min_samples:
+        return None
+    frame = max(1, int(sample_rate * FRAME_SECONDS))
+    window = samples[start + min_samples - frame: end].astype(np.float32)
+    n_frames = len(window) // frame
+    if n_frames == 0:
+        return None
+    energy = np.square(window[: n_frames * frame].reshape(n_frames, frame)).mean(axis=1)
+    quietest = int(np.argmin(energy))
+    # Finché il segmento non ha raggiunto la lunghezza massima si taglia solo in
+    # una pausa vera, per non spezzare una parola a metà
+    reached_max = end - start >= max_samples
+    if not reached_max and energy[quietest] > PAUSE_ENERGY_RATIO * energy.mean():
+        return None
+    return start + min_samples - frame + quietest * frame + frame // 2
+
+
+# -----------------------------------------------------------------------------
+# Voice activity detection e rimozione del silenzio
+# -----------------------------------------------------------------------------
+
+VAD_FRAME_SECONDS = 0.03
+# Energia minima (RMS su scala int16) perché un frame possa essere voce,
+# e margine sopra il rumore di fondo stimato sulla registrazione
+VAD_MIN_RMS = 300.0
+VAD_NOISE_FACTOR = 3.0
+# Margine mantenuto prima e dopo ogni tratto di voce
+VAD_PADDING_SECONDS = 0.2
+
+
+def detect_speech(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    VAD a energia: individua i tratti di voce in un buffer PCM s16le mono.
+
+    La soglia si adatta alla registrazione: un frame è voce se il suo RMS supera
+    sia ``VAD_MIN_RMS`` sia ``VAD_NOISE_FACTOR`` volte il rumore di fondo
+    (10° percentile degli RMS dei frame).
+
+    Returns:
+        Lista di intervalli (inizio, fine) in campioni, già estesi del margine
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame = int(sample_rate * VAD_FRAME_SECONDS)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+    frames = samples[: n_frames * frame].astype(np.float32).reshape(n_frames, frame)
+    rms = np.sqrt(np.square(frames).mean(axis=1))
+    threshold = max(VAD_MIN_RMS, VAD_NOISE_FACTOR * float(np.percentile(rms, 10)))
+    voiced = rms > threshold
+
+    regions: List[Tuple[int, int]] = []
+    padding = int(sample_rate * VAD_PADDING_SECONDS)
+    # Bordi dei tratti di voce: +1 dove inizia, -1 dove finisce
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    for start_frame, end_frame in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        start = max(0, int(start_frame) * frame - padding)
+        end = min(len(samples), int(end_frame) * frame + padding)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def trim_silence(pcm: bytes, max_pause: float, sample_rate: int = SAMPLE_RATE) -> Tuple[bytes, float]:
+    """
+    Rimuove il silenzio iniziale e finale e accorcia le pause interne a ``max_pause`` secondi.
+
+    Returns:
+        (PCM senza silenzio, secondi di voce); il PCM è vuoto se non c'è voce
+    """
+    regions = detect_speech(pcm, sample_rate)
+    if not regions:
+        return b"", 0.0
+    max_gap = int(max_pause * sample_rate)
+    pieces = []
+    speech = 0
+    previous_end = None
+    for start, end in regions:
+        if previous_end is not None and start - previous_end > max_gap:
+            # Pausa lunga: se ne mantiene solo max_pause, in modo che Whisper la percepisca
+            pieces.append(pcm[previous_end * SAMPLE_WIDTH: (previous_end + max_gap) * SAMPLE_WIDTH])
+        elif previous_end is not None:
+            pieces.append(pcm[previous_end * SAMPLE_WIDTH: start * SAMPLE_WIDTH])
+        pieces.append(pcm[start * SAMPLE_WIDTH: end * SAMPLE_WIDTH])
+        speech += end - start
+        previous_end = end
+    return b"".join(pieces), speech / sample_rate
+
+
+# Ritardo con cui il VAD in streaming classifica un frame: la soglia usa anche
+# gli RMS dei frame successivi già decodificati
+VAD_LOOKAHEAD_SECONDS = 2.0
+
+
+class StreamingTrimmer:
+    """
+    Rimozione del silenzio su PCM che arriva a blocchi, con memoria costante.
+
+    Applica le regole di ``trim_silence`` (soglia adattiva, margine attorno
+    alla voce, pause accorciate a ``max_pause``) frame per frame, con un
+    ritardo di ``VAD_LOOKAHEAD_SECONDS``. Il rumore di fondo è il 10°
+    percentile degli RMS visti fino a quel momento, tenuti in un istogramma.
+    In memoria restano solo il lookahead, il margine e la pausa massima,
+    qualunque sia la durata della registrazione.
+    """
+
+    def __init__(self, max_pause: float, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(sample_rate * VAD_FRAME_SECONDS) * SAMPLE_WIDTH
+        self.padding_frames = math.ceil(VAD_PADDING_SECONDS / VAD_FRAME_SECONDS)
+        self.max_gap_frames = round(max_pause / VAD_FRAME_SECONDS)
+        self.lookahead_frames = max(1, round(VAD_LOOKAHEAD_SECONDS / VAD_FRAME_SECONDS))
+        self._partial = b""
+        # Frame decodificati ma non ancora classificati: (PCM, RMS)
+        self._pending: Deque[Tuple[bytes, float]] = deque()
+        self._histogram = np.zeros(32769, dtype=np.int64)
+        self._seen = 0
+        self._started = False
+        # Frame di margine ancora da emettere dopo l'ultimo frame di voce
+        self._post = 0
+        # Silenzio dopo il margine: l'inizio (fino a max_pause) e la fine (il
+        # margine prima della voce successiva); il resto viene scartato
+        self._gap_head: List[bytes] = []
+        self._gap_tail: Deque[bytes] = deque(maxlen=self.padding_frames)
+        self.speech_frames = 0
+        self.kept_frames = 0
+
+    @property
+    def speech_seconds(self) -> float:
+        return self.speech_frames * self.frame_bytes / (SAMPLE_WIDTH * self.sample_rate)
+
+    @property
+    def kept_seconds(self) -> float:
+        return self.kept_frames * self.frame_bytes / (SAMPLE_WIDTH * self.sample_rate)
+
+    def _threshold(self) -> float:
+        rank = int(0.1 * (self._seen - 1)) + 1
+        noise = int(np.searchsorted(np.cumsum(self._histogram), rank))
+        return max(VAD_MIN_RMS, VAD_NOISE_FACTOR * noise)
+
+    def _classify(self, frame: bytes, rms: float, threshold: float) -> bytes:
+        if rms > threshold:
+            pieces = (self._gap_head if self._started else []) + list(self._gap_tail) + [frame]
+            self.speech_frames += len(self._gap_tail) + 1
+            self.kept_frames += len(pieces)
+            self._gap_head = []
+            self._gap_tail.clear()
+            self._started = True
+            self._post = self.padding_frames
+            return b"".join(pieces)
+        if self._post > 0:
+            self._post -= 1
+            self.speech_frames += 1
+            self.kept_frames += 1
+            return frame
+        if self._started and len(self._gap_head) < self.max_gap_frames:
+            self._gap_head.append(frame)
+        else:
+            self._gap_tail.append(frame)
+        return b""
+
+    def feed(self, pcm: bytes) -> bytes:
+        """Aggiunge PCM decodificato e restituisce quello già classificato da mantenere."""
+        data = self._partial + pcm
+        n_frames = len(data) // self.frame_bytes
+        self._partial = data[n_frames * self.frame_bytes:]
+        if n_frames == 0:
+            return b""
+        frames = np.frombuffer(data, dtype=np.int16, count=n_frames * self.frame_bytes // SAMPLE_WIDTH)
+        rms = np.sqrt(np.square(frames.astype(np.float32).reshape(n_frames, -1)).mean(axis=1))
+        self._histogram += np.bincount(np.minimum(rms.astype(np.int64), 32768), minlength=32769)
+        self._seen += n_frames
+        for i in range(n_frames):
+            self._pending.append((data[i * self.frame_bytes:(i + 1) * self.frame_bytes], float(rms[i])))
+
+        threshold = self._threshold()
+        out = []
+        while len(self._pending) > self.lookahead_frames:
+            out.append(self._classify(*self._pending.popleft(), threshold))
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        """Classifica i frame rimasti; il silenzio finale oltre il margine viene scartato."""
+        if not self._pending:
+            return b""
+        threshold = self._threshold()
+        out = [self._classify(frame, rms, threshold) for frame, rms in self._pending]
+        self._pending.clear()
+        return b"".join(out)
+
+
+async def transcode_streaming(audio: AudioSource, trimmer: Optional[StreamingTrimmer] = None,
+                              sample_rate: int = SAMPLE_RATE) -> Tuple[bytes, float]:
+    """
+    Decodifica ``audio`` e lo ricodifica in Opus mono a bitrate vocale senza
+    mai tenere in memoria l'upload o il PCM completo.
+
+    Due processi ffmpeg collegati dal server: il decoder riceve il file a
+    blocchi su stdin, il suo PCM viene letto a blocchi di ``PCM_CHUNK_SIZE``,
+    passato (se presente) a ``trimmer`` e scritto sullo stdin dell'encoder.
+    L'intera pipeline occupa un solo slot di ``TRANSCODE_WORKERS``.
+
+    Returns:
+        (file webm/opus, secondi di audio decodificati)
+    """
+    global _ffmpeg_slots
+    if _ffmpeg_slots is None:
+        _ffmpeg_slots = asyncio.Semaphore(config.TRANSCODE_WORKERS)
+    source = io.BytesIO(audio) if isinstance(audio, (bytes, bytearray)) else audio
+
+    async with _ffmpeg_slots:
+        decoder = await _spawn_ffmpeg(
+            ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"]
+        )
+        encoder = None
+        try:
+            encoder = await _spawn_ffmpeg(
+                ["-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "pipe:0",
+                 "-c:a", "libopus", "-b:a", config.TRANSCODE_OPUS_BITRATE, "-application", "voip",
+                 "-f", "webm", "pipe:1"]
+            )
+
+            async def pump() -> int:
+                decoded = 0
+                try:
+                    while True:
+                        pcm = await decoder.stdout.read(PCM_CHUNK_SIZE)
+                        if not pcm:
+                            break
+                        decoded += len(pcm)
+                        kept = trimmer.feed(pcm) if trimmer is not None else pcm
+                        if kept:
+                            encoder.stdin.write(kept)
+                            await encoder.stdin.drain()
+                    if trimmer is not None:
+                        encoder.stdin.write(trimmer.finish())
+                        await encoder.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # l'encoder è terminato: l'errore arriva da stderr
+                finally:
+                    encoder.stdin.close()
+                return decoded
+
+            _, decoded, decode_err, compact, encode_err = await asyncio.gather(
+                _feed_stdin(decoder.stdin, source), pump(), decoder.stderr.read(),
+                encoder.stdout.read(), encoder.stderr.read(),
+            )
+            await decoder.wait()
+            await encoder.wait()
+        finally:
+            for process in (decoder, encoder):
+                if process is not None and process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+    # Come in decode_to_pcm: un webm troncato produce comunque i campioni fino al taglio
+    if decoder.returncode != 0 and not decoded:
+        raise AudioDecodeError(decode_err.decode("utf-8", "replace").strip() or f"ffmpeg exit {decoder.returncode}")
+    if encoder.returncode != 0 or not compact:
+        raise AudioDecodeError(encode_err.decode("utf-8", "replace").strip() or f"ffmpeg exit {encoder.returncode}")
+    return compact, decoded / (SAMPLE_WIDTH * sample_rate)
+
+
+async def prepare_for_stt(audio: AudioSource) -> Optional[bytes]:
+    """
+    Pre-elaborazione di una risposta prima della trascrizione e dell'archiviazione.
+
+    Decodifica l'upload, rimuove il silenzio (se ``VAD_ENABLED``) e ricodifica
+    il risultato in Opus mono 16 kHz, tutto in streaming (``transcode_streaming``):
+    la memoria usata non dipende dalla durata della registrazione. Se l'audio è
+    già in quel formato e il taglio del silenzio è trascurabile si invia l'originale.
+
+    Args:
+        audio: L'audio in memoria, o il file caricato (letto a blocchi)
+
+    Returns:
+        L'audio da inviare allo STT (l'originale se ffmpeg non è disponibile),
+        o None se la registrazione non contiene abbastanza voce
+    """
+    compact_source = is_compact_opus(_source_head(audio))
+    if compact_source and not config.VAD_ENABLED:
+        metrics.increment("transcode_skipped")
+        return await asyncio.to_thread(_read_source, audio)
+
+    trimmer = StreamingTrimmer(config.VAD_MAX_PAUSE_SECONDS) if config.VAD_ENABLED else None
+    try:
+        with metrics.timed("transcode_seconds"):
+            compact, decoded_seconds = await transcode_streaming(audio, trimmer)
+    except (AudioDecodeError, OSError) as e:
+        logger.warning(f"Pre-elaborazione audio non disponibile ({e}): invio l'audio originale")
+        return await asyncio.to_thread(_read_source, audio)
+
+    if trimmer is not None:
+        speech_seconds = trimmer.speech_seconds
+        trimmed_seconds = max(0.0, decoded_seconds - trimmer.kept_seconds)
+        metrics.observe("vad_trimmed_seconds", trimmed_seconds)
+
+        if speech_seconds < config.VAD_MIN_SPEECH_SECONDS:
+            metrics.increment("vad_silent_recordings")
+            logger.info(f"Registrazione senza voce sufficiente ({speech_seconds:.2f}s): trascrizione saltata")
+            return None
+        logger.info(f"VAD: {speech_seconds:.1f}s di voce, {trimmed_seconds:.1f}s di silenzio rimossi")
+        # Il PCM è già passato all'encoder: con un taglio trascurabile si
+        # evita la ricodifica solo se l'originale è già Opus compatto
+        if trimmed_seconds < config.VAD_MIN_TRIM_SECONDS and compact_source:
+            metrics.increment("transcode_skipped")
+            return await asyncio.to_thread(_read_source, audio)
+
+    original_size = _source_size(audio)
+    metrics.observe("transcode_size_ratio", len(compact) / max(1, original_size))
+    logger.info(f"Audio convertito in Opus 16 kHz mono: {original_size} -> {len(compact)} bytes")
+    return compact
@@ -0,0 +1,136 @@
+"""
+Trascrizione incrementale di una risposta ricevuta a blocchi durante la registrazione.
+
+Il browser invia i chunk di MediaRecorder mentre il candidato parla; un unico
+processo ffmpeg (``StreamingDecoder``) li decodifica man mano che arrivano.
+Ogni ``STREAM_CHECK_INTERVAL`` secondi, se il PCM non ancora assegnato a un
+segmento contiene almeno ``STREAM_SEGMENT_SECONDS`` di parlato, viene tagliato
+nella pausa più silenziosa e il segmento viene trascritto in background. A
+fine risposta resta da trascrivere solo l'ultimo segmento.
+"""
+
+from typing import Awaitable, Callable, List
+import asyncio
+import logging
+import time
+
+from Main.core import config, metrics
+from Main.services.audio_processing import (
+    SAMPLE_RATE, SAMPLE_WIDTH, AudioDecodeError, StreamingDecoder, encode_opus, find_pause, pcm_duration,
+    trim_silence
+)
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+# Coda dell'audio da non tagliare: l'ultimo chunk può essere incompleto
+TAIL_MARGIN_SECONDS = 0.5
+
+
+class IncrementalTranscriber:
+    """Accumula i chunk di una risposta e ne trascrive i segmenti completati."""
+
+    def __init__(self, transcribe: Callable[[bytes], Awaitable[str]], incremental: bool = True):
+        """
+        Args:
+            transcribe: Funzione che trascrive un file audio (bytes) e restituisce il testo
+            incremental: Se False trascrive l'audio solo a fine risposta, in un'unica chiamata
+        """
+        self._transcribe = transcribe
+        self._incremental = incremental
+        self._audio = bytearray()
+        # Il suo PCM inizia dal primo campione non ancora assegnato a un segmento
+        self._decoder = StreamingDecoder()
+        self._segments: List[asyncio.Task] = []
+        self._last_check = time.monotonic()
+
+    @property
+    def audio(self) -> bytes:
+        """L'audio completo ricevuto finora."""
+        return bytes(self._audio)
+
+    @property
+    def size(self) -> int:
+        """Byte ricevuti finora."""
+        return len(self._audio)
+
+    @property
+    def segments_started(self) -> int:
+        return len(self._segments)
+
+    def feed(self, chunk: bytes) -> None:
+        """Aggiunge un chunk e, se è il momento, avvia la ricerca di segmenti completati."""
+        self._audio.extend(chunk)
+        if not self._incremental:
+            return
+        self._decoder.feed(chunk)
+        now = time.monotonic()
+        if now - self._last_check < config.STREAM_CHECK_INTERVAL or self._decoder.failed():
+            return
+        self._last_check = now
+        self._cut_segments(final=False)
+
+    def _cut_segments(self, final: bool) -> None:
+        """Avvia i segmenti completati nel PCM decodificato finora (tutto il resto se ``final``)."""
+        pcm = self._decoder.pcm
+        margin = 0 if final else int(TAIL_MARGIN_SECONDS * SAMPLE_RATE)
+        min_samples = int(config.STREAM_SEGMENT_SECONDS * SAMPLE_RATE)
+        max_samples = int(config.STREAM_MAX_SEGMENT_SECONDS * SAMPLE_RATE)
+
+        while True:
+            total = len(pcm) // SAMPLE_WIDTH - margin
+            if total <= 0:
+                return
+            cut = find_pause(bytes(pcm[: total * SAMPLE_WIDTH]), 0, min_samples, max_samples)
+            if cut is None:
+                break
+            self._start_segment(bytes(pcm[: cut * SAMPLE_WIDTH]))
+            self._decoder.consume(cut * SAMPLE_WIDTH)
+
+        if final:
+            self._start_segment(bytes(pcm[: total * SAMPLE_WIDTH]))
+            self._decoder.consume(total * SAMPLE_WIDTH)
+
+    def _start_segment(self, pcm: bytes) -> None:
+        if config.VAD_ENABLED:
+            trimmed, speech_seconds = trim_silence(pcm, config.VAD_MAX_PAUSE_SECONDS)
+            metrics.observe("vad_trimmed_seconds", pcm_duration(pcm) - pcm_duration(trimmed))
+            if speech_seconds < config.VAD_MIN_SPEECH_SECONDS:
+                logger.debug("Segmento senza voce: non trascritto")
+                return
+            pcm = trimmed
+        logger.debug(f"Segmento {len(self._segments) + 1} avviato alla trascrizione "
+                     f"({pcm_duration(pcm):.1f}s)")
+        self._segments.append(asyncio.create_task(self._transcribe_segment(pcm)))
+
+    async def _transcribe_segment(self, pcm: bytes) -> str:
+        # Il segmento viaggia in Opus mono 16 kHz, molto più compatto del PCM
+        return await self._transcribe(await encode_opus(pcm))
+
+    async def finish(self) -> str:
+        """
+        Chiude la risposta: trascrive l'ultimo segmento e unisce i testi in ordine.
+
+        Returns:
+            La trascrizione completa della risposta (vuota se la registrazione non contiene voce)
+        """
+        if not self._incremental:
+            return await self._transcribe(self.audio)
+        try:
+            await self._decoder.close()
+            self._cut_segments(final=True)
+        except (AudioDecodeError, OSError) as e:
+            # Senza ffmpeg (o con audio non decodificabile) si trascrive il blob intero
+            logger.warning(f"Trascrizione incrementale non disponibile ({e}): uso l'audio completo")
+            self.cancel()
+            return await self._transcribe(self.audio)
+
+        texts = await asyncio.gather(*self._segments)
+        return " ".join(t.strip() for t in texts if t and t.strip())
+
+    def cancel(self) -> None:
+        """Annulla le trascrizioni in corso (client disconnesso)."""
+        self._decoder.cancel()
+        for task in self._segments:
+            task.cancel()
+        self._segments = []
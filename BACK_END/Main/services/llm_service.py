@@ -5,6 +5,7 @@ import logging
 import time
 
 from Main.core import config
+from Main.core.hedging import hedger
 from openai import OpenAI, AsyncOpenAI
 
 # Configurazione logger
@@ -78,12 +79,12 @@ def _call_gpt(messages: list[dict], *, temperature: float = None, max_tokens: in
     
     # Modalitu00e0 normale: usa l'API
     try:
-        response = client.chat.completions.create(
+        response = hedger("llm").run_sync(lambda: client.chat.completions.create(
             model=model,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-        )
+        ))
         result = response.choices[0].message.content.strip()
         logger.info(f"GPT call to {model} took {time.perf_counter() - t0:.2f}s")
         return result
@@ -131,12 +132,12 @@ async def async_call_gpt(messages: list[dict], *, temperature: float = None, max
         
     # Modalità normale: usa l'API
     try:
-        response = await async_client.chat.completions.create(
+        response = await hedger("llm").run(lambda: async_client.chat.completions.create(
             model=model,
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-        )
+        ))
         result = response.choices[0].message.content.strip()
         logger.info(f"GPT call to {model} took {time.perf_counter() - t0:.2f}s")
         return result
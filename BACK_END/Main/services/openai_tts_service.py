@@ -7,6 +7,7 @@ import os
 import hashlib
 import logging
 import asyncio
+import anyio
 import random  # Necessario per generare audio fittizio
 from typing import Optional, Union
 import openai
@@ -14,7 +15,9 @@ import tempfile
 from pathlib import Path
 
 from Main.core import config
-from italian_tts_processor import optimize_italian_tts
+from Main.core.file_responses import FILE_CHUNK_SIZE
+from Main.services.audio_cache import audio_cache
+from italian_tts_processor import normalizer_version, optimize_italian_tts
 
 # Configurazione del logger
 logger = logging.getLogger(__name__)
@@ -101,16 +104,17 @@ async def text_to_speech_openai(
                 logger.debug("Il testo contiene già tag SSML, nessuna ottimizzazione necessaria")
                 
         # Controllo cache
-        cache_key = f"{text}_{voice}_{model}_{speed}_{format}"
-        cache_file = get_audio_from_cache(cache_key)
-        if cache_file:
+        cache_key = openai_cache_key(text, voice, model, format, speed)
+        cached_audio = await audio_cache.get_async(cache_key)
+        if cached_audio:
             logger.info(f"TTS: Audio trovato in cache per: {text[:30]}...")
-            with open(cache_file, "rb") as f:
-                return f.read()
+            return cached_audio
         
-        # Chiamata asincrona a OpenAI TTS
+        # Chiamata a OpenAI TTS in un thread: il client è sincrono e non deve
+        # bloccare il loop per tutta la sintesi
         logger.info(f"TTS: generazione audio per: {text[:50]}... con voce {voice}, modello {model}")
-        response = client.audio.speech.create(
+        response = await asyncio.to_thread(
+            client.audio.speech.create,
             model=model,
             voice=voice,
             input=final_text,
@@ -122,7 +126,7 @@ async def text_to_speech_openai(
         audio_bytes = response.content
         
         # Salva in cache per uso futuro
-        await save_audio_to_cache(cache_key, audio_bytes)
+        await audio_cache.put_async(cache_key, audio_bytes, format, provider="openai")
         
         return audio_bytes
     
@@ -131,62 +135,26 @@ async def text_to_speech_openai(
         return None
 
 
-def get_audio_from_cache(cache_key: str) -> Optional[str]:
-    """
-    Controlla se un testo è già stato sintetizzato e salvato in cache.
-    
-    Args:
-        cache_key: La chiave di cache che identifica l'audio
-        
-    Returns:
-        Il percorso del file in cache o None se non trovato
-    """
-    key_hash = hashlib.md5(cache_key.encode('utf-8')).hexdigest()
-    cache_path = os.path.join(config.TTS_CACHE_DIR, f"{key_hash}.{config.OPENAI_TTS_FORMAT}")
-    
-    if os.path.exists(cache_path):
-        return cache_path
-    return None
-
+def openai_cache_key(text: str, voice: str = None, model: str = None, format: str = None, speed: float = None) -> str:
+    """Chiave della cache audio per una sintesi OpenAI TTS (parametri mancanti da config)."""
+    model = model or config.OPENAI_TTS_MODEL
+    speed = speed if speed is not None else config.OPENAI_TTS_SPEED
+    return audio_cache.key("openai", voice or config.OPENAI_TTS_VOICE, f"{model}@{speed}@{normalizer_version()}",
+                           format or config.OPENAI_TTS_FORMAT, text)
 
-async def save_audio_to_cache(cache_key: str, audio_bytes: bytes) -> Optional[str]:
-    """
-    Salva l'audio generato in cache.
-    
-    Args:
-        cache_key: La chiave di cache che identifica l'audio
-        audio_bytes: I byte dell'audio da salvare
-        
-    Returns:
-        Il percorso del file in cache o None in caso di errore
-    """
-    try:
-        key_hash = hashlib.md5(cache_key.encode('utf-8')).hexdigest()
-        cache_path = os.path.join(config.TTS_CACHE_DIR, f"{key_hash}.{config.OPENAI_TTS_FORMAT}")
-        
-        # Assicurati che la directory esista
-        os.makedirs(config.TTS_CACHE_DIR, exist_ok=True)
-        
-        # Salva in cache
-        with open(cache_path, "wb") as f:
-            f.write(audio_bytes)
-            
-        logger.info(f"Audio salvato in cache: {cache_path}")
-        return cache_path
-    except Exception as e:
-        logger.error(f"Errore durante il salvataggio in cache: {e}")
-        return None
-        
 
-async def stream_audio_file(file_path: str, chunk_size: int = 1024):
+async def stream_audio_file(file_path: str, chunk_size: int = FILE_CHUNK_SIZE):
     """
     Funzione di supporto per lo streaming di file audio.
+
+    Le letture avvengono in un thread, a blocchi grandi e senza pause: per
+    servire un file intero conviene ``AudioFileResponse``, che usa l'invio
+    diretto del server quando disponibile.
     
     Args:
         file_path: Percorso del file audio
         chunk_size: Dimensione del chunk per lo streaming
     """
-    with open(file_path, "rb") as f:
-        while chunk := f.read(chunk_size):
+    async with await anyio.open_file(file_path, "rb") as f:
+        while chunk := await f.read(chunk_size):
             yield chunk
-            await asyncio.sleep(0.01)  # Piccola pausa per evitare blocchi
@@ -12,8 +12,9 @@ import os
 from datetime import datetime
 
 from Main.core import config
+from Main.core.bounded_history import FileHistoryStore
 from data_saver import save_question, save_response
-from memoria import salva_dati_intervista
+from memoria import salva_dati_intervista, salva_storico, carica_storico
 
 # Configurazione logger
 logger = logging.getLogger(__name__)
@@ -25,6 +26,9 @@ _dev_storage: Dict[str, Any] = {
     "responses": []
 }
 
+# Storico riversato delle sessioni in modalità sviluppo: su disco, non in memoria
+_dev_history = FileHistoryStore(config.HISTORY_SPILL_DIR)
+
 def save_interview_question(
     user_id: str,
     session_id: str, 
@@ -204,6 +208,52 @@ def save_interview_result(
         logger.error(f"Errore durante il salvataggio del risultato: {e}")
         return False
 
+def save_history_item(user_id: str, session_id: str, stream: str, index: int, item: Any) -> bool:
+    """
+    Salva un elemento dello storico di sessione (transcript, riflessioni, risposte)
+    uscito dalla finestra tenuta in memoria.
+    
+    Args:
+        user_id: ID dell'utente
+        session_id: ID della sessione di intervista
+        stream: Nome dello storico
+        index: Posizione dell'elemento nello storico completo
+        item: Elemento da salvare
+        
+    Returns:
+        True se il salvataggio è avvenuto con successo
+    """
+    try:
+        if config.DEVELOPMENT_MODE or not config.MONGODB_ENABLED:
+            _dev_history.append(user_id, session_id, stream, index, item)
+        else:
+            salva_storico(user_id, session_id, stream, index, item)
+        logger.debug(f"Elemento {index} di '{stream}' riversato per la sessione {session_id}")
+        return True
+    except Exception as e:
+        logger.error(f"Errore durante il salvataggio dello storico: {e}")
+        return False
+
+def load_history(user_id: str, session_id: str, stream: str) -> List[Any]:
+    """
+    Recupera gli elementi riversati di uno storico di sessione, in ordine.
+    
+    Args:
+        user_id: ID dell'utente
+        session_id: ID della sessione di intervista
+        stream: Nome dello storico
+        
+    Returns:
+        Lista degli elementi salvati (vuota in caso di errore)
+    """
+    try:
+        if config.DEVELOPMENT_MODE or not config.MONGODB_ENABLED:
+            return _dev_history.load(user_id, session_id, stream)
+        return carica_storico(user_id, session_id, stream)
+    except Exception as e:
+        logger.error(f"Errore durante il recupero dello storico: {e}")
+        return []
+
 def dump_dev_storage_to_file() -> bool:
     """
     Esporta i dati di sviluppo in un file JSON se in modalità sviluppo.
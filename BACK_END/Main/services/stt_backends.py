@@ -0,0 +1,183 @@
+"""
+Backend di speech-to-text selezionabili per deployment.
+
+* ``openai``: API OpenAI Whisper (``whisper-1``), il comportamento storico.
+* ``local``: modello Whisper quantizzato (faster-whisper, int8) eseguito su CPU
+  in un pool di processi worker. Utile per latenze prevedibili durante i
+  rallentamenti dell'API e per installazioni senza accesso a Internet.
+
+Il backend si sceglie con ``STT_BACKEND``. Se il backend locale è saturo (tutti
+i worker occupati e la coda piena) o fallisce, la trascrizione passa all'API
+remota, a meno che ``STT_REMOTE_FALLBACK`` sia disattivato (ambienti air-gapped).
+
+Il resto dell'applicazione usa solo ``speech_to_text()``.
+"""
+
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import io
+import logging
+import multiprocessing
+import threading
+import time
+
+from Main.core import config, metrics
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # dipendenza opzionale, necessaria solo con STT_BACKEND=local
+    WhisperModel = None
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+
+class STTBackend:
+    """Interfaccia comune dei backend di trascrizione."""
+
+    name = "base"
+
+    async def transcribe(self, audio_bytes: bytes, language: str = "it") -> str:
+        raise NotImplementedError
+
+    def overloaded(self) -> bool:
+        """True se il backend non può accettare altro lavoro senza accodarlo troppo."""
+        return False
+
+
+class OpenAIWhisperBackend(STTBackend):
+    """Trascrizione tramite l'API OpenAI (whisper_service)."""
+
+    name = "openai"
+
+    async def transcribe(self, audio_bytes: bytes, language: str = "it") -> str:
+        # Import ritardato: il client OpenAI richiede la API key, assente negli ambienti offline
+        from Main.services.whisper_service import speech_to_text_openai
+        return await speech_to_text_openai(audio_bytes)
+
+
+# -----------------------------------------------------------------------------
+# Backend locale (processi worker)
+# -----------------------------------------------------------------------------
+
+# Modello caricato una volta per processo worker
+_worker_model = None
+
+
+def _init_worker(model_size: str, compute_type: str, cpu_threads: int) -> None:
+    global _worker_model
+    _worker_model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+
+def _transcribe_in_worker(audio_bytes: bytes, language: str) -> str:
+    segments, _info = _worker_model.transcribe(io.BytesIO(audio_bytes), language=language, beam_size=1)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class LocalWhisperBackend(STTBackend):
+    """Whisper quantizzato su CPU, un modello per processo worker."""
+
+    name = "local"
+
+    def __init__(self, model_size: str, compute_type: str, workers: int, threads_per_worker: int, max_queue: int):
+        if WhisperModel is None:
+            raise RuntimeError("faster-whisper non installato: impossibile usare STT_BACKEND=local")
+        self.workers = workers
+        self.max_queue = max_queue
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        # spawn: CTranslate2 usa thread propri che non sopravvivono a un fork
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_size, compute_type, threads_per_worker),
+        )
+        logger.info(f"STT locale: modello {model_size} ({compute_type}), "
+                    f"{workers} worker x {threads_per_worker} thread")
+
+    def overloaded(self) -> bool:
+        return self._in_flight >= self.workers + self.max_queue
+
+    async def transcribe(self, audio_bytes: bytes, language: str = "it") -> str:
+        with self._lock:
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, _transcribe_in_worker, audio_bytes, language)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# -----------------------------------------------------------------------------
+# Selezione del backend
+# -----------------------------------------------------------------------------
+
+_backend: Optional[STTBackend] = None
+_remote: Optional[STTBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> STTBackend:
+    """Restituisce il backend configurato in ``STT_BACKEND`` (creato alla prima richiesta)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if config.STT_BACKEND == "local":
+                _backend = LocalWhisperBackend(
+                    config.LOCAL_STT_MODEL,
+                    config.LOCAL_STT_COMPUTE_TYPE,
+                    config.LOCAL_STT_WORKERS,
+                    config.LOCAL_STT_THREADS_PER_WORKER,
+                    config.LOCAL_STT_MAX_QUEUE,
+                )
+            else:
+                if config.STT_BACKEND != "openai":
+                    logger.warning(f"STT_BACKEND '{config.STT_BACKEND}' non riconosciuto, uso 'openai'")
+                _backend = get_remote_backend()
+        return _backend
+
+
+def get_remote_backend() -> STTBackend:
+    global _remote
+    if _remote is None:
+        _remote = OpenAIWhisperBackend()
+    return _remote
+
+
+async def speech_to_text(audio_bytes: bytes, language: str = "it") -> str:
+    """
+    Trascrive l'audio con il backend configurato, ripiegando sull'API remota se necessario.
+
+    Args:
+        audio_bytes: File audio (webm, wav, ...)
+        language: Lingua della risposta
+
+    Returns:
+        Il testo trascritto
+    """
+    backend = get_backend()
+    fallback_allowed = backend.name != "openai" and config.STT_REMOTE_FALLBACK
+
+    if fallback_allowed and backend.overloaded():
+        metrics.increment("stt_fallback_overload")
+        logger.warning(f"Backend STT '{backend.name}' saturo: uso l'API remota")
+        backend = get_remote_backend()
+
+    t0 = time.perf_counter()
+    try:
+        text = await backend.transcribe(audio_bytes, language)
+    except Exception as e:
+        if not fallback_allowed or backend.name == "openai":
+            raise
+        metrics.increment("stt_fallback_error")
+        logger.error(f"Errore del backend STT '{backend.name}' ({e}): uso l'API remota")
+        backend = get_remote_backend()
+        text = await backend.transcribe(audio_bytes, language)
+    metrics.observe(f"stt_{backend.name}_seconds", time.perf_counter() - t0)
+    return text
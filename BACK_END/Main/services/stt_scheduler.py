@@ -0,0 +1,143 @@
+"""
+Scheduler delle chiamate STT remote: concorrenza limitata, coda con priorità
+e rifiuto rapido.
+
+Al massimo ``STT_MAX_CONCURRENCY`` trascrizioni sono in corso verso il
+provider; le altre attendono in una coda di al più ``STT_QUEUE_SIZE``
+richieste, servita per priorità (prima i turni live, poi le ritrascrizioni
+batch) e in ordine di arrivo. Una richiesta viene rifiutata subito con
+``STTOverloadedError`` se la coda è piena o se l'attesa stimata supera la
+scadenza della sua priorità; se la scadenza passa mentre è in coda viene
+rifiutata in quel momento. Così, quando il provider rallenta, le richieste
+non si accumulano per poi scadere tutte insieme.
+
+Attesa in coda e tempo di servizio sono misurati separatamente
+(``stt_queue_wait_seconds`` e ``stt_service_seconds``).
+
+La priorità è letta da una context variable, quindi i chiamanti non cambiano:
+i turni live usano il default, i job batch usano ``with batch_priority():``.
+"""
+
+from typing import Any, Awaitable, Callable, List, Tuple
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+import time
+
+from Main.core import config, metrics
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+LIVE = 0
+BATCH = 1
+
+stt_priority: contextvars.ContextVar = contextvars.ContextVar("stt_priority", default=LIVE)
+
+
+class STTOverloadedError(RuntimeError):
+    """Il servizio STT non può completare la richiesta entro la scadenza."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@contextmanager
+def batch_priority():
+    """Le trascrizioni avviate nel blocco passano dopo i turni live."""
+    token = stt_priority.set(BATCH)
+    try:
+        yield
+    finally:
+        stt_priority.reset(token)
+
+
+class STTScheduler:
+    """Semaforo con coda a priorità limitata e stima dell'attesa."""
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # Media mobile del tempo di servizio, per stimare l'attesa in coda
+        self._avg_service = 2.0
+
+    def _deadline(self, priority: int) -> float:
+        return config.STT_LIVE_DEADLINE_SECONDS if priority == LIVE else config.STT_BATCH_DEADLINE_SECONDS
+
+    def _waiting(self) -> List[Tuple[int, int, asyncio.Future]]:
+        # Le voci annullate (scadute o abbandonate) vengono rimosse qui
+        self._queue = [entry for entry in self._queue if not entry[2].done()]
+        heapq.heapify(self._queue)
+        return self._queue
+
+    def _reject(self, reason: str, retry_after: float) -> None:
+        metrics.increment("stt_rejected")
+        logger.warning(f"Richiesta STT rifiutata: {reason}")
+        raise STTOverloadedError(reason, retry_after)
+
+    async def _acquire(self, priority: int) -> None:
+        if self._active < self.max_concurrency and not self._waiting():
+            self._active += 1
+            return
+
+        waiting = self._waiting()
+        if len(waiting) >= self.max_queue:
+            self._reject("coda STT piena", self._avg_service)
+        ahead = sum(1 for entry in waiting if entry[0] <= priority)
+        estimated = (ahead + 1) / self.max_concurrency * self._avg_service
+        deadline = self._deadline(priority)
+        if estimated > deadline:
+            self._reject(f"attesa stimata {estimated:.1f}s oltre la scadenza di {deadline:.0f}s", estimated)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        try:
+            await asyncio.wait_for(future, timeout=deadline)
+        except asyncio.TimeoutError:
+            self._reject(f"scadenza di {deadline:.0f}s superata in coda", self._avg_service)
+        except asyncio.CancelledError:
+            # Lo slot era già stato ceduto a questa richiesta: va restituito
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)  # lo slot passa direttamente al prossimo
+                return
+        self._active -= 1
+
+    async def run(self, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        priority = stt_priority.get()
+        t0 = time.perf_counter()
+        await self._acquire(priority)
+        started = time.perf_counter()
+        metrics.observe("stt_queue_wait_seconds", started - t0)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            service = time.perf_counter() - started
+            metrics.observe("stt_service_seconds", service)
+            self._avg_service = 0.8 * self._avg_service + 0.2 * service
+            self._release()
+
+
+scheduler = STTScheduler(config.STT_MAX_CONCURRENCY, config.STT_QUEUE_SIZE)
+
+
+def scheduled(fn: Callable[..., Awaitable[Any]]):
+    """Decoratore: fa passare le chiamate di ``fn`` dallo scheduler STT."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await scheduler.run(fn, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,140 @@
+"""
+Cache delle trascrizioni indirizzata per contenuto.
+
+La chiave è (sha256 dell'audio, modello, lingua): un audio identico byte per
+byte (reinvii, replay di test, regressioni QA) restituisce subito la stessa
+trascrizione. Due livelli:
+
+* memoria: LRU con al massimo ``TRANSCRIPT_CACHE_SIZE`` voci;
+* disco (opzionale, ``TRANSCRIPT_CACHE_DIR``): un file JSON per voce,
+  condiviso tra worker e riavvii.
+
+Entrambi scadono dopo ``TRANSCRIPT_CACHE_TTL`` secondi. Le richieste
+contemporanee per lo stesso audio vengono unite in un'unica chiamata
+(``SingleFlight``): la disconnessione del client che l'ha avviata non la
+interrompe per gli altri.
+"""
+
+from typing import Awaitable, Callable, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from Main.core import config, metrics
+from Main.core.shared_state import atomic_write
+from Main.core.singleflight import SingleFlight
+
+# Configurazione logger
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCache:
+    """LRU in memoria + livello su disco opzionale, con coalescenza delle richieste."""
+
+    def __init__(self, max_entries: int, ttl: float, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._flights = SingleFlight("transcript")
+
+    @staticmethod
+    def key(audio_bytes: bytes, model: str, language: str) -> str:
+        return f"{hashlib.sha256(audio_bytes).hexdigest()}-{model}-{language}"
+
+    # ---------- livelli ----------
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        created, text = entry
+        if time.time() - created > self.ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return text
+
+    def _put_memory(self, key: str, text: str, created: float) -> None:
+        self._memory[key] = (created, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def _get_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Voce della cache trascrizioni illeggibile ({path}): {e}")
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return entry["created"], entry["text"]
+
+    def _put_disk(self, key: str, text: str, created: float) -> None:
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, json.dumps({"created": created, "text": text}, ensure_ascii=False).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Impossibile salvare la trascrizione su disco: {e}")
+
+    # ---------- API ----------
+    async def get_or_transcribe(self, audio_bytes: bytes, model: str, language: str,
+                                transcribe: Callable[[], Awaitable[str]]) -> str:
+        """
+        Restituisce la trascrizione in cache o la calcola una sola volta.
+
+        Args:
+            audio_bytes: Audio da trascrivere (solo per calcolare la chiave)
+            model: Modello STT usato
+            language: Lingua della trascrizione
+            transcribe: Coroutine function che esegue la trascrizione reale
+        """
+        key = self.key(audio_bytes, model, language)
+
+        text = self._get_memory(key)
+        if text is not None:
+            metrics.increment("transcript_cache_hit_memory")
+            return text
+
+        if self.directory:
+            entry = await asyncio.to_thread(self._get_disk, key)
+            if entry is not None:
+                metrics.increment("transcript_cache_hit_disk")
+                self._put_memory(key, entry[1], entry[0])
+                return entry[1]
+
+        async def work() -> str:
+            metrics.increment("transcript_cache_miss")
+            text = await transcribe()
+            created = time.time()
+            self._put_memory(key, text, created)
+            if self.directory:
+                await asyncio.to_thread(self._put_disk, key, text, created)
+            return text
+
+        return await self._flights.run(key, work)
+
+
+transcript_cache = TranscriptCache(
+    config.TRANSCRIPT_CACHE_SIZE,
+    config.TRANSCRIPT_CACHE_TTL,
+    config.TRANSCRIPT_CACHE_DIR or None,
+)
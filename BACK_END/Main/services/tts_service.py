@@ -1,18 +1,33 @@
-from typing import Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
 from Main.core.logger import logger
-from Main.core import config
-import asyncio, os, base64, hashlib, re, tempfile, time
+from Main.core import config, metrics
+from Main.core.hedging import hedger
+from Main.core.singleflight import SingleFlight
+from Main.services.audio_cache import audio_cache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, os, base64, hashlib, re, tempfile, threading, time
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # Import di helper esterni se necessari
 import sys
 sys.path.append(config.BACK_END_ROOT)
-from italian_tts_processor import optimize_italian_tts
+from italian_tts_processor import normalizer_version, optimize_italian_tts, split_sentences
 
 # Polly client singleton
 _polly_client = None
 
+# Sintesi in corso per chiave di cache: richieste identiche contemporanee
+# (avvio di una coorte, pre-sintesi) attendono la stessa chiamata a Polly
+_synthesis_flights = SingleFlight("tts")
+
+# Le chiamate a Polly (boto3 è sincrono) girano in questo pool, mai nel loop:
+# il numero di thread limita le sintesi contemporanee ed è uguale alla
+# dimensione del pool di connessioni del client
+_polly_executor = ThreadPoolExecutor(max_workers=config.POLLY_MAX_CONCURRENCY, thread_name_prefix="polly")
+
 def get_polly_client():
     """Crea e restituisce un client boto3 per Amazon Polly."""
     global _polly_client
@@ -31,7 +46,13 @@ def get_polly_client():
             'polly',
             region_name=config.AWS_REGION,
             aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY
+            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
+            config=Config(
+                max_pool_connections=config.POLLY_MAX_CONCURRENCY,
+                connect_timeout=config.POLLY_CONNECT_TIMEOUT,
+                read_timeout=config.POLLY_READ_TIMEOUT,
+                retries={"max_attempts": config.POLLY_MAX_ATTEMPTS, "mode": "adaptive"},
+            )
         )
         return _polly_client
     except Exception as e:
@@ -91,82 +112,377 @@ def text_to_speech_polly(text: str, voice_id: str = config.AWS_POLLY_VOICE_ID) -
         raise
 
 
+# -----------------------------------------------------------------------------
+# Streaming della sintesi
+# -----------------------------------------------------------------------------
+
+# Blocchi letti dall'AudioStream di Polly e inoltrati al client man mano che arrivano
+STREAM_CHUNK_SIZE = 8 * 1024
+_STREAM_END = object()
+
 
-def text_to_speech(text: str, voice_id: str = config.AWS_POLLY_VOICE_ID, engine: str = config.AWS_POLLY_ENGINE, audio_format: str = config.AWS_POLLY_FORMAT) -> Optional[str]:
-    if not text: # Aggiunto controllo per testo vuoto
-        logger.warning("text_to_speech chiamato con testo vuoto.")
+async def stream_speech(text: str, voice_id: str) -> AsyncIterator[bytes]:
+    """Audio di ``text`` a blocchi, inoltrati appena pronti.
+
+    Il testo viene diviso in frasi (``speech_segments``): la prima arriva in
+    streaming da Polly, le altre vengono sintetizzate in parallelo e inviate
+    in ordine, ciascuna appena tutte le precedenti sono state inviate. Il
+    tempo al primo byte è nella metrica ``tts_stream_ttfb_seconds``.
+    """
+    segments = speech_segments(text)
+    rest = [asyncio.create_task(_speak_segment(segment, voice_id)) for segment in segments[1:]]
+    try:
+        async for chunk in _stream_segment(segments[0], voice_id):
+            yield chunk
+        for task in rest:
+            yield await task
+    finally:
+        for task in rest:
+            task.cancel()  # la sintesi già partita nel pool finisce comunque in cache
+
+
+async def _stream_segment(text: str, voice_id: str) -> AsyncIterator[bytes]:
+    """Una frase a blocchi, inoltrati appena Polly li produce.
+
+    Con un hit in cache l'audio arriva in un solo blocco. Altrimenti la sintesi
+    gira nel pool di Polly e ogni blocco dell'AudioStream passa al client
+    attraverso una coda; a sintesi completa l'audio viene salvato in cache
+    (anche se il client si è disconnesso).
+    """
+    t0 = time.perf_counter()
+    cache_key = polly_cache_key(text, voice_id)
+    cached = await audio_cache.get_async(cache_key)
+    if cached:
+        metrics.observe("tts_stream_ttfb_seconds", time.perf_counter() - t0)
+        yield cached
+        return
+
+    call, leader = _synthesis_flights.claim(cache_key)
+    if not leader:
+        # La stessa frase è già in sintesi per un'altra richiesta: si attende quella
+        audio_bytes = await asyncio.shield(asyncio.wrap_future(call))
+        metrics.observe("tts_stream_ttfb_seconds", time.perf_counter() - t0)
+        yield audio_bytes
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def produce() -> None:
+        try:
+            polly_client = get_polly_client()
+            if not polly_client:
+                raise Exception("Client Polly non disponibile")
+            is_ssml = text.strip().startswith('<speak>') and text.strip().endswith('</speak>')
+            final_text = text if is_ssml else optimize_italian_tts(text, wrap_speak=True)
+            # Se Polly tarda a iniziare lo stream oltre il ritardo di hedging
+            # parte una richiesta duplicata: si legge la prima che risponde e lo
+            # stream dell'altra viene chiuso, rilasciando la connessione
+            response = hedger("tts_stream").run_sync(lambda: polly_client.synthesize_speech(
+                Engine=config.AWS_POLLY_ENGINE,
+                OutputFormat=config.AWS_POLLY_FORMAT,
+                Text=final_text,
+                TextType='ssml' if final_text.strip().startswith('<speak>') else 'text',
+                VoiceId=voice_id
+            ), discard=lambda losing: losing['AudioStream'].close())
+            chunks = []
+            for chunk in response['AudioStream'].iter_chunks(STREAM_CHUNK_SIZE):
+                chunks.append(chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+            audio_bytes = b"".join(chunks)
+            audio_cache.put(cache_key, audio_bytes, config.AWS_POLLY_FORMAT, provider="polly")
+            _synthesis_flights.resolve(cache_key, call, result=audio_bytes)
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+        except Exception as e:
+            _synthesis_flights.resolve(cache_key, call, error=e)
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+
+    loop.run_in_executor(_polly_executor, produce)
+    first = True
+    while True:
+        item = await queue.get()
+        if item is _STREAM_END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        if first:
+            metrics.observe("tts_stream_ttfb_seconds", time.perf_counter() - t0)
+            first = False
+        yield item
+
+
+# -----------------------------------------------------------------------------
+# Pre-sintesi della prossima domanda
+# -----------------------------------------------------------------------------
+
+# Sintesi avviate prima che il client chieda l'audio, per (testo, voce)
+PREFETCH_MAX_ENTRIES = 64
+_prefetched: "OrderedDict[Tuple[str, str], asyncio.Task]" = OrderedDict()
+
+
+def polly_cache_key(text: str, voice_id: str) -> str:
+    """Chiave della cache audio per una sintesi Polly con motore, formato e normalizzazione in uso.
+
+    È anche l'ID servito con cache immutabile: la versione del normalizzatore
+    cambia l'URL quando cambiano le regole di pronuncia.
+    """
+    return audio_cache.key("polly", voice_id, f"{config.AWS_POLLY_ENGINE}@{normalizer_version()}",
+                           config.AWS_POLLY_FORMAT, text)
+
+
+def _synthesize_and_cache(text: str, voice_id: str, cache_key: str) -> bytes:
+    is_ssml = text.strip().startswith('<speak>') and text.strip().endswith('</speak>')
+    final_text = text if is_ssml else optimize_italian_tts(text, wrap_speak=True)
+    audio_bytes = text_to_speech_polly(final_text, voice_id)
+    if audio_bytes:
+        audio_cache.put(cache_key, audio_bytes, config.AWS_POLLY_FORMAT, provider="polly")
+    return audio_bytes
+
+
+async def run_polly(func, *args):
+    """Esegue una chiamata bloccante a Polly nel pool dedicato."""
+    return await asyncio.get_running_loop().run_in_executor(_polly_executor, func, *args)
+
+
+# Formati in cui l'audio di più frasi si può concatenare così com'è
+CONCATENABLE_FORMATS = {"mp3", "pcm"}
+# Le frasi più corte vengono unite alla successiva (meno richieste a Polly)
+SEGMENT_MIN_CHARS = 20
+
+
+def speech_segments(text: str) -> List[str]:
+    """Frasi di ``text`` sintetizzate e messe in cache separatamente.
+
+    Così le frasi ripetute in più prompt (come l'introduzione fissa
+    dell'intervista) vengono sintetizzate una volta sola. Il testo SSML e i
+    formati non concatenabili restano un unico segmento.
+    """
+    is_ssml = text.strip().startswith('<speak>') and text.strip().endswith('</speak>')
+    if is_ssml or config.AWS_POLLY_FORMAT not in CONCATENABLE_FORMATS:
+        return [text]
+    return split_sentences(text, SEGMENT_MIN_CHARS) or [text]
+
+
+async def speak_audio(text: str, voice_id: str) -> bytes:
+    """Sintesi come in /tts/speak: ottimizzazione italiana (se il testo non è SSML) e Polly.
+
+    Le frasi vengono sintetizzate in parallelo nel pool di Polly, lette dalla
+    cache se già sintetizzate e salvate dopo la sintesi.
+    """
+    segments = speech_segments(text)
+    if len(segments) == 1:
+        return await _speak_segment(text, voice_id)
+    return b"".join(await asyncio.gather(*[_speak_segment(segment, voice_id) for segment in segments]))
+
+
+async def _speak_segment(text: str, voice_id: str) -> bytes:
+    """Audio di una frase: un hit in cache non occupa il pool di Polly.
+
+    Se la sintesi tarda oltre il ritardo di hedging parte una richiesta
+    duplicata nello stesso pool e vince la prima che termina.
+    """
+    cache_key = polly_cache_key(text, voice_id)
+    cached = await audio_cache.get_async(cache_key)
+    if cached:
+        return cached
+    return await _synthesis_flights.run(cache_key, lambda: hedger("tts").run(
+        lambda: run_polly(_synthesize_and_cache, text, voice_id, cache_key)))
+
+
+def prefetch_speech(text: str, voice_id: str) -> None:
+    """Avvia in background la sintesi che /tts/speak servirà per questo testo.
+
+    Chiamata appena il testo della prossima domanda è noto, mentre la
+    risposta del turno sta ancora tornando al client.
+    """
+    if config.DEVELOPMENT_MODE or not text or get_polly_client() is None:
+        return
+    key = (text, voice_id)
+    if key in _prefetched:
+        return
+    task = asyncio.create_task(speak_audio(text, voice_id))
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())  # errori gestiti da take_prefetched
+    _prefetched[key] = task
+    while len(_prefetched) > PREFETCH_MAX_ENTRIES:
+        _prefetched.popitem(last=False)
+
+
+async def take_prefetched(text: str, voice_id: str) -> Optional[bytes]:
+    """Restituisce l'audio pre-sintetizzato (attendendolo se in corso), oppure None."""
+    task = _prefetched.pop((text, voice_id), None)
+    if task is None:
         return None
     try:
-        text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-        cached_audio_path = os.path.join(config.AUDIO_CACHE_DIR, f"{text_hash}.{audio_format}")
+        audio_bytes = await task
+    except Exception as e:
+        logger.warning(f"Pre-sintesi fallita, sintetizzo di nuovo: {e}")
+        return None
+    metrics.increment("tts_prefetch_hit")
+    return audio_bytes
 
-        if os.path.exists(cached_audio_path):
-            logger.info(f"Audio trovato nella cache: {cached_audio_path}")
-            with open(cached_audio_path, "rb") as f:
-                audio_content = f.read()
-            return base64.b64encode(audio_content).decode('utf-8')
 
-        logger.info(f"Sintesi vocale per: '{text[:50]}...' Voce: {voice_id}")
-        response = polly_client.synthesize_speech(
-            Text=text,
-            OutputFormat=audio_format,
-            VoiceId=voice_id,
-            Engine=engine
-        )
-        audio_content = response['AudioStream'].read()
-        
-        with open(cached_audio_path, "wb") as f:
-            f.write(audio_content)
-        logger.info(f"Audio salvato nella cache: {cached_audio_path}")
-        
-        return base64.b64encode(audio_content).decode('utf-8')
+
+# -----------------------------------------------------------------------------
+# Audio per ID
+# -----------------------------------------------------------------------------
+
+async def register_speech(text: str, voice_id: str) -> str:
+    """ID opaco dell'audio di ``text`` (hash del contenuto), servito da /tts/audio/{id}.
+
+    Il testo resta sul server: URL e log contengono solo l'ID.
+    """
+    audio_id = polly_cache_key(text, voice_id)
+    await asyncio.to_thread(audio_cache.set_source, audio_id, voice_id, text)
+    return audio_id
+
+
+def speech_from_memory(audio_id: str) -> Optional[bytes]:
+    """Audio completo di ``audio_id`` se è nel livello in memoria della cache, senza toccare il disco."""
+    return audio_cache.get_memory(audio_id)
+
+
+async def speech_file(audio_id: str) -> Optional[str]:
+    """Percorso del file audio completo di ``audio_id``, sintetizzato se non è in cache.
+
+    Returns:
+        None se l'ID non è mai stato registrato (o è scaduto)
+    """
+    path = await asyncio.to_thread(audio_cache.path, audio_id)
+    if path:
+        return path
+    source = await asyncio.to_thread(audio_cache.source, audio_id)
+    if source is None:
+        return None
+    voice_id, text = source
+    audio_bytes = await take_prefetched(text, voice_id) or await speak_audio(text, voice_id)
+    if not audio_bytes:
+        raise Exception("Nessun audio restituito da AWS Polly")
+    if len(speech_segments(text)) == 1:
+        # Una sola frase: è già in cache con la stessa chiave
+        path = await asyncio.to_thread(audio_cache.path, audio_id)
+        if path:
+            return path
+    # Più frasi: anche l'audio completo va in cache, per servirlo come file
+    path = await audio_cache.put_async(audio_id, audio_bytes, config.AWS_POLLY_FORMAT, provider="polly")
+    if path is None:
+        raise Exception("Impossibile salvare l'audio in cache")
+    return path
+
+
+# -----------------------------------------------------------------------------
+# Pre-sintesi della banca domande
+# -----------------------------------------------------------------------------
+
+def presynthesize(texts: List[str], voices: List[str],
+                  progress: Optional[Callable[[Dict[str, int]], None]] = None,
+                  stop: Optional[threading.Event] = None) -> Dict[str, int]:
+    """Sintetizza in cache l'audio di ``texts`` per ogni voce, come lo chiederà /tts/speak.
+
+    Le frasi (``speech_segments``) già in cache vengono saltate; le altre
+    passano dal pool di Polly, con al più ``TTS_PRESYNTH_CONCURRENCY``
+    sintesi in corso così da lasciare spazio alle richieste live. Bloccante:
+    va eseguita in un thread. ``progress`` riceve i contatori dopo ogni frase;
+    impostando ``stop`` le frasi non ancora avviate vengono abbandonate.
+    """
+    jobs: Dict[str, Tuple[str, str]] = {}
+    for voice_id in voices:
+        for text in texts:
+            for segment in speech_segments(text):
+                jobs.setdefault(polly_cache_key(segment, voice_id), (segment, voice_id))
+    todo = [(key, segment, voice_id) for key, (segment, voice_id) in jobs.items() if not audio_cache.contains(key)]
+    counts = {"total": len(jobs), "cached": len(jobs) - len(todo), "synthesized": 0, "failed": 0}
+    logger.info(f"Pre-sintesi TTS: {len(todo)} frasi da sintetizzare su {len(jobs)}")
+    if progress:
+        progress(dict(counts))
+
+    concurrency = max(1, config.TTS_PRESYNTH_CONCURRENCY)
+    slots = threading.Semaphore(concurrency)
+    lock = threading.Lock()
+
+    def finished(call) -> None:
+        with lock:
+            if call.exception() is None:
+                counts["synthesized"] += 1
+            else:
+                counts["failed"] += 1
+                logger.warning(f"Pre-sintesi TTS fallita per una frase: {call.exception()}")
+            snapshot = dict(counts)
+        if progress:
+            progress(snapshot)
+        slots.release()
+
+    for key, segment, voice_id in todo:
+        slots.acquire()
+        if stop is not None and stop.is_set():
+            slots.release()
+            break
+        # La sintesi in corso si reclama qui e al pool va solo il lavoro del
+        # leader: un thread di Polly non resta mai in attesa di una sintesi
+        # accodata dietro di lui nello stesso pool
+        call, leader = _synthesis_flights.claim(key)
+        if leader:
+            _polly_executor.submit(_synthesize_and_cache, segment, voice_id, key).add_done_callback(
+                lambda f, k=key, c=call: _synthesis_flights.resolve(
+                    k, c, result=None if f.exception() else f.result(), error=f.exception())
+            )
+        call.add_done_callback(finished)
+    # Attende le sintesi ancora in corso
+    for _ in range(concurrency):
+        slots.acquire()
+    metrics.increment("tts_presynth_synthesized", counts["synthesized"])
+    return counts
+
+
+async def text_to_speech(text: str, voice_id: str = config.AWS_POLLY_VOICE_ID) -> Optional[str]:
+    """Audio di ``text`` in base64, con la stessa sintesi di /tts/speak (cache, pool di Polly, hedging).
+
+    Returns:
+        None se il testo è vuoto o la sintesi fallisce
+    """
+    if not text:
+        logger.warning("text_to_speech chiamato con testo vuoto.")
+        return None
+    try:
+        audio_content = await speak_audio(text, voice_id)
     except Exception as e:
         logger.error(f"Errore durante la sintesi vocale Polly: {e}", exc_info=True)
         return None
-
+    return base64.b64encode(audio_content).decode('utf-8')
 
 
 async def stream_tts(text: str, voice: str = None):
-    """Produce audio con AWS Polly di default; se fallisce, usa OpenAI TTS come fallback."""
-    from Main.services.openai_tts_service import text_to_speech_openai
+    """Produce audio con AWS Polly di default, con OpenAI TTS come alternativa.
+
+    Le due sintesi sono in hedging: se Polly fallisce, o tarda oltre il ritardo
+    di hedging, parte OpenAI TTS e viene usato il primo audio pronto.
+    """
+    from Main.services.openai_tts_service import text_to_speech_openai, openai_cache_key
     logger.info(f"TTS Polly (default): richiesta per testo: {text} con voce: {voice if voice else config.AWS_POLLY_VOICE_ID}")
 
-    # --- Tenta Polly (default) ---
-    cache_key_polly = f"polly_{text}_{voice}" if voice else f"polly_{text}"
-    cached = await get_audio_from_cache(cache_key_polly)
-    if cached:
-        logger.info(f"TTS Polly: cache HIT per testo: {text[:40]} (voce: {voice if voice else config.AWS_POLLY_VOICE_ID})")
-        with open(cached, "rb") as f:
-            yield f.read()
-        return
+    selected_voice = voice if voice else config.AWS_POLLY_VOICE_ID
+    selected_voice_openai = voice if voice else config.OPENAI_TTS_VOICE
+    for provider, cache_key in (("Polly", polly_cache_key(text, selected_voice)),
+                                ("OpenAI", openai_cache_key(text, selected_voice_openai))):
+        cached = await audio_cache.get_async(cache_key)
+        if cached:
+            logger.info(f"TTS {provider}: cache HIT per testo: {text[:40]}")
+            yield cached
+            return
+
     optimized_text = optimize_italian_tts(text, wrap_speak=True)
     logger.info(f"TTS Polly: testo ottimizzato (con SSML): {optimized_text}")
-    try:
-        selected_voice = voice if voice else config.AWS_POLLY_VOICE_ID
-        loop = asyncio.get_event_loop()
-        audio_bytes = await loop.run_in_executor(
-            None, 
-            lambda: text_to_speech_polly(optimized_text, selected_voice)
-        )
+
+    async def synthesize_polly():
+        audio_bytes = await run_polly(text_to_speech_polly, optimized_text, selected_voice)
         logger.info(f"TTS Polly: audio generato, lunghezza: {len(audio_bytes) if audio_bytes else 'VUOTO'}")
         if not audio_bytes or len(audio_bytes) < 100:
             raise Exception("TTS Polly: audio non generato o troppo corto!")
-        await save_audio_to_cache(cache_key_polly, audio_bytes)
-        yield audio_bytes
-        return
-    except Exception as e:
-        logger.error(f"TTS Polly: Errore nella generazione audio: {e}. Si tenta fallback OpenAI TTS...")
-
-    # --- Fallback OpenAI TTS ---
-    cache_key_openai = f"openai_{text}_{voice}" if voice else f"openai_{text}"
-    cached_openai = await get_audio_from_cache(cache_key_openai)
-    if cached_openai:
-        logger.info(f"TTS OpenAI: cache HIT per testo: {text[:40]} (voce: {voice if voice else config.OPENAI_TTS_VOICE})")
-        with open(cached_openai, "rb") as f:
-            yield f.read()
-        return
-    try:
-        selected_voice_openai = voice if voice else config.OPENAI_TTS_VOICE
+        await audio_cache.put_async(polly_cache_key(text, selected_voice), audio_bytes,
+                                    config.AWS_POLLY_FORMAT, provider="polly")
+        return audio_bytes
+
+    async def synthesize_openai():
+        # text_to_speech_openai salva da sé l'audio nella cache
         audio_bytes_openai = await text_to_speech_openai(
             text=text,
             voice=selected_voice_openai,
@@ -174,13 +490,16 @@ async def stream_tts(text: str, voice: str = None):
         )
         if not audio_bytes_openai or len(audio_bytes_openai) < 100:
             raise Exception("TTS OpenAI: audio non generato o troppo corto!")
-        await save_audio_to_cache(cache_key_openai, audio_bytes_openai)
-        yield audio_bytes_openai
-        return
+        return audio_bytes_openai
+
+    try:
+        # Hedger distinto da "tts" (duplicato Polly): qui la richiesta extra va a OpenAI
+        audio_bytes = await hedger("tts_alt").run(synthesize_polly, synthesize_openai)
     except Exception as e:
-        logger.error(f"TTS OpenAI: Errore nella generazione audio fallback: {e}")
+        logger.error(f"TTS: Errore nella generazione audio con Polly e OpenAI: {e}")
         from fastapi import HTTPException
         raise HTTPException(status_code=500, detail=f"Errore generazione TTS Polly/OpenAI: {str(e)}")
+    yield audio_bytes
 
 
 
@@ -255,36 +574,6 @@ def _wrap_ssml(text: str) -> str:
 # -----------------------------------------------------------------------------
 
 
-async def get_audio_from_cache(text: str) -> str:
-    """Controlla se un testo è già stato sintetizzato e salvato in cache.
-    
-    Args:
-        text: Il testo o la chiave di cache (può includere informazioni sulla voce)
-    """
-    text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-    cache_path = os.path.join(config.TTS_CACHE_DIR, f"{text_hash}.{config.OPENAI_TTS_FORMAT}")
-    
-    if os.path.exists(cache_path):
-        logger.info(f"TTS cache hit for: {text[:20]}...")
-        return cache_path
-
-
-
-async def save_audio_to_cache(text: str, audio_bytes: bytes) -> str:
-    """Salva l'audio generato in cache.
-    
-    Args:
-        text: Il testo o la chiave di cache (può includere informazioni sulla voce)
-        audio_bytes: I byte dell'audio da salvare
-    """
-    text_hash = hashlib.md5(text.encode('utf-8')).hexdigest()
-    cache_path = os.path.join(config.TTS_CACHE_DIR, f"{text_hash}.{config.OPENAI_TTS_FORMAT}")
-    
-    with open(cache_path, "wb") as f:
-        f.write(audio_bytes)
-    logger.info(f"Saved TTS to cache: {text[:20]}...")
-    return cache_path
-
 # COMMENTATO: Funzione originale per lo streaming TTS con OpenAI
 # async def stream_tts(text: str, voice: str = None):
 #     """Produce audio con OpenAI TTS e caching e logga dettagli per debug.
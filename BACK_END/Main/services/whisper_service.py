@@ -1,39 +1,95 @@
-from typing import BinaryIO
+from typing import BinaryIO, Tuple, Union
 from Main.core.logger import logger
 from Main.core import config
-import tempfile, os, time, asyncio
+from Main.core.hedging import hedger
+import time, asyncio
 from openai import AsyncOpenAI
+from Main.services.transcript_cache import transcript_cache
+from Main.services.stt_scheduler import scheduled
 
 # Client OpenAI singleton
 async_client = AsyncOpenAI()
 
+WHISPER_MODEL = "whisper-1"
+WHISPER_LANGUAGE = "it"
+
+# Nome e MIME con cui l'audio viene inviato: l'API riconosce il formato
+# dall'estensione, che va quindi ricavata dal contenitore reale
+UPLOAD_FILENAME = "answer.webm"
+UPLOAD_CONTENT_TYPE = "audio/webm"
+# Firma iniziale -> (estensione, MIME); WebM se il contenitore non è riconosciuto
+_CONTAINERS = (
+    (0, b"\x1aE\xdf\xa3", "webm", "audio/webm"),  # EBML (MediaRecorder di Chrome/Firefox, encode_opus)
+    (0, b"OggS", "ogg", "audio/ogg"),              # Ogg/Opus (MediaRecorder di Firefox)
+    (4, b"ftyp", "mp4", "audio/mp4"),              # MP4/M4A (MediaRecorder di Safari)
+    (0, b"RIFF", "wav", "audio/wav"),
+    (0, b"fLaC", "flac", "audio/flac"),
+    (0, b"ID3", "mp3", "audio/mpeg"),
+)
+_HEADER_SIZE = 8
+
+
+def _container(header: bytes) -> Tuple[str, str]:
+    """Nome del file e MIME per l'audio che inizia con ``header``."""
+    for offset, magic, extension, content_type in _CONTAINERS:
+        if header[offset:offset + len(magic)] == magic:
+            return f"answer.{extension}", content_type
+    if header[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):  # MP3 senza tag ID3
+        return "answer.mp3", "audio/mpeg"
+    return UPLOAD_FILENAME, UPLOAD_CONTENT_TYPE
+
+
+def _named_upload(audio: Union[bytes, BinaryIO]) -> Tuple[str, Union[bytes, BinaryIO], str]:
+    """Prepara l'audio per l'upload come file con nome, senza passare dal disco.
+
+    Accetta i bytes già in memoria oppure un file-like (ad esempio lo spool di
+    ``UploadFile.file``), che viene letto direttamente dal client HTTP. Nome e
+    MIME seguono il contenitore: per un file-like si leggono i primi byte e si
+    torna alla posizione di partenza.
+    """
+    if isinstance(audio, (bytes, bytearray)):
+        header = bytes(audio[:_HEADER_SIZE])
+    else:
+        position = audio.tell()
+        header = audio.read(_HEADER_SIZE)
+        audio.seek(position)
+    filename, content_type = _container(header)
+    return (filename, audio, content_type)
+
 async def speech_to_text_openai(audio_bytes: bytes) -> str:
     """Trascrive audio in testo usando l'API OpenAI Whisper.
     Accetta bytes audio e restituisce il testo trascritto.
+    Un audio già trascritto viene servito dalla cache senza chiamare l'API;
+    le chiamate reali passano dallo scheduler STT (concorrenza e coda limitate).
     """
+    return await transcript_cache.get_or_transcribe(
+        audio_bytes, WHISPER_MODEL, WHISPER_LANGUAGE, lambda: _transcribe_with_openai(audio_bytes)
+    )
+
+async def _transcribe_with_openai(audio_bytes: bytes) -> str:
     t0 = time.perf_counter()
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_audio_file:
-            tmp_audio_file.write(audio_bytes)
-            tmp_audio_path = tmp_audio_file.name
-        
-        try:
-            with open(tmp_audio_path, 'rb') as audio_file_opened:
-                transcript = await async_client.audio.transcriptions.create(
-                    file=audio_file_opened,
-                    model="whisper-1",
-                    language="it",
-                    response_format="text"
-                )
-            text = str(transcript).strip()
-            logger.info(f"OpenAI Whisper API took {time.perf_counter() - t0:.2f}s for transcription")
-            return text
-        finally:
-            os.unlink(tmp_audio_path) # Assicurati di rimuovere il file temporaneo
+        # Se Whisper tarda oltre il p90 osservato parte una richiesta duplicata.
+        # L'hedging sta fuori dallo scheduler: anche la richiesta extra occupa
+        # uno slot STT e resta entro STT_MAX_CONCURRENCY
+        transcript = await hedger("whisper").run(lambda: _whisper_request(audio_bytes))
+        text = str(transcript).strip()
+        logger.info(f"OpenAI Whisper API took {time.perf_counter() - t0:.2f}s for transcription")
+        return text
     except Exception as e:
         logger.error(f"OpenAI Whisper API error durante la trascrizione: {e}")
         raise
 
+@scheduled
+async def _whisper_request(audio_bytes: bytes):
+    """Una richiesta a Whisper, con uno slot dello scheduler STT."""
+    return await async_client.audio.transcriptions.create(
+        file=_named_upload(audio_bytes),
+        model=WHISPER_MODEL,
+        language=WHISPER_LANGUAGE,
+        response_format="text"
+    )
+
 # -----------------------------------------------------------------------------
 # Utilità di trascrizione secondarie
 # -----------------------------------------------------------------------------
@@ -43,21 +99,13 @@ async def _process_audio_with_openai_whisper(audio_file: BinaryIO) -> str:
     """Usa OpenAI Whisper API (large-v3 via model whisper-1)."""
     t0 = time.perf_counter()
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_audio_file:
-            tmp_audio_file.write(audio_file.read())
-            tmp_audio_path = tmp_audio_file.name
-        
-        try:
-            with open(tmp_audio_path, 'rb') as audio_file:
-                transcript = await async_client.audio.transcriptions.create(
-                    file=audio_file,
-                    model="whisper-1",  # Modello Whisper di OpenAI
-                    language="it",  # Italiano
-                    response_format="text"
-                )
-            return str(transcript)
-        finally:
-            os.unlink(tmp_audio_path)
+        transcript = await async_client.audio.transcriptions.create(
+            file=_named_upload(audio_file),
+            model="whisper-1",  # Modello Whisper di OpenAI
+            language="it",  # Italiano
+            response_format="text"
+        )
+        return str(transcript)
     except Exception as e:
         logger.error(f"OpenAI Whisper API error durante la trascrizione: {e}")
         raise
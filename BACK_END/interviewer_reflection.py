@@ -1,11 +1,13 @@
 # interviewer_reflection.py
 from __future__ import annotations
 import os, time
-from typing import List
+from typing import List, Optional
 
 from dotenv import load_dotenv
 from openai import OpenAI                    # ⬅ nuovo client
 
+from Main.core.bounded_history import BoundedHistory
+
 load_dotenv()
 client = OpenAI()                            # usa OPENAI_API_KEY
 
@@ -15,37 +17,59 @@ class InterviewerReflection:
 
     def __init__(self, model: str = "gpt-3.5-turbo"): # 4o"):
         self.model = model
-        self.transcript: List[dict] = []     # [{"speaker":"user","text":...}, …]
-        self.reflections: List[str] = []     # testo sintetico periodico
+        # solo gli ultimi turni restano in memoria, i precedenti vanno in persistenza
+        self.transcript = BoundedHistory("transcript")    # [{"speaker":"user","text":...}, …]
+        self.reflections = BoundedHistory("reflections")  # testo sintetico periodico
         self._chars_since_last = 0
+        self.reflection_due = False  # riflessione segnata da add_turn(defer_reflection=True)
+
+    def bind(self, user_id: str, session_id: str) -> None:
+        """Associa transcript e riflessioni alla sessione (per lo storico riversato)."""
+        self.transcript.bind(user_id, session_id)
+        self.reflections.bind(user_id, session_id)
+
+    def full_transcript(self) -> List[dict]:
+        """Transcript completo, compresi i turni non più in memoria (per i report)."""
+        return self.transcript.full_history()
 
     # ---------- API pubblica ----------
-    def add_turn(self, speaker: str, text: str) -> None:
+    def add_turn(self, speaker: str, text: str, defer_reflection: bool = False) -> None:
+        """Aggiunge un turno; con ``defer_reflection`` la riflessione dovuta
+        viene solo segnata e va eseguita poi con ``reflect_if_due()``."""
         self.transcript.append({"speaker": speaker, "text": text.strip()})
         self._chars_since_last += len(text)
         # se supero ~200 caratteri di nuovo materiale → rifletto
         if self._chars_since_last >= 200:
-            self.reflect()
+            if defer_reflection:
+                self.reflection_due = True
+            else:
+                self.reflect()
 
-    def get_context(self, k_last: int = 6) -> str:
-        """Restituisce una view compatta (ultimi k turni + ultime riflessioni)."""
-        last_turns = self.transcript[-k_last:]
-        turns_txt = "\n".join(f"[{t['speaker']}] {t['text']}" for t in last_turns)
-        refl_txt  = "\n".join(self.reflections[-3:])
-        return refl_txt + "\n" + turns_txt
+    def reflect_if_due(self) -> bool:
+        """Esegue la riflessione rimandata, se ce n'è una. Restituisce True se eseguita."""
+        snapshot = self.reflection_snapshot()
+        if snapshot is None:
+            return False
+        self.merge_reflection(snapshot, self.summarize(snapshot))
+        return True
 
-    # ---------- internals ----------
-    def reflect(self) -> None:
-        """Invia transcript ≈ ridotto al modello e salva la sintesi."""
-        if not self.transcript:
-            return
+    # ---------- riflessione rimandata, in tre passi ----------
+    # snapshot e merge vanno eseguiti sotto il lock della sessione, summarize
+    # (la chiamata LLM) fuori: i turni successivi non restano in attesa
+    def reflection_snapshot(self) -> Optional[dict]:
+        """Ciò che serve alla riflessione dovuta, o None se non ce n'è una."""
+        if not getattr(self, "reflection_due", False) or not self.transcript:
+            return None
+        return self._snapshot()
 
+    def summarize(self, snapshot: dict) -> str:
+        """Chiamata LLM della riflessione; non modifica lo stato."""
         prompt_sys = (
             "Sei un assistente che legge il transcript di un’intervista "
             "e produce riflessioni concise (max 6 bullet)."
         )
         prompt_usr = (
-            "\n".join(f"[{t['speaker']}] {t['text']}" for t in self.transcript[-10:])
+            "\n".join(f"[{t['speaker']}] {t['text']}" for t in snapshot["turns"])
             + "\n\n### TASK\nSintetizza gli elementi nuovi o importanti in bullet-point."
         )
 
@@ -58,6 +82,40 @@ class InterviewerReflection:
             temperature=0.3,
             max_tokens=120,
         )
-        summary = resp.choices[0].message.content.strip()
-        self.reflections.append(f"**Reflection {len(self.reflections)+1}:**\n{summary}")
-        self._chars_since_last = 0
+        return resp.choices[0].message.content.strip()
+
+    def merge_reflection(self, snapshot: dict, summary: str) -> bool:
+        """
+        Aggiunge la riflessione calcolata su ``snapshot``. Restituisce False (e la
+        scarta) se nel frattempo un'altra riflessione è già stata aggiunta.
+        """
+        if self.reflections.total != snapshot["reflections"]:
+            return False
+        self.reflections.append(f"**Reflection {self.reflections.total+1}:**\n{summary}")
+        # Il materiale arrivato durante la chiamata resta da riflettere
+        self._chars_since_last = max(0, self._chars_since_last - snapshot["chars"])
+        self.reflection_due = self._chars_since_last >= 200
+        return True
+
+    def get_context(self, k_last: int = 6) -> str:
+        """Restituisce una view compatta (ultimi k turni + ultime riflessioni)."""
+        last_turns = self.transcript[-k_last:]
+        turns_txt = "\n".join(f"[{t['speaker']}] {t['text']}" for t in last_turns)
+        refl_txt  = "\n".join(self.reflections[-3:])
+        return refl_txt + "\n" + turns_txt
+
+    # ---------- internals ----------
+    def reflect(self) -> None:
+        """Invia transcript ≈ ridotto al modello e salva la sintesi."""
+        if not self.transcript:
+            return
+        snapshot = self._snapshot()
+        self.merge_reflection(snapshot, self.summarize(snapshot))
+
+    def _snapshot(self) -> dict:
+        # ultimi turni da riassumere, materiale nuovo e riflessioni già fatte
+        return {
+            "turns": self.transcript[-10:],
+            "chars": self._chars_since_last,
+            "reflections": self.reflections.total,
+        }
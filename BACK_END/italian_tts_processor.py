@@ -5,7 +5,16 @@ Principali caratteristiche:
 * Normalizza anglicismi, acronimi, numeri, date e valute in forma facilmente pronunciabile.
 * Inserisce tag SSML <break> per gestire le pause dopo punteggiatura e fine frase.
 * Gestione espandibile tramite dizionari e funzioni plug‑in.
-* Tutte le regex sono pre‑compilate e la pipeline è completamente stateless.
+* Tutte le regex sono pre‑compilate, compresa quella degli anglicismi (un trie
+  delle chiavi, costruito una volta per dizionario); le regole numeriche
+  vengono saltate quando il testo non contiene i caratteri che cercano.
+* ``optimize_italian_tts`` memorizza i risultati (LRU): lo stesso testo viene
+  normalizzato una volta sola; ``optimize_italian_tts_batch`` normalizza
+  un'intera banca domande. Dopo aver modificato ``ANGLOPHONISMS`` va chiamata
+  ``clear_caches()``.
+* ``normalizer_version()`` identifica regole e dizionari in uso: entra nelle
+  chiavi della cache audio, così un cambio di normalizzazione non serve
+  l'audio sintetizzato con le regole precedenti.
 
 Esempio rapido:
 >>> from italian_tts_preprocessor import optimize_italian_tts
@@ -16,9 +25,11 @@ Esempio rapido:
 """
 
 from __future__ import annotations
+import hashlib
 import re
 import logging
-from typing import Dict, Callable
+from functools import lru_cache
+from typing import Dict, Callable, List, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -144,21 +155,57 @@ NUMBER_RE = re.compile(r"\b(\d{4,})\b")  # 1234 ➜ 1 234 (per migliore leggibil
 
 PUNCT_SHORT_RE = re.compile(r"([,;:])")      # virgola, punto e virgola, due punti
 PUNCT_LONG_RE = re.compile(r"([.!?])")        # fine frase
+PUNCT_RE = re.compile(r"[,;:.!?]")            # entrambe, in un solo passaggio
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")  # confine tra frasi: fine frase seguito da spazio
 
 # --- Helper generici --------------------------------------------------------
 
+def _trie_pattern(words: List[str]) -> str:
+    """Regex equivalente all'alternanza di ``words``, con i prefissi comuni fattorizzati (trie).
+
+    Il motore non prova più ogni chiave a ogni posizione: segue un solo ramo
+    per carattere.
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def _build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + _build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return _build(trie)
+
+
+# Regex degli anglicismi per dizionario: (id, dimensione) ➜ regex compilata
+_WORD_PATTERNS: Dict[Tuple[int, int], re.Pattern] = {}
+
+
+def _word_pattern(mapping: Dict[str, str]) -> re.Pattern:
+    key = (id(mapping), len(mapping))
+    pattern = _WORD_PATTERNS.get(key)
+    if pattern is None:
+        pattern = re.compile(r"\b(" + _trie_pattern(list(mapping)) + r")\b", re.IGNORECASE)
+        _WORD_PATTERNS[key] = pattern
+    return pattern
+
+
 def _substitute_words(text: str, mapping: Dict[str, str]) -> str:
     """Sostituisce le parole secondo il mapping (case‑insensitive)."""
     if not mapping:
         return text
 
-    pattern = re.compile(r"\b(" + "|".join(map(re.escape, mapping.keys())) + r")\b", re.IGNORECASE)
-
     def _repl(match: re.Match) -> str:
         key = match.group(0).lower()
         return mapping.get(key, match.group(0))
 
-    return pattern.sub(_repl, text)
+    return _word_pattern(mapping).sub(_repl, text)
 
 
 def _spell_out_acronyms(text: str) -> str:
@@ -238,11 +285,19 @@ def preprocess_italian_text(text: str) -> str:
     """Pipeline di normalizzazione prima dei tag SSML."""
     original = text
     text = _spell_out_acronyms(text)
-    text = _expand_decimals(text)
-    text = _expand_hours(text)
-    text = _expand_euro(text)
-    text = _format_date(text)
-    text = _format_numbers(text)
+    # Le regole numeriche restano in sequenza (l'output di una è l'input della
+    # successiva, es. €3,14 ➜ 3 euro virgola 14), ma ognuna solo se il testo
+    # contiene il carattere che la sua regex richiede
+    if any(char.isdigit() for char in text):
+        if "," in text:
+            text = _expand_decimals(text)
+        if ":" in text:
+            text = _expand_hours(text)
+        if "€" in text:
+            text = _expand_euro(text)
+        if "/" in text:
+            text = _format_date(text)
+        text = _format_numbers(text)
     text = _substitute_words(text, ANGLOPHONISMS)
 
     if text != original:
@@ -259,21 +314,77 @@ def add_ssml_breaks(text: str, short_ms: int = 150, long_ms: int = 400) -> str:
         long_ms: durata pausa lunga (fine frase).
     """
     # Invece di usare tag SSML <break>, usiamo puntini di sospensione invisibili
-    # In OpenAI TTS, questi vengono interpretati come pause naturali senza essere pronunciati
-    # Per le pause brevi (virgole, punto e virgola, due punti)
-    text = PUNCT_SHORT_RE.sub(r"\1 . ", text)
-    
-    # Per le pause lunghe (fine frase) usiamo più puntini che creano pause più lunghe
-    text = PUNCT_LONG_RE.sub(r"\1 . . ", text)
-    
-    return text
+    # In OpenAI TTS, questi vengono interpretati come pause naturali senza essere pronunciati.
+    # Pause brevi (virgole, punto e virgola, due punti): "\1 . "; pause lunghe
+    # (fine frase): "\1 . . ". Il punto della pausa breve riceve a sua volta
+    # la pausa lunga, come nei due passaggi PUNCT_SHORT_RE e PUNCT_LONG_RE
+    return PUNCT_RE.sub(lambda m: _PAUSES[m.group(0)], text)
+
+
+_PAUSES = {char: f"{char} . . .  " for char in ",;:"}
+_PAUSES.update({char: f"{char} . . " for char in ".!?"})
+
+
+def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+    """Divide il testo in frasi, per sintetizzarle separatamente.
+
+    Il confine è la punteggiatura di fine frase seguita da uno spazio (i
+    decimali come 3.14 restano interi); le frasi più corte di ``min_chars``
+    vengono unite alla successiva.
+    """
+    sentences: List[str] = []
+    pending = ""
+    for sentence in SENTENCE_SPLIT_RE.split(text.strip()):
+        pending = f"{pending} {sentence}" if pending else sentence
+        if len(pending) >= min_chars:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
 
 
 def optimize_italian_tts(text: str, wrap_speak: bool = True) -> str:
     """Ottimizza il testo italiano per il TTS, aggiungendo o meno tag SSML.
     
     Se wrap_speak=True, avvolge l'output in tag <speak></speak>.
+    I risultati sono memorizzati: lo stesso testo non viene rielaborato.
     """
+    return _optimize_cached(text, wrap_speak)
+
+
+def optimize_italian_tts_batch(texts: List[str], wrap_speak: bool = True) -> List[str]:
+    """``optimize_italian_tts`` per un elenco di testi (es. un'intera banca domande).
+
+    I duplicati vengono elaborati una volta e i risultati restano nella cache
+    per le richieste TTS successive.
+    """
+    return [_optimize_cached(text, wrap_speak) for text in texts]
+
+
+def clear_caches() -> None:
+    """Svuota la cache dei risultati e le regex degli anglicismi (dopo aver modificato i dizionari)."""
+    _optimize_cached.cache_clear()
+    _WORD_PATTERNS.clear()
+    normalizer_version.cache_clear()
+
+
+@lru_cache(maxsize=1)
+def normalizer_version() -> str:
+    """Impronta breve del codice di normalizzazione e del dizionario degli anglicismi."""
+    digest = hashlib.sha256()
+    with open(__file__, "rb") as source:
+        digest.update(source.read())
+    for word, spoken in sorted(ANGLOPHONISMS.items()):
+        digest.update(f"{word}={spoken}\n".encode("utf-8"))
+    return digest.hexdigest()[:8]
+
+
+@lru_cache(maxsize=4096)
+def _optimize_cached(text: str, wrap_speak: bool) -> str:
     # Rimuove eventuali tag SSML esistenti per evitare duplicazioni
     # text = re.sub(r'<[^>]*>', '', text)
     
@@ -97,6 +97,38 @@ def salva_dati_intervista(
     # Salvataggio nel database
     db["interviste"].insert_one(documento)
 
+def salva_storico(user_id: str, session_id: str, stream: str, index: int, item: Any) -> None:
+    """
+    Salva un elemento dello storico di sessione uscito dalla finestra in memoria.
+
+    Args:
+        user_id: ID dell'utente
+        session_id: ID della sessione di intervista
+        stream: Nome dello storico (transcript, reflections, ...)
+        index: Posizione dell'elemento nello storico completo
+        item: Elemento da salvare
+    """
+    if db is None:
+        raise RuntimeError("Connessione MongoDB non inizializzata")
+    db["storico_sessioni"].insert_one({
+        "user_id": user_id,
+        "session_id": session_id,
+        "stream": stream,
+        "index": index,
+        "item": item,
+        "timestamp": datetime.now(timezone.utc)
+    })
+
+
+def carica_storico(user_id: str, session_id: str, stream: str) -> List[Any]:
+    """Restituisce gli elementi salvati di uno storico di sessione, in ordine."""
+    if db is None:
+        raise RuntimeError("Connessione MongoDB non inizializzata")
+    cursor = db["storico_sessioni"].find(
+        {"user_id": user_id, "session_id": session_id, "stream": stream}
+    ).sort("index", 1)
+    return [doc["item"] for doc in cursor]
+
 # ------------------------------------------------------------------ #
 # 3.  Test manuale: esegui `python memoria.py`
 # ------------------------------------------------------------------ #
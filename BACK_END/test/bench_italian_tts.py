@@ -0,0 +1,148 @@
+"""
+Benchmark della normalizzazione italiana per il TTS (italian_tts_processor).
+
+Confronta, su un corpus di prompt d'intervista e di combinazioni generate
+(numeri, orari, date, importi, anglicismi, punteggiatura):
+* la pipeline originale (alternanza delle chiavi ricompilata a ogni chiamata,
+  pause in due passaggi, tutte le regole numeriche sempre applicate);
+* la pipeline compilata (trie delle chiavi, regole numeriche condizionate,
+  pause in un passaggio) senza cache;
+* la stessa con la cache dei risultati, come nel servizio TTS.
+
+Prima di misurare verifica che l'output sia identico testo per testo: in caso
+di differenze le stampa ed esce con codice 1.
+
+Uso:
+    cd BACK_END
+    python test/bench_italian_tts.py [--texts 2000] [--rounds 5] [--seed 0]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+import italian_tts_processor as itp
+
+PROMPTS = [
+    "Benvenuto all'intervista. Parlami di te e del tuo percorso.",
+    "Qual è stato il progetto più impegnativo del tuo ultimo job? Che ruolo avevi nel team?",
+    "Hai mai gestito un budget superiore a €12.000,50 o una deadline molto stretta?",
+    "Il meeting con il manager è fissato per il 12/5/2024 alle 15:30, va bene?",
+    "Come misuri la performance del tuo staff? Usi KPI o report settimanali?",
+    "Raccontami di un feedback negativo: come hai reagito, e cosa hai cambiato?",
+    "Preferisci lavorare in smart working, in part time o in ufficio?",
+    "Quante persone hanno seguito il webinar su LinkedIn? Erano più di 1500?",
+]
+
+PIECES = [
+    "3,14", "15:30", "9:05", "€12,50", "€ 7", "€3,00", "12/5", "31/12/23", "1/13/2024", "3,14/5",
+    "1234567", "2024", "42", "meeting", "Manager", "PART TIME", "data", "database", "web", "website",
+    "briefing", "brief", "CEO", "HR", "URL", "online", "Team", "feedback!", "skill;", "task:",
+    "domanda", "risposta", "colloquio", "sì", "no", "perché", "\"citazione\"", "<speak>", ",", ".", "?",
+]
+
+
+def legacy_substitute_words(text, mapping):
+    if not mapping:
+        return text
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, mapping.keys())) + r")\b", re.IGNORECASE)
+    return pattern.sub(lambda m: mapping.get(m.group(0).lower(), m.group(0)), text)
+
+
+def legacy_optimize(text, wrap_speak=True):
+    """Pipeline originale, riprodotta per il confronto."""
+    text = re.sub(r'<speak>|</speak>', '', text).strip()
+    text = text.strip('"')
+    text = itp._spell_out_acronyms(text)
+    text = itp._expand_decimals(text)
+    text = itp._expand_hours(text)
+    text = itp._expand_euro(text)
+    text = itp._format_date(text)
+    text = itp._format_numbers(text)
+    text = legacy_substitute_words(text, itp.ANGLOPHONISMS)
+    text = itp.PUNCT_SHORT_RE.sub(r"\1 . ", text)
+    text = itp.PUNCT_LONG_RE.sub(r"\1 . . ", text)
+    return f"<speak> {text} </speak>" if wrap_speak else text
+
+
+def build_corpus(count, seed):
+    rng = random.Random(seed)
+    corpus = list(PROMPTS)
+    questions_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_questions.json")
+    if os.path.exists(questions_file):
+        with open(questions_file, encoding="utf-8") as f:
+            corpus.extend(_strings(json.load(f)))
+    while len(corpus) < count:
+        words = rng.choices(PIECES, k=rng.randint(3, 15))
+        corpus.append(rng.choice([" ", " ", ", ", ""]).join(words))
+    return corpus[:count]
+
+
+def _strings(data):
+    """Tutte le stringhe di un JSON (domande, follow-up...)."""
+    if isinstance(data, str):
+        yield data
+    elif isinstance(data, dict):
+        for value in data.values():
+            yield from _strings(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _strings(value)
+
+
+def measure(fn, corpus, rounds, reset=None):
+    timings = []
+    for _ in range(rounds):
+        if reset:
+            reset()
+        t0 = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        timings.append(time.perf_counter() - t0)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000,
+                        help="Testi nel corpus (oltre 4096 la cache dei risultati non li contiene tutti)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.texts, args.seed)
+    mismatches = 0
+    for text in corpus:
+        for wrap in (True, False):
+            expected, actual = legacy_optimize(text, wrap), itp.optimize_italian_tts(text, wrap)
+            if expected != actual:
+                mismatches += 1
+                print(f"DIVERSO: {text!r}\n  originale: {expected!r}\n  compilata: {actual!r}")
+    if mismatches:
+        sys.exit(f"{mismatches} output diversi dalla pipeline originale")
+    print(f"Corpus: {len(corpus)} testi, output identici alla pipeline originale\n")
+
+    uncached = itp._optimize_cached.__wrapped__
+    legacy = measure(legacy_optimize, corpus, args.rounds)
+    compiled = measure(lambda text: uncached(text, True), corpus, args.rounds)
+    itp.clear_caches()
+    itp.optimize_italian_tts_batch(corpus)
+    memoized = measure(itp.optimize_italian_tts, corpus, args.rounds)
+
+    print(f"{'pipeline':<22} {'tempo (ms)':>11} {'µs/testo':>9} {'speedup':>8}")
+    for name, elapsed in (("originale", legacy), ("compilata", compiled), ("compilata + cache", memoized)):
+        print(f"{name:<22} {elapsed * 1000:>11.1f} {elapsed / len(corpus) * 1e6:>9.1f} "
+              f"{legacy / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark del backend STT locale: real-time factor (RTF) per core.
+
+Per ogni numero di thread CPU trascrive lo stesso file più volte e riporta:
+* RTF = tempo di elaborazione / durata dell'audio (sotto 1 = più veloce del tempo reale)
+* RTF per core = RTF x thread, cioè secondi-core spesi per secondo di audio:
+  serve a dimensionare LOCAL_STT_WORKERS e LOCAL_STT_THREADS_PER_WORKER.
+
+Richiede faster-whisper e ffmpeg (per misurare la durata dell'audio).
+
+Uso:
+    cd BACK_END
+    python test/bench_stt_rtf.py risposta.webm [--model small] [--threads 1 2 4] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import sys
+import time
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.services import stt_backends
+from Main.services.audio_processing import decode_to_pcm, pcm_duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", help="File audio di prova (es. risposta webm di 20-60 s)")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    if stt_backends.WhisperModel is None:
+        sys.exit("faster-whisper non installato: pip install faster-whisper")
+
+    with open(args.audio, "rb") as f:
+        audio_bytes = f.read()
+    duration = pcm_duration(asyncio.run(decode_to_pcm(audio_bytes)))
+    print(f"Audio: {args.audio} ({duration:.1f}s), modello {args.model} ({args.compute_type})\n")
+    print(f"{'thread':>6} {'tempo (s)':>10} {'RTF':>7} {'RTF/core':>9}")
+
+    for threads in args.threads:
+        model = stt_backends.WhisperModel(args.model, device="cpu", compute_type=args.compute_type,
+                                          cpu_threads=threads)
+        # Primo giro di riscaldamento (caricamento pesi, allocazioni)
+        list(model.transcribe(io.BytesIO(audio_bytes), language="it", beam_size=1)[0])
+        timings = []
+        for _ in range(args.rounds):
+            t0 = time.perf_counter()
+            segments, _info = model.transcribe(io.BytesIO(audio_bytes), language="it", beam_size=1)
+            list(segments)  # la trascrizione avviene consumando il generatore
+            timings.append(time.perf_counter() - t0)
+        elapsed = statistics.median(timings)
+        rtf = elapsed / duration
+        print(f"{threads:>6} {elapsed:>10.2f} {rtf:>7.3f} {rtf * threads:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
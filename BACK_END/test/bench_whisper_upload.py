@@ -0,0 +1,86 @@
+"""
+Benchmark dell'upload verso Whisper: file temporaneo su disco (percorso
+precedente) contro buffer in memoria con nome (percorso attuale).
+
+Il client OpenAI usa un trasporto httpx finto che risponde subito, quindi si
+misura solo il costo locale di preparazione e invio della richiesta multipart,
+senza rete. I payload simulano risposte webm/opus da 20-60 secondi.
+
+Uso:
+    cd BACK_END
+    OPENAI_API_KEY=x python test/bench_whisper_upload.py [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from openai import AsyncOpenAI
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+from Main.services import whisper_service
+
+# Bitrate tipico di MediaRecorder per webm/opus vocale (~32 kbit/s)
+WEBM_BYTES_PER_SECOND = 4000
+DURATIONS = (20, 40, 60)
+
+
+async def _fake_whisper(request: httpx.Request) -> httpx.Response:
+    await request.aread()
+    return httpx.Response(200, text="risposta trascritta", headers={"content-type": "text/plain"})
+
+
+async def legacy_tempfile_upload(client: AsyncOpenAI, audio_bytes: bytes) -> str:
+    """Il percorso precedente: scrittura su NamedTemporaryFile, riapertura, unlink."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp_audio_file:
+        tmp_audio_file.write(audio_bytes)
+        tmp_audio_path = tmp_audio_file.name
+    try:
+        with open(tmp_audio_path, "rb") as audio_file_opened:
+            transcript = await client.audio.transcriptions.create(
+                file=audio_file_opened, model="whisper-1", language="it", response_format="text"
+            )
+        return str(transcript).strip()
+    finally:
+        os.unlink(tmp_audio_path)
+
+
+async def _measure(fn, audio_bytes: bytes, rounds: int) -> list:
+    timings = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        await fn(audio_bytes)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+
+async def main(rounds: int) -> None:
+    client = AsyncOpenAI(
+        api_key="bench",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(_fake_whisper)),
+    )
+    whisper_service.async_client = client
+
+    print(f"{'durata':>7} {'dimensione':>11} {'temp file (ms)':>15} {'in memoria (ms)':>16} {'guadagno':>9}")
+    for seconds in DURATIONS:
+        audio_bytes = os.urandom(seconds * WEBM_BYTES_PER_SECOND)
+        legacy = await _measure(lambda b: legacy_tempfile_upload(client, b), audio_bytes, rounds)
+        current = await _measure(whisper_service.speech_to_text_openai, audio_bytes, rounds)
+        legacy_ms, current_ms = statistics.median(legacy), statistics.median(current)
+        print(f"{seconds:>6}s {len(audio_bytes) // 1024:>8} KB {legacy_ms:>15.3f} {current_ms:>16.3f} "
+              f"{(1 - current_ms / legacy_ms) * 100:>8.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    asyncio.run(main(parser.parse_args().rounds))
@@ -0,0 +1,98 @@
+"""
+Verifica del controllo di ammissione: quando gli import saturano il budget
+globale i turni live vengono ancora ammessi (slot riservati), mentre le quote
+per utente rispondono subito con 429 e Retry-After.
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import config
+from Main.core.admission import admit
+
+release = asyncio.Event()
+app = FastAPI()
+
+
+@app.post("/import", dependencies=[Depends(admit("import"))])
+async def slow_import():
+    await release.wait()
+    return {"ok": True}
+
+
+@app.post("/turn", dependencies=[Depends(admit("turn"))])
+async def turn():
+    return {"ok": True}
+
+
+@pytest.mark.asyncio
+async def test_turns_keep_reserved_slots(monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_MAX_CONCURRENT", 4)
+    monkeypatch.setattr(config, "ADMISSION_RESERVED_TURN_SLOTS", 2)
+    monkeypatch.setitem(config.ADMISSION_CLASS_CONCURRENCY, "import", 10)
+    monkeypatch.setitem(config.ADMISSION_USER_CONCURRENCY, "import", 10)
+    monkeypatch.setitem(config.ADMISSION_USER_RATE, "import", 100)
+    release.clear()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        imports = [asyncio.create_task(client.post("/import", headers={"Authorization": f"u{i}"})) for i in range(2)]
+        await asyncio.sleep(0.1)
+
+        # Budget non riservato esaurito: un terzo import viene rifiutato subito
+        rejected = await client.post("/import", headers={"Authorization": "u9"})
+        assert rejected.status_code == 503
+        assert "retry-after" in rejected.headers
+
+        # I turni live usano gli slot riservati
+        live = await client.post("/turn", headers={"Authorization": "live"})
+        assert live.status_code == 200
+
+        release.set()
+        assert all(r.status_code == 200 for r in await asyncio.gather(*imports))
+
+
+@pytest.mark.asyncio
+async def test_per_user_rate_limit(monkeypatch):
+    monkeypatch.setitem(config.ADMISSION_USER_RATE, "turn", 2)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        statuses = [(await client.post("/turn", headers={"Authorization": "rate"})).status_code for _ in range(3)]
+        other = await client.post("/turn", headers={"Authorization": "altro"})
+    assert statuses == [200, 200, 429]
+    assert other.status_code == 200
+
+
+def test_rate_windows_do_not_accumulate(monkeypatch):
+    from fastapi import HTTPException
+    from Main.core import admission
+
+    monkeypatch.setitem(config.ADMISSION_USER_RATE, "turn", 1)
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: clock[0])
+    controller = admission.AdmissionController()
+
+    controller.acquire("turn", "ip-1")
+    controller.release("turn", "ip-1")
+    with pytest.raises(HTTPException):
+        controller.acquire("turn", "ip-1")
+    # Le richieste rifiutate non creano finestre
+    monkeypatch.setattr(config, "ADMISSION_MAX_CONCURRENT", 0)
+    with pytest.raises(HTTPException):
+        controller.acquire("turn", "ip-2")
+    assert list(controller._user_requests) == [("turn", "ip-1")]
+
+    # Dopo un minuto la finestra scaduta viene eliminata
+    monkeypatch.setattr(config, "ADMISSION_MAX_CONCURRENT", 10)
+    clock[0] += admission.RATE_WINDOW_SECONDS + 1
+    controller.acquire("turn", "ip-3")
+    assert list(controller._user_requests) == [("turn", "ip-3")]
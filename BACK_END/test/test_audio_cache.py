@@ -0,0 +1,110 @@
+"""
+Verifica della cache audio: chiavi canoniche, eliminazione delle voci usate
+meno di recente oltre il limite di spazio, statistiche dall'indice e livello
+in memoria con precaricamento. Il totale dei byte è mantenuto senza scorrere
+l'indice, gli hit non scrivono nell'indice a ogni lettura e i file delle
+vecchie cache vengono rimossi solo dal passo di migrazione esplicito.
+"""
+
+import os
+import sqlite3
+import sys
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.services import audio_cache as audio_cache_module
+from Main.services.audio_cache import INDEX_FILENAME, AudioCache
+
+
+def test_key_ignores_whitespace_but_not_voice():
+    a = AudioCache.key("polly", "Bianca", "neural", "mp3", "Parlami  di te.\n")
+    b = AudioCache.key("polly", "Bianca", "neural", "mp3", "Parlami di te.")
+    c = AudioCache.key("polly", "Adriano", "neural", "mp3", "Parlami di te.")
+    assert a == b
+    assert a != c
+
+
+def test_lru_eviction_and_stats(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=3000)
+    keys = [AudioCache.key("polly", "Bianca", "neural", "mp3", f"domanda {i}") for i in range(4)]
+    for key in keys[:3]:
+        cache.put(key, b"x" * 1000, "mp3", provider="polly")
+    assert cache.get(keys[0]) == b"x" * 1000  # la prima voce torna la più recente
+
+    cache.put(keys[3], b"x" * 1000, "mp3", provider="polly")
+
+    assert cache.get(keys[1]) is None  # la meno recente è stata eliminata
+    assert cache.get(keys[0]) is not None
+    stats = cache.stats()
+    assert stats["bytes"] <= 3000
+    assert stats["hits"] == 2 and stats["misses"] == 1
+    assert not any(name.endswith(".mp3") for name in os.listdir(tmp_path))  # file in sottocartelle
+
+
+def test_memory_tier_serves_without_disk(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=10_000, hot_bytes=4000)
+    key = AudioCache.key("polly", "Bianca", "neural", "mp3", "Benvenuto!")
+    path = cache.put(key, b"y" * 500, "mp3", provider="polly")
+    os.unlink(path)  # un hit in memoria non legge il file
+    assert cache.get(key) == b"y" * 500
+    assert cache.stats()["memory"]["hits"] == 1
+
+    warm = AudioCache(str(tmp_path), max_bytes=10_000, hot_bytes=4000)
+    other = AudioCache.key("polly", "Bianca", "neural", "mp3", "Grazie.")
+    warm.put(other, b"z" * 500, "mp3", provider="polly")
+    cold = AudioCache(str(tmp_path), max_bytes=10_000, hot_bytes=4000)
+    assert cold.preload(10) == 1  # il file della prima voce non c'è più
+    assert cold.stats()["memory"]["entries"] == 1
+
+
+def _indexed_bytes(directory):
+    with sqlite3.connect(os.path.join(directory, INDEX_FILENAME)) as db:
+        return db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+
+def test_byte_total_tracks_puts_replacements_and_evictions(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=3000)
+    keys = [AudioCache.key("polly", "Bianca", "neural", "mp3", f"domanda {i}") for i in range(5)]
+    for key in keys[:2]:
+        cache.put(key, b"x" * 1000, "mp3")
+    cache.put(keys[0], b"x" * 400, "mp3")  # sostituzione: conta solo la differenza
+    assert cache.stats()["bytes"] == _indexed_bytes(tmp_path) == 1400
+    for key in keys[2:]:
+        cache.put(key, b"x" * 1000, "mp3")
+    assert cache.stats()["bytes"] == _indexed_bytes(tmp_path) <= 3000
+
+    # Un indice esistente senza contatore lo riceve all'apertura
+    with sqlite3.connect(os.path.join(tmp_path, INDEX_FILENAME)) as db:
+        db.execute("DELETE FROM counters WHERE name = 'bytes'")
+    assert AudioCache(str(tmp_path), max_bytes=3000).stats()["bytes"] == _indexed_bytes(tmp_path)
+
+
+def test_hits_are_reported_to_the_index_in_batches(tmp_path, monkeypatch):
+    cache = AudioCache(str(tmp_path), max_bytes=10_000)
+    key = AudioCache.key("polly", "Bianca", "neural", "mp3", "Benvenuto!")
+    cache.put(key, b"y" * 500, "mp3")
+    db = cache._db()
+    writes = db.total_changes
+    for _ in range(5):
+        assert cache.path(key) is not None
+    assert db.total_changes == writes  # nessuna transazione di scrittura per hit
+
+    stats = cache.stats()  # riporta gli accessi accumulati
+    assert stats["hits"] == 5
+    assert db.execute("SELECT hits FROM entries WHERE key = ?", (key,)).fetchone()[0] == 5
+
+    # Oltre l'intervallo il riporto avviene anche senza scritture
+    monkeypatch.setattr(audio_cache_module, "ACCESS_FLUSH_SECONDS", 0)
+    cache.path(key)
+    assert db.execute("SELECT hits FROM entries WHERE key = ?", (key,)).fetchone()[0] == 6
+
+
+def test_legacy_files_are_removed_only_by_the_migration_step(tmp_path):
+    legacy = tmp_path / ("0123456789abcdef" * 2 + ".mp3")
+    legacy.write_bytes(b"vecchio")
+    cache = AudioCache(str(tmp_path), max_bytes=10_000)
+    assert legacy.exists()
+    cache.remove_legacy_files()
+    assert not legacy.exists()
@@ -0,0 +1,192 @@
+"""
+Verifica della pre-elaborazione audio: il VAD rimuove il silenzio ai bordi e
+accorcia le pause lunghe con una soglia che si adatta al rumore di fondo; la
+versione in streaming taglia come quella sull'intero buffer tenendo in memoria
+solo una finestra fissa di PCM, e la pipeline decoder -> VAD -> encoder legge
+l'upload a blocchi. Un audio già Opus mono a 16 kHz senza silenzio da
+togliere non viene ricodificato.
+
+I test che richiedono ffmpeg vengono saltati se il binario non è disponibile.
+"""
+
+import asyncio
+import io
+import os
+import shutil
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import config
+from Main.services import audio_processing
+from Main.services.audio_processing import (
+    SAMPLE_RATE, StreamingTrimmer, detect_speech, is_compact_opus, pcm_duration, trim_silence
+)
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which(config.FFMPEG_BINARY) is None, reason="ffmpeg non disponibile")
+
+
+def _noise(seconds, rng, amplitude=40):
+    return rng.normal(0, amplitude, int(seconds * SAMPLE_RATE))
+
+
+def _tone(seconds, amplitude=6000, frequency=220):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * frequency * t)
+
+
+def _answer_pcm(pieces):
+    """PCM s16le da una sequenza di ("voce" | "silenzio", secondi)."""
+    rng = np.random.default_rng(0)
+    parts = [_tone(s) + _noise(s, rng) if kind == "voce" else _noise(s, rng) for kind, s in pieces]
+    return np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16).tobytes()
+
+
+ANSWER = [("silenzio", 3.0), ("voce", 2.0), ("silenzio", 4.0), ("voce", 1.5), ("silenzio", 0.3),
+          ("voce", 1.0), ("silenzio", 5.0)]
+
+
+def test_trim_silence_drops_edges_and_shortens_long_pauses():
+    pcm = _answer_pcm(ANSWER)
+    regions = detect_speech(pcm)
+    # Voce a 3.0-5.0 s e 9.0-11.8 s (la pausa di 0.3 s non separa i tratti), più 0.2 s di margine
+    assert len(regions) == 2
+    assert regions[0][0] == pytest.approx(2.8 * SAMPLE_RATE, abs=0.05 * SAMPLE_RATE)
+    assert regions[1][1] == pytest.approx(12.0 * SAMPLE_RATE, abs=0.05 * SAMPLE_RATE)
+
+    trimmed, speech = trim_silence(pcm, 0.8)
+    # 2.4 + 3.2 s di voce con margine, più 0.8 s della pausa lunga
+    assert speech == pytest.approx(5.6, abs=0.1)
+    assert pcm_duration(trimmed) == pytest.approx(speech + 0.8, abs=0.05)
+
+
+def test_trim_silence_adapts_to_background_noise():
+    rng = np.random.default_rng(1)
+    noisy = np.concatenate([_noise(2.0, rng, amplitude=800), _tone(1.0) + _noise(1.0, rng, amplitude=800),
+                            _noise(2.0, rng, amplitude=800)])
+    pcm = np.clip(noisy, -32768, 32767).astype(np.int16).tobytes()
+    # Il rumore supera VAD_MIN_RMS ma resta sotto la soglia adattiva
+    trimmed, speech = trim_silence(pcm, 0.8)
+    assert speech == pytest.approx(1.4, abs=0.1)
+
+    assert trim_silence(_answer_pcm([("silenzio", 3.0)]), 0.8) == (b"", 0.0)
+
+
+def _stream(trimmer, pcm, chunk=4099):
+    # Blocchi di lunghezza dispari: i frame vanno ricomposti a cavallo dei blocchi
+    out = [trimmer.feed(pcm[i:i + chunk]) for i in range(0, len(pcm), chunk)]
+    out.append(trimmer.finish())
+    return b"".join(out)
+
+
+def test_streaming_trimmer_matches_whole_buffer_vad():
+    pcm = _answer_pcm(ANSWER)
+    expected, expected_speech = trim_silence(pcm, 0.8)
+
+    trimmer = StreamingTrimmer(0.8)
+    streamed = _stream(trimmer, pcm)
+
+    assert len(streamed) % 2 == 0
+    assert abs(pcm_duration(streamed) - pcm_duration(expected)) < 0.1
+    assert abs(trimmer.speech_seconds - expected_speech) < 0.1
+    assert trimmer.kept_seconds == pytest.approx(pcm_duration(streamed))
+    # 4.5 s di voce, una pausa lunga accorciata a 0.8 s e una breve mantenuta
+    assert 4.5 < pcm_duration(streamed) < 7.0
+
+
+def test_streaming_trimmer_drops_silence_only_recording():
+    trimmer = StreamingTrimmer(0.8)
+    assert _stream(trimmer, _answer_pcm([("silenzio", 6.0)])) == b""
+    assert trimmer.speech_seconds == 0
+
+
+def test_streaming_trimmer_memory_does_not_grow_with_duration():
+    trimmer = StreamingTrimmer(0.8)
+    trimmer.feed(_answer_pcm([("voce", 1.0)]))
+    chunk = _answer_pcm([("silenzio", 2.0)])
+    for _ in range(60):  # due minuti di silenzio dopo la voce
+        trimmer.feed(chunk)
+        held = len(trimmer._gap_head) + len(trimmer._gap_tail) + len(trimmer._pending)
+        assert held <= trimmer.max_gap_frames + trimmer.padding_frames + trimmer.lookahead_frames
+
+
+class ReadCountingFile(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.largest_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.largest_read = max(self.largest_read, len(chunk))
+        return chunk
+
+
+def _encode_test_upload(pcm):
+    return asyncio.run(audio_processing.encode_opus(pcm))
+
+
+def _opus_head(channels, input_rate):
+    return (b"\x1aE\xdf\xa3" + b"\x00" * 40 + b"OpusHead" + bytes([1, channels]) + b"\x38\x01"
+            + struct.pack("<I", input_rate) + b"\x00\x00\x00")
+
+
+def test_is_compact_opus_reads_opus_head():
+    assert is_compact_opus(_opus_head(1, 16000))
+    assert is_compact_opus(_opus_head(1, 8000))
+    assert not is_compact_opus(_opus_head(2, 48000))  # MediaRecorder di Chrome
+    assert not is_compact_opus(_opus_head(1, 48000))
+    assert not is_compact_opus(b"RIFF" + b"\x00" * 100)  # WAV
+    assert not is_compact_opus(b"\x00" * 5000 + _opus_head(1, 16000))  # oltre l'intestazione
+    assert not is_compact_opus(_opus_head(1, 16000)[:-8])  # troncato
+
+
+@requires_ffmpeg
+def test_encode_opus_produces_compact_mono_16k():
+    pcm = _answer_pcm([("voce", 3.0)])
+    audio = _encode_test_upload(pcm)
+    assert is_compact_opus(audio)
+    assert len(audio) < len(pcm) / 6
+    decoded = asyncio.run(audio_processing.decode_to_pcm(audio))
+    assert pcm_duration(decoded) == pytest.approx(3.0, abs=0.1)
+
+
+@requires_ffmpeg
+def test_prepare_for_stt_keeps_compact_opus_without_silence(monkeypatch):
+    monkeypatch.setattr(config, "VAD_ENABLED", True)
+    # Meno di VAD_MIN_TRIM_SECONDS di silenzio da togliere
+    original = _encode_test_upload(_answer_pcm([("silenzio", 0.4), ("voce", 3.0), ("silenzio", 0.4)]))
+    assert asyncio.run(audio_processing.prepare_for_stt(io.BytesIO(original))) == original
+
+
+@requires_ffmpeg
+def test_prepare_for_stt_streams_upload_and_trims_silence(monkeypatch):
+    monkeypatch.setattr(config, "VAD_ENABLED", True)
+    monkeypatch.setattr(config, "UPLOAD_CHUNK_SIZE", 8 * 1024)
+    upload = ReadCountingFile(_encode_test_upload(_answer_pcm(ANSWER)))
+
+    compact = asyncio.run(audio_processing.prepare_for_stt(upload))
+
+    assert compact is not None and is_compact_opus(compact)
+    assert upload.largest_read <= 8 * 1024 + 16 + 4096  # solo blocchi e intestazione
+    duration = pcm_duration(asyncio.run(audio_processing.decode_to_pcm(compact)))
+    assert 4.5 < duration < 7.0  # 17.8 s registrati
+
+
+@requires_ffmpeg
+def test_prepare_for_stt_skips_recording_without_speech(monkeypatch):
+    monkeypatch.setattr(config, "VAD_ENABLED", True)
+    upload = io.BytesIO(_encode_test_upload(_answer_pcm([("silenzio", 4.0)])))
+    assert asyncio.run(audio_processing.prepare_for_stt(upload)) is None
+
+
+def test_prepare_for_stt_falls_back_to_original_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(config, "FFMPEG_BINARY", "/nonexistent/ffmpeg")
+    monkeypatch.setattr(audio_processing, "_ffmpeg_slots", None)
+    upload = io.BytesIO(b"RIFF-non-decodificabile")
+    assert asyncio.run(audio_processing.prepare_for_stt(upload)) == b"RIFF-non-decodificabile"
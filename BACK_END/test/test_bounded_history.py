@@ -0,0 +1,57 @@
+"""
+Verifica dello storico a finestra limitata: in memoria restano solo gli
+ultimi elementi, quelli più vecchi vengono riversati in background (un
+append non attende la scrittura) e ``full_history`` li rilegge tutti in
+ordine, anche dopo un passaggio da pickle come nello store condiviso.
+"""
+
+import os
+import pickle
+import sys
+import threading
+import time
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import bounded_history
+from Main.core.bounded_history import BoundedHistory, FileHistoryStore
+
+
+def test_spill_runs_off_the_caller_and_reloads_in_order(tmp_path, monkeypatch):
+    store = FileHistoryStore(str(tmp_path))
+    writing = threading.Event()
+
+    def slow_save(user_id, session_id, stream, index, item):
+        writing.set()
+        time.sleep(0.05)  # MongoDB lento
+        store.append(user_id, session_id, stream, index, item)
+
+    monkeypatch.setattr(bounded_history, "_save_spilled", slow_save)
+    monkeypatch.setattr(bounded_history, "_load_spilled", store.load)
+
+    history = BoundedHistory("transcript", window=10)
+    history.bind("anna", "sessione-1")
+    t0 = time.perf_counter()
+    for i in range(25):
+        history.append({"speaker": "user", "text": f"risposta {i}"})
+    assert time.perf_counter() - t0 < 0.05 * 15  # i 15 riversamenti non bloccano il turno
+    assert writing.wait(1)
+
+    assert len(history) == 10 and history.total == 25
+    assert history[-1]["text"] == "risposta 24"
+
+    restored = pickle.loads(pickle.dumps(history))
+    assert [item["text"] for item in restored.full_history()] == [f"risposta {i}" for i in range(25)]
+
+
+def test_file_store_keeps_sessions_and_streams_apart(tmp_path):
+    store = FileHistoryStore(str(tmp_path))
+    store.append("anna", "s1", "transcript", 1, "b")
+    store.append("anna", "s1", "transcript", 0, "a")
+    store.append("anna", "s1", "reflections", 0, "riflessione")
+    store.append("anna", "s2", "transcript", 0, "altra sessione")
+    assert store.load("anna", "s1", "transcript") == ["a", "b"]
+    assert store.load("anna", "s1", "reflections") == ["riflessione"]
+    assert store.load("bruno", "s1", "transcript") == []
@@ -0,0 +1,133 @@
+"""
+Verifica dell'hedging: una richiesta lenta viene superata da quella extra
+(e annullata), un errore passa subito al provider alternativo e le richieste
+extra restano entro il budget configurato. Il risultato di una chiamata
+sincrona perdente viene rilasciato con ``discard``. La richiesta extra verso
+Whisper passa dallo scheduler STT come quella principale.
+"""
+
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import config
+from Main.core.hedging import Hedger
+
+
+@pytest.fixture(autouse=True)
+def hedging_config(monkeypatch):
+    monkeypatch.setattr(config, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(config, "HEDGE_MAX_DELAY", 0.05)
+    monkeypatch.setattr(config, "HEDGE_MAX_EXTRA_RATIO", 1.0)
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_loses_to_alternate():
+    cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "polly"
+
+    async def fast():
+        return "openai"
+
+    assert await Hedger("test").run(slow, fast) == "openai"
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_failure_switches_to_alternate_immediately():
+    async def broken():
+        raise RuntimeError("provider down")
+
+    async def alternate():
+        return "ok"
+
+    assert await asyncio.wait_for(Hedger("test").run(broken, alternate), timeout=0.04) == "ok"
+
+
+def test_sync_extra_requests_capped(monkeypatch):
+    monkeypatch.setattr(config, "HEDGE_MAX_EXTRA_RATIO", 0.25)
+    hedger = Hedger("test")
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.08)
+        return "ok"
+
+    for _ in range(8):
+        assert hedger.run_sync(call) == "ok"
+    extra = len(calls) - 8
+    assert 0 < extra <= 2
+    assert hedger.snapshot()["extra_rate"] <= 0.25
+
+
+def test_sync_loser_result_is_discarded():
+    streams = []
+    finished = threading.Event()
+
+    def synthesize():
+        # La prima chiamata risponde dopo il ritardo di hedging e perde
+        slow = not streams
+        stream = io.BytesIO(b"audio")
+        streams.append(stream)
+        if slow:
+            time.sleep(0.2)
+            finished.set()
+        return {"AudioStream": stream}
+
+    response = Hedger("test").run_sync(synthesize, discard=lambda losing: losing["AudioStream"].close())
+
+    assert response["AudioStream"] is streams[1] and not streams[1].closed
+    assert finished.wait(1)
+    deadline = time.monotonic() + 1
+    while not streams[0].closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert streams[0].closed
+
+
+@pytest.mark.asyncio
+async def test_whisper_hedge_counts_against_stt_scheduler(monkeypatch):
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from Main.services import stt_scheduler, whisper_service
+
+    active = []
+    calls = []
+
+    class Transcriptions:
+        async def create(self, **kwargs):
+            active.append(1)
+            calls.append(len(active))
+            try:
+                await asyncio.sleep(0.2 if len(calls) == 1 else 0.01)
+            finally:
+                active.pop()
+            return f"risposta {len(calls)}"
+
+    class Audio:
+        transcriptions = Transcriptions()
+
+    class Client:
+        audio = Audio()
+
+    monkeypatch.setattr(whisper_service, "async_client", Client())
+    monkeypatch.setattr(stt_scheduler, "scheduler", stt_scheduler.STTScheduler(max_concurrency=1, max_queue=10))
+
+    assert await whisper_service._transcribe_with_openai(b"audio") == "risposta 1"
+    # La richiesta extra attende lo slot: mai due chiamate contemporanee
+    assert max(calls) == 1
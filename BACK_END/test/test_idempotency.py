@@ -0,0 +1,139 @@
+"""
+Verifica dell'idempotenza dei turni: un reinvio della stessa risposta riceve
+il risultato del turno originale (anche se arriva mentre è in corso), un
+turno fallito viene rieseguito e i risultati scadono dopo il TTL. La chiave
+senza ``Idempotency-Key`` dipende dal numero di turno della sessione; un
+reinvio arrivato dopo la fine del turno, anche su un altro worker, riceve il
+risultato salvato sulla sessione.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import idempotency
+from Main.core.idempotency import TurnResultCache, request_key, run_locked_turn, turn_marker
+from Main.core.shared_state import FileSessionStore
+
+
+class CountingTurn:
+    def __init__(self, delay=0.05, fail_first=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail_first = fail_first
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail_first and self.calls == 1:
+            raise RuntimeError("STT non disponibile")
+        return {"status": "success", "turn": self.calls}
+
+
+@pytest.mark.asyncio
+async def test_duplicates_in_flight_and_after_completion_replay_the_result():
+    cache = TurnResultCache(ttl=60)
+    turn = CountingTurn()
+    results = await asyncio.gather(*[cache.run("anna:key:abc", turn) for _ in range(3)])
+    assert results == [{"status": "success", "turn": 1}] * 3
+
+    assert await cache.run("anna:key:abc", turn) == {"status": "success", "turn": 1}
+    assert turn.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_turn_is_not_cached():
+    cache = TurnResultCache(ttl=60)
+    turn = CountingTurn(fail_first=True)
+    with pytest.raises(RuntimeError):
+        await cache.run("anna:key:abc", turn)
+    assert await cache.run("anna:key:abc", turn) == {"status": "success", "turn": 2}
+
+
+@pytest.mark.asyncio
+async def test_results_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(idempotency.time, "monotonic", lambda: now[0])
+    cache = TurnResultCache(ttl=30)
+    turn = CountingTurn(delay=0)
+
+    await cache.run("anna:key:abc", turn)
+    now[0] += 29
+    assert (await cache.run("anna:key:abc", turn))["turn"] == 1
+    now[0] += 2
+    assert (await cache.run("anna:key:abc", turn))["turn"] == 2
+    assert len(cache._entries) == 1
+
+
+def test_content_key_depends_on_session_turn():
+    # Un "sì" identico al turno successivo è una risposta nuova, non un reinvio
+    assert request_key("anna", b"si", 3) == request_key("anna", b"si", 3)
+    assert request_key("anna", b"si", 3) != request_key("anna", b"si", 4)
+    assert request_key("anna", b"si", 3) != request_key("marco", b"si", 3)
+
+
+class Session:
+    def __init__(self):
+        self.turn_count = 0
+
+
+class Worker:
+    """Un worker con la propria cache dei turni in corso e lo store di sessioni condiviso."""
+
+    def __init__(self, store):
+        self.store = store
+        self.results = TurnResultCache(ttl=60)
+
+    async def submit(self, payload, turn):
+        marker = turn_marker(None, payload)
+
+        async def locked():
+            session = self.store["anna"]
+            session.turn_count += 1
+            self.store["anna"] = session
+            return await turn()
+
+        async def once():
+            return await run_locked_turn(self.store, "anna", marker, lambda: self.store["anna"],
+                                         lambda s: self.store.__setitem__("anna", s), locked, ttl=60)
+
+        # Come run_idempotent_turn senza chiave: il numero di turno cambia a fine turno
+        key = request_key("anna", payload, self.store["anna"].turn_count)
+        return await self.results.run(key, once)
+
+
+@pytest.mark.asyncio
+async def test_retry_after_completion_replays_the_result_on_any_worker(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    store["anna"] = Session()
+    first, second = Worker(store), Worker(store)
+    turn = CountingTurn(delay=0)
+
+    assert await first.submit(b"audio-risposta", turn) == {"status": "success", "turn": 1}
+    # Stesso worker (nuovo numero di turno) e altro worker (cache dei turni vuota)
+    assert await first.submit(b"audio-risposta", turn) == {"status": "success", "turn": 1}
+    assert await second.submit(b"audio-risposta", turn) == {"status": "success", "turn": 1}
+    assert turn.calls == 1 and store["anna"].turn_count == 1
+
+    # Una risposta diversa è un turno nuovo
+    assert await second.submit(b"altra-risposta", turn) == {"status": "success", "turn": 2}
+
+
+@pytest.mark.asyncio
+async def test_replay_from_session_expires_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(idempotency.time, "time", lambda: now[0])
+    store = FileSessionStore(str(tmp_path))
+    store["anna"] = Session()
+    worker = Worker(store)
+    turn = CountingTurn(delay=0)
+
+    await worker.submit(b"si", turn)
+    now[0] += 61
+    assert (await worker.submit(b"si", turn))["turn"] == 2
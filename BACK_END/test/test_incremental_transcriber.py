@@ -0,0 +1,112 @@
+"""
+Verifica della trascrizione incrementale usata da /transcribe/stream: i chunk
+vengono decodificati da un solo processo ffmpeg man mano che arrivano, i
+segmenti partono durante la registrazione e in memoria resta solo il PCM non
+ancora assegnato a un segmento.
+
+I test che richiedono ffmpeg vengono saltati se il binario non è disponibile.
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import config
+from Main.services import audio_processing
+from Main.services.audio_processing import SAMPLE_RATE, SAMPLE_WIDTH
+from Main.services.incremental_transcriber import IncrementalTranscriber
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which(config.FFMPEG_BINARY) is None, reason="ffmpeg non disponibile")
+
+
+def _recording(pieces):
+    """webm/opus da una sequenza di ("voce" | "silenzio", secondi)."""
+    rng = np.random.default_rng(0)
+    parts = []
+    for kind, seconds in pieces:
+        n = int(seconds * SAMPLE_RATE)
+        noise = rng.normal(0, 40, n)
+        tone = 6000 * np.sin(2 * np.pi * 220 * np.arange(n) / SAMPLE_RATE)
+        parts.append(tone + noise if kind == "voce" else noise)
+    pcm = np.clip(np.concatenate(parts), -32768, 32767).astype(np.int16).tobytes()
+    return asyncio.run(audio_processing.encode_opus(pcm))
+
+
+class FakeSTT:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, audio):
+        self.calls += 1
+        return f"segmento {self.calls}"
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    """Argomenti dei processi ffmpeg avviati durante il test."""
+    calls = []
+    original = audio_processing._spawn_ffmpeg
+
+    async def counting(args):
+        calls.append(args)
+        return await original(args)
+
+    monkeypatch.setattr(audio_processing, "_spawn_ffmpeg", counting)
+    return calls
+
+
+@requires_ffmpeg
+def test_segments_start_while_recording_with_one_decoder(monkeypatch, spawned):
+    monkeypatch.setattr(config, "STREAM_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(config, "STREAM_SEGMENT_SECONDS", 3)
+    monkeypatch.setattr(config, "STREAM_MAX_SEGMENT_SECONDS", 6)
+    monkeypatch.setattr(config, "VAD_ENABLED", True)
+    audio = _recording([("voce", 3.5), ("silenzio", 1.0), ("voce", 3.5), ("silenzio", 1.0), ("voce", 2.0)])
+    stt = FakeSTT()
+
+    async def scenario():
+        transcriber = IncrementalTranscriber(stt)
+        largest_pending = 0
+        for i in range(0, len(audio), 1024):
+            transcriber.feed(audio[i:i + 1024])
+            await asyncio.sleep(0.01)
+            largest_pending = max(largest_pending, len(transcriber._decoder.pcm))
+        started = transcriber.segments_started
+        text = await transcriber.finish()
+        return started, largest_pending, text
+
+    started, largest_pending, text = asyncio.run(scenario())
+
+    assert started >= 1  # almeno un segmento trascritto prima della fine
+    assert text.startswith("segmento 1")
+    # Un solo decoder per tutta la registrazione (gli altri processi sono encoder dei segmenti)
+    decoders = [args for args in spawned if args[:2] == ["-i", "pipe:0"]]
+    assert len(decoders) == 1
+    # Il PCM già tagliato viene scartato: mai più di un segmento massimo più il margine
+    assert largest_pending <= (6 + 1) * SAMPLE_RATE * SAMPLE_WIDTH
+
+
+def test_falls_back_to_whole_blob_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(config, "FFMPEG_BINARY", "/nonexistent/ffmpeg")
+    received = []
+
+    async def stt(audio):
+        received.append(audio)
+        return "risposta completa"
+
+    async def scenario():
+        transcriber = IncrementalTranscriber(stt)
+        transcriber.feed(b"chunk-1")
+        transcriber.feed(b"chunk-2")
+        return await transcriber.finish()
+
+    assert asyncio.run(scenario()) == "risposta completa"
+    assert received == [b"chunk-1chunk-2"]
@@ -0,0 +1,142 @@
+"""
+Verifica che un'intervista possa proseguire su processi worker diversi
+quando STATE_BACKEND=file: la banca domande pubblicata da un worker è
+visibile agli altri (``sync_question_bank``) e due worker che gestiscono in
+parallelo i turni della stessa sessione, con ``session_lock`` e
+``save_state``, non perdono aggiornamenti.
+
+Solo i test con i veri ``InterviewStateAdapter`` richiedono le librerie NLP.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import pickle
+import sys
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+# Main non va importato a livello di modulo: i worker rieseguono questo
+# modulo e la configurazione va letta dopo _setup_env
+
+QUESTIONS = [{"id": f"q{i}", "Domanda": f"Domanda numero {i}."} for i in range(1, 21)]
+TURNS_PER_WORKER = 10
+
+
+class Session:
+    """Sessione minima: gli stessi campi che i turni leggono e modificano."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.idx = 0
+        self.turn_count = 0
+        self.answers = {}
+        self.user_responses = []
+
+
+def _setup_env(state_dir):
+    os.environ["STATE_BACKEND"] = "file"
+    os.environ["SHARED_STATE_DIR"] = state_dir
+    if BACK_END_ROOT not in sys.path:
+        sys.path.insert(0, BACK_END_ROOT)
+
+
+def _publish_worker(state_dir, questions, adapter):
+    """Worker che riceve l'upload delle domande, le pubblica e avvia la sessione."""
+    _setup_env(state_dir)
+    from Main.core.worker_state import DOMANDE, SCRIPT, metadata_processing_status, publish_bank, save_state
+
+    SCRIPT[:] = questions
+    DOMANDE[:] = [{"id": q["id"], "testo": q["Domanda"], "subtopics": []} for q in questions]
+    metadata_processing_status["total_questions"] = len(questions)
+    publish_bank()
+    if adapter:
+        from Main.application.interview_state_adapter_refactored import InterviewStateAdapter
+        save_state(InterviewStateAdapter("candidate", list(DOMANDE)))
+    else:
+        save_state(Session("candidate"))
+
+
+def _turn_worker(state_dir, turns, start):
+    """Worker che gestisce ``turns`` turni della sessione, come /transcribe."""
+    _setup_env(state_dir)
+    from Main.core.session_locks import session_lock
+    from Main.core.worker_state import DOMANDE, SESSIONS, save_state, sync_question_bank
+
+    async def turn(n):
+        async with session_lock("candidate", SESSIONS):
+            sync_question_bank()
+            session = SESSIONS["candidate"]
+            question = DOMANDE[session.idx]
+            # Il lavoro del turno (STT, analisi) avviene tra lettura e salvataggio
+            await asyncio.sleep(0.005)
+            session.answers[question["id"]] = f"risposta {os.getpid()}-{n}"
+            session.user_responses.append({"worker": os.getpid(), "text": question["testo"]})
+            session.turn_count += 1
+            session.idx += 1
+            save_state(session)
+
+    async def run():
+        start.wait(30)
+        for n in range(turns):
+            await turn(n)
+
+    asyncio.run(run())
+
+
+def _interview_across_workers(state_dir, adapter):
+    ctx = multiprocessing.get_context("spawn")
+    publisher = ctx.Process(target=_publish_worker, args=(state_dir, QUESTIONS, adapter))
+    publisher.start()
+    publisher.join(60)
+    assert publisher.exitcode == 0
+
+    # Entrambi i worker partono insieme: i turni si contendono il lock della sessione
+    start = ctx.Event()
+    workers = [ctx.Process(target=_turn_worker, args=(state_dir, TURNS_PER_WORKER, start)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(60)
+    assert [worker.exitcode for worker in workers] == [0, 0]
+
+    from Main.core.shared_state import FileSessionStore
+    session = FileSessionStore(state_dir)["candidate"]
+    total = 2 * TURNS_PER_WORKER
+    # Nessun turno perso: ogni worker ha ripreso la sessione salvata dall'altro
+    assert session.idx == total and session.turn_count == total
+    assert sorted(session.answers) == sorted(q["id"] for q in QUESTIONS[:total])
+    assert [item["text"] for item in session.user_responses] == [q["Domanda"] for q in QUESTIONS[:total]]
+    assert {item["worker"] for item in session.user_responses} == {worker.pid for worker in workers}
+    return session
+
+
+def test_interview_turns_across_parallel_worker_processes(tmp_path):
+    _interview_across_workers(str(tmp_path), adapter=False)
+
+
+def test_adapter_survives_pickle_round_trip():
+    pytest.importorskip("spacy")
+    pytest.importorskip("sentence_transformers")
+    from Main.application.interview_state_adapter_refactored import InterviewStateAdapter
+
+    session = InterviewStateAdapter("candidate", [{"id": "q1", "testo": "Parlami di te."}])
+    session.user_responses.append({"text": "Sono uno sviluppatore."})
+    copy = pickle.loads(pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL))
+    assert copy.session_id == session.session_id
+    assert copy.script == session.script
+    assert list(copy.user_responses) == [{"text": "Sono uno sviluppatore."}]
+
+
+def test_adapter_interview_across_parallel_worker_processes(tmp_path):
+    pytest.importorskip("spacy")
+    pytest.importorskip("sentence_transformers")
+    from Main.application.interview_state_adapter_refactored import InterviewStateAdapter
+
+    session = _interview_across_workers(str(tmp_path), adapter=True)
+    assert isinstance(session, InterviewStateAdapter)
@@ -0,0 +1,60 @@
+"""
+Verifica dei lock per sessione: i turni dello stesso utente sono serializzati,
+quelli di utenti diversi restano paralleli. Un turno annullato mentre aspetta
+il lock di file (client disconnesso) non lascia la sessione bloccata.
+"""
+
+import asyncio
+import fcntl
+import os
+import sys
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core.session_locks import session_lock
+from Main.core.shared_state import FileSessionStore
+
+
+async def _turn(user_id, log, store=None):
+    async with session_lock(user_id, store):
+        log.append(("start", user_id))
+        await asyncio.sleep(0.05)
+        log.append(("end", user_id))
+
+
+@pytest.mark.asyncio
+async def test_same_session_serialized_other_sessions_parallel(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    log = []
+    await asyncio.gather(_turn("anna", log, store), _turn("anna", log, store), _turn("bruno", log, store))
+
+    anna = [event for event, user in log if user == "anna"]
+    assert anna == ["start", "end", "start", "end"]
+    # bruno inizia prima che il primo turno di anna finisca
+    assert log.index(("start", "bruno")) < log.index(("end", "anna"))
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leave_file_locked(tmp_path):
+    store = FileSessionStore(str(tmp_path))
+    # Un altro worker tiene il lock della sessione
+    other_worker = open(store.lock_path("anna"), "a+")
+    fcntl.flock(other_worker.fileno(), fcntl.LOCK_EX)
+
+    waiter = asyncio.create_task(_turn("anna", [], store))
+    await asyncio.sleep(0.05)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    fcntl.flock(other_worker.fileno(), fcntl.LOCK_UN)
+    other_worker.close()
+
+    # Il turno successivo prende il lock senza restare bloccato
+    log = []
+    await asyncio.wait_for(_turn("anna", log, store), timeout=1)
+    assert log == [("start", "anna"), ("end", "anna")]
@@ -0,0 +1,62 @@
+"""
+Verifica dello scheduler STT: con tutti gli slot occupati i turni live passano
+prima dei job batch, e una richiesta che non può rispettare la scadenza viene
+rifiutata subito invece di restare in coda.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import config
+from Main.services.stt_scheduler import STTOverloadedError, STTScheduler, batch_priority
+
+
+@pytest.mark.asyncio
+async def test_live_turns_served_before_batch():
+    scheduler = STTScheduler(max_concurrency=1, max_queue=10)
+    release = asyncio.Event()
+    order = []
+
+    async def job(name, wait=False):
+        if wait:
+            await release.wait()
+        order.append(name)
+
+    async def batch_job(name):
+        with batch_priority():
+            await scheduler.run(job, name)
+
+    blocking = asyncio.create_task(scheduler.run(job, "primo", True))
+    await asyncio.sleep(0)
+    waiting = [asyncio.create_task(batch_job("batch")), asyncio.create_task(scheduler.run(job, "live"))]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocking, *waiting)
+
+    assert order == ["primo", "live", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_rejects_fast_when_deadline_cannot_be_met(monkeypatch):
+    monkeypatch.setattr(config, "STT_LIVE_DEADLINE_SECONDS", 1.0)
+    scheduler = STTScheduler(max_concurrency=1, max_queue=10)
+    scheduler._avg_service = 5.0  # il provider sta rispondendo in 5 secondi
+    release = asyncio.Event()
+
+    blocking = asyncio.create_task(scheduler.run(release.wait))
+    await asyncio.sleep(0)
+    with pytest.raises(STTOverloadedError) as excinfo:
+        await asyncio.wait_for(scheduler.run(asyncio.sleep, 0), timeout=0.5)
+    assert excinfo.value.retry_after >= 5.0
+
+    release.set()
+    await blocking
+    # Lo slot torna libero: la richiesta successiva passa senza attesa
+    await asyncio.wait_for(scheduler.run(asyncio.sleep, 0), timeout=0.5)
@@ -0,0 +1,74 @@
+"""
+Verifica della cache delle trascrizioni: richieste contemporanee per lo stesso
+audio producono una sola trascrizione, la disconnessione di chi l'ha avviata
+non la annulla per gli altri, e le voci scadono dopo il TTL (anche su disco).
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.services import transcript_cache as transcript_cache_module
+from Main.services.transcript_cache import TranscriptCache
+
+
+class SlowTranscriber:
+    def __init__(self, delay=0.1):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return "ho lavorato tre anni come sviluppatore"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_transcription(tmp_path):
+    cache = TranscriptCache(10, ttl=60, directory=str(tmp_path))
+    transcribe = SlowTranscriber()
+    texts = await asyncio.gather(*[cache.get_or_transcribe(b"audio", "whisper-1", "it", transcribe) for _ in range(5)])
+    assert set(texts) == {"ho lavorato tre anni come sviluppatore"}
+    assert transcribe.calls == 1
+
+    # Un'altra istanza (altro worker) la trova su disco
+    other = TranscriptCache(10, ttl=60, directory=str(tmp_path))
+    assert await other.get_or_transcribe(b"audio", "whisper-1", "it", SlowTranscriber()) == texts[0]
+
+
+@pytest.mark.asyncio
+async def test_leader_cancellation_does_not_abort_waiters():
+    cache = TranscriptCache(10, ttl=60)
+    transcribe = SlowTranscriber()
+    leader = asyncio.create_task(cache.get_or_transcribe(b"audio", "whisper-1", "it", transcribe))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(cache.get_or_transcribe(b"audio", "whisper-1", "it", transcribe))
+    await asyncio.sleep(0.01)
+
+    leader.cancel()  # il client che ha avviato la trascrizione si disconnette
+    assert await waiter == "ho lavorato tre anni come sviluppatore"
+    assert transcribe.calls == 1
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(transcript_cache_module.time, "time", lambda: clock[0])
+    cache = TranscriptCache(10, ttl=60, directory=str(tmp_path))
+    transcribe = SlowTranscriber(delay=0)
+
+    await cache.get_or_transcribe(b"audio", "whisper-1", "it", transcribe)
+    await cache.get_or_transcribe(b"audio", "whisper-1", "it", transcribe)
+    assert transcribe.calls == 1
+
+    clock[0] += 61
+    await cache.get_or_transcribe(b"audio", "whisper-1", "it", transcribe)
+    assert transcribe.calls == 2
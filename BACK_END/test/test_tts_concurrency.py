@@ -0,0 +1,370 @@
+"""
+Verifica che /tts/speak non blocchi il loop: con un client Polly finto (lento
+e sincrono come boto3) richieste contemporanee si sovrappongono, entro il
+limite di sintesi contemporanee del pool dedicato. In streaming il primo
+blocco arriva prima della fine della sintesi e l'audio completo va in cache;
+le frasi di un prompt lungo vengono sintetizzate in parallelo e inviate in
+ordine. La pre-sintesi della banca domande mette in cache ogni frase una volta
+e non blocca il pool di Polly in attesa di una sintesi live della stessa frase.
+L'audio registrato per ID è servito con ETag, 304 e richieste Range (con
+``zerocopysend`` il server riceve il file aperto).
+Richieste identiche contemporanee producono una sola chiamata a Polly.
+I client POST che accettano audio lo ricevono in binario invece che in base64;
+``text_to_speech`` (base64) passa dalla stessa sintesi in cache senza bloccare il loop.
+Le risposte in streaming occupano lo slot di ammissione fino alla fine del corpo.
+Una sintesi lenta viene superata dalla richiesta extra (hedging).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import io
+import os
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+from botocore.response import StreamingBody
+from fastapi import FastAPI
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core import config
+from Main.core.admission import controller as admission_controller
+from Main.core.file_responses import AudioFileResponse
+from Main.api import routes_tts
+from Main.services import tts_service
+from Main.services.audio_cache import AudioCache
+
+SYNTHESIS_SECONDS = 0.3
+
+
+class StubPolly:
+    """Client Polly finto: sintesi bloccante di durata fissa."""
+
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def synthesize_speech(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(SYNTHESIS_SECONDS)
+        with self._lock:
+            self.active -= 1
+        audio = b"ID3" + kwargs["Text"].encode() * 10
+        return {"AudioStream": StreamingBody(io.BytesIO(audio), len(audio))}
+
+
+class SlowStream(io.RawIOBase):
+    """AudioStream che produce un blocco ogni ``delay`` secondi."""
+
+    def __init__(self, blocks, delay):
+        self.blocks = list(blocks)
+        self.delay = delay
+
+    def read(self, size=-1):
+        if not self.blocks:
+            return b""
+        time.sleep(self.delay)
+        return self.blocks.pop(0)
+
+
+@pytest.fixture
+def polly(monkeypatch, tmp_path):
+    stub = StubPolly()
+    monkeypatch.setattr(config, "DEVELOPMENT_MODE", False)
+    monkeypatch.setattr(config, "AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setattr(config, "AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setattr(tts_service, "_polly_client", stub)
+    monkeypatch.setattr(tts_service, "_polly_executor", ThreadPoolExecutor(max_workers=2))
+    monkeypatch.setattr(tts_service, "audio_cache", AudioCache(str(tmp_path), max_bytes=1 << 20))
+    return stub
+
+
+@pytest.mark.asyncio
+async def test_concurrent_speak_requests_overlap(polly):
+    app = FastAPI()
+    app.include_router(routes_tts.router, prefix="/api/tts")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        t0 = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.get("/api/tts/speak", params={"text": f"Domanda {i}", "voice_id": "Bianca"},
+                       headers={"Authorization": f"u{i}"})
+            for i in range(4)
+        ])
+        elapsed = time.perf_counter() - t0
+
+    assert all(r.status_code == 200 and r.content.startswith(b"ID3") for r in responses)
+    assert polly.max_active == 2  # sovrapposte, ma entro il limite del pool
+    assert elapsed < 4 * SYNTHESIS_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_stream_relays_first_chunk_before_synthesis_ends(polly, monkeypatch):
+    blocks = [b"A" * 100] * 5
+    monkeypatch.setattr(polly, "synthesize_speech",
+                        lambda **kwargs: {"AudioStream": StreamingBody(SlowStream(blocks, 0.1), 500)})
+    monkeypatch.setattr(tts_service, "STREAM_CHUNK_SIZE", 100)
+
+    t0 = time.perf_counter()
+    arrivals = []
+    async for chunk in tts_service.stream_speech("Benvenuto al colloquio.", "Bianca"):
+        arrivals.append((time.perf_counter() - t0, chunk))
+
+    assert b"".join(chunk for _, chunk in arrivals) == b"A" * 500
+    assert arrivals[0][0] < arrivals[-1][0] / 2  # il primo blocco non aspetta l'ultimo
+    key = tts_service.polly_cache_key("Benvenuto al colloquio.", "Bianca")
+    assert tts_service.audio_cache.get(key) == b"A" * 500
+
+
+@pytest.mark.asyncio
+async def test_sentences_synthesized_in_parallel_and_streamed_in_order(polly, monkeypatch):
+    def synthesize(**kwargs):
+        # le frasi successive sono più veloci: l'ordine non dipende da chi finisce prima
+        number = int(kwargs["Text"].split("frase numero ")[1][0])
+        time.sleep(0.2 - number * 0.05)
+        audio = f"[{number}]".encode()
+        return {"AudioStream": StreamingBody(io.BytesIO(audio), len(audio))}
+
+    monkeypatch.setattr(polly, "synthesize_speech", synthesize)
+    text = " ".join(f"Questa è la frase numero {i}." for i in range(3))
+
+    t0 = time.perf_counter()
+    audio = b"".join([chunk async for chunk in tts_service.stream_speech(text, "Bianca")])
+    assert audio == b"[0][1][2]"
+    assert time.perf_counter() - t0 < 0.35  # non 0.2 + 0.15 + 0.1 in sequenza
+
+    # Ogni frase è in cache da sola: un prompt che la ripete non la sintetizza di nuovo
+    key = tts_service.polly_cache_key("Questa è la frase numero 1.", "Bianca")
+    assert tts_service.audio_cache.get(key) == b"[1]"
+
+
+def test_presynthesis_fills_cache_once(polly):
+    questions = ["Parlami di te e del tuo percorso.", "Quali sono i tuoi obiettivi professionali?"]
+    updates = []
+    counts = tts_service.presynthesize(questions, ["Bianca"], updates.append)
+    assert counts == {"total": 2, "cached": 0, "synthesized": 2, "failed": 0}
+    assert updates[-1]["synthesized"] == 2
+    for question in questions:
+        assert tts_service.audio_cache.contains(tts_service.polly_cache_key(question, "Bianca"))
+
+    again = tts_service.presynthesize(questions, ["Bianca"])
+    assert again["cached"] == 2 and again["synthesized"] == 0
+
+
+def test_presynthesis_does_not_block_polly_pool_on_live_flight(polly, monkeypatch):
+    # Pool di un solo thread e una sintesi live della stessa frase già reclamata,
+    # il cui lavoro è accodato nel pool: la pre-sintesi non deve occupare il
+    # thread in attesa di quel lavoro
+    monkeypatch.setattr(tts_service, "_polly_executor", ThreadPoolExecutor(max_workers=1))
+    questions = ["Parlami di te e del tuo percorso.", "Quali sono i tuoi obiettivi professionali?"]
+    key = tts_service.polly_cache_key(questions[0], "Bianca")
+    call, leader = tts_service._synthesis_flights.claim(key)
+    assert leader
+
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(tts_service.presynthesize(questions, ["Bianca"])))
+    worker.start()
+    time.sleep(0.05)
+    tts_service._polly_executor.submit(tts_service._synthesis_flights.resolve, key, call, b"live")
+    worker.join(timeout=3)
+
+    assert not worker.is_alive()
+    assert result == {"total": 2, "cached": 0, "synthesized": 2, "failed": 0}
+    assert polly.calls == 1  # la frase in sintesi live non viene ripetuta
+
+
+@pytest.mark.asyncio
+async def test_audio_by_id_is_cacheable_and_supports_range(polly):
+    text = "Benvenuto all'intervista. Parlami del tuo ultimo progetto."
+    audio_id = await tts_service.register_speech(text, "Bianca")
+    assert text not in audio_id
+
+    app = FastAPI()
+    app.include_router(routes_tts.router, prefix="/api/tts")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        full = await client.get(f"/api/tts/audio/{audio_id}")
+        partial = await client.get(f"/api/tts/audio/{audio_id}", headers={"Range": "bytes=0-9"})
+        cached = await client.get(f"/api/tts/audio/{audio_id}", headers={"If-None-Match": f'"{audio_id}"'})
+        unknown = await client.get(f"/api/tts/audio/{'0' * 64}")
+
+    assert full.status_code == 200 and full.content.startswith(b"ID3")
+    assert full.headers["etag"] == f'"{audio_id}"'
+    assert "immutable" in full.headers["cache-control"]
+    assert partial.status_code == 206 and partial.content == full.content[:10]
+    assert partial.headers["content-range"] == f"bytes 0-9/{len(full.content)}"
+    assert cached.status_code == 304
+    assert unknown.status_code == 404
+
+
+async def _get_observing_slots(app, path, headers=()):
+    """GET ASGI diretto: stato, corpo e slot di ammissione attivi a ogni invio del corpo."""
+    sent, active = [], []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            active.append(admission_controller.snapshot()["active"])
+        sent.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [(k.encode(), v.encode()) for k, v in headers],
+             "client": ("127.0.0.1", 1234), "server": ("test", 80)}
+    await app(scope, receive, send)
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, body, active
+
+
+@pytest.mark.asyncio
+async def test_audio_by_id_serves_memory_tier_and_holds_slot_until_sent(polly, monkeypatch):
+    audio_id = await tts_service.register_speech("Parlami del tuo ultimo progetto.", "Bianca")
+    app = FastAPI()
+    app.include_router(routes_tts.router, prefix="/api/tts")
+
+    # Dal file: lo slot resta occupato mentre il corpo viene inviato
+    status, from_file, active = await _get_observing_slots(app, f"/api/tts/audio/{audio_id}")
+    assert status == 200 and from_file.startswith(b"ID3")
+    assert active and all(count == 1 for count in active)
+
+    monkeypatch.setattr(tts_service, "audio_cache", AudioCache(tts_service.audio_cache.directory,
+                                                               max_bytes=1 << 20, hot_bytes=1 << 20))
+    # Dalla memoria: nessun accesso al file, stessi header e Range
+    await tts_service.audio_cache.put_async(audio_id, from_file, "mp3", provider="polly")
+    monkeypatch.setattr(tts_service.audio_cache, "path", lambda key: pytest.fail("letto il file"))
+    status, partial, active = await _get_observing_slots(app, f"/api/tts/audio/{audio_id}",
+                                                        [("range", "bytes=2-5")])
+    assert status == 206 and partial == from_file[2:6]
+    assert active and all(count == 1 for count in active)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        full = await client.get(f"/api/tts/audio/{audio_id}")
+    assert full.content == from_file
+    assert full.headers["etag"] == f'"{audio_id}"' and "immutable" in full.headers["cache-control"]
+    assert admission_controller.snapshot()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_zerocopysend_receives_the_open_file(tmp_path):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(b"ID3" + bytes(range(100)))
+    sent = []
+
+    async def send(message):
+        if message["type"] == "http.response.zerocopysend":
+            # Il server usa sendfile sul file: deve essere ancora aperto
+            message["file"].seek(message["offset"])
+            message = {**message, "data": message["file"].read(message["count"])}
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "extensions": {"http.response.zerocopysend": {}}}
+    await AudioFileResponse(str(path), 103, "audio/mpeg", {}, (3, 12))(scope, None, send)
+
+    assert sent[0]["status"] == 206
+    assert sent[1]["data"] == bytes(range(10))
+
+
+@pytest.mark.asyncio
+async def test_text_to_speech_uses_cached_synthesis_without_blocking(polly):
+    ticks = []
+
+    async def ticker():
+        for _ in range(10):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    encoded, _ = await asyncio.gather(tts_service.text_to_speech("Parlami di te.", "Bianca"), ticker())
+    assert base64.b64decode(encoded).startswith(b"ID3")
+    # Il loop ha continuato a girare durante la sintesi
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < SYNTHESIS_SECONDS
+    assert await tts_service.text_to_speech("Parlami di te.", "Bianca") == encoded
+    assert polly.calls == 1
+
+
+def test_audio_id_changes_with_normalizer_version(monkeypatch):
+    before = tts_service.polly_cache_key("Ho un meeting alle 15:30.", "Bianca")
+    monkeypatch.setattr(tts_service, "normalizer_version", lambda: "nuove-regole")
+    assert tts_service.polly_cache_key("Ho un meeting alle 15:30.", "Bianca") != before
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_requests_share_one_synthesis(polly):
+    text = "Benvenuto, iniziamo il colloquio."
+    speak = [tts_service.speak_audio(text, "Bianca") for _ in range(5)]
+    results = await asyncio.gather(*speak, *[_collect(text) for _ in range(3)])
+    assert len(set(results)) == 1
+    assert polly.calls == 1
+
+
+async def _collect(text):
+    return b"".join([chunk async for chunk in tts_service.stream_speech(text, "Bianca")])
+
+
+@pytest.mark.asyncio
+async def test_post_speak_returns_binary_when_audio_accepted(polly):
+    app = FastAPI()
+    app.include_router(routes_tts.router, prefix="/api/tts")
+    body = {"text": "Raccontami una sfida che hai superato.", "voice_id": "Bianca"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        as_json = await client.post("/api/tts/speak", json=body)
+        as_audio = await client.post("/api/tts/speak", json=body, headers={"Accept": "audio/mpeg"})
+
+    assert as_audio.headers["content-type"] == "audio/mp3"
+    assert as_audio.content == base64.b64decode(as_json.json()["audio_base64"])
+
+
+@pytest.mark.asyncio
+async def test_stream_holds_admission_slot_until_body_ends(polly, monkeypatch):
+    active = []
+
+    class ObservedStream(SlowStream):
+        def read(self, size=-1):
+            # Letto mentre il corpo della risposta è in invio
+            active.append(admission_controller.snapshot()["active"])
+            return super().read(size)
+
+    monkeypatch.setattr(polly, "synthesize_speech",
+                        lambda **kwargs: {"AudioStream": StreamingBody(ObservedStream([b"A" * 100] * 4, 0.05), 400)})
+    monkeypatch.setattr(tts_service, "STREAM_CHUNK_SIZE", 100)
+    app = FastAPI()
+    app.include_router(routes_tts.router, prefix="/api/tts")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/tts/stream", json={"text": "Benvenuto.", "voice_id": "Bianca"})
+
+    assert response.content == b"A" * 400
+    assert active and all(count == 1 for count in active)
+    assert admission_controller.snapshot()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_polly_segment_is_hedged(polly, monkeypatch):
+    monkeypatch.setattr(config, "HEDGING_ENABLED", True)
+    monkeypatch.setattr(config, "HEDGE_MAX_DELAY", 0.05)
+    monkeypatch.setattr(config, "HEDGE_MAX_EXTRA_RATIO", 1.0)
+    delays = [1.0, 0.01]
+
+    def synthesize(**kwargs):
+        time.sleep(delays.pop(0))
+        return {"AudioStream": StreamingBody(io.BytesIO(b"ID3hedge"), 8)}
+
+    monkeypatch.setattr(polly, "synthesize_speech", synthesize)
+    t0 = time.perf_counter()
+    assert await tts_service.speak_audio("Parlami del tuo ultimo progetto.", "Bianca") == b"ID3hedge"
+    assert time.perf_counter() - t0 < 0.5  # non attende la prima richiesta lenta
@@ -0,0 +1,109 @@
+"""
+Verifica del percorso critico di un turno: ``StageTimings`` misura le fasi,
+``run_in_background`` esegue il lavoro rimandato registrandone gli errori, e
+la riflessione rimandata si divide in snapshot, chiamata LLM e unione, così
+la chiamata può avvenire senza il lock della sessione.
+"""
+
+import asyncio
+import os
+import pickle
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import interviewer_reflection
+from Main.core import metrics
+from Main.core.turn_pipeline import StageTimings, run_in_background
+
+
+def test_stage_timings_accumulate_and_report_milliseconds(monkeypatch):
+    observed = []
+    monkeypatch.setattr(metrics, "observe", lambda name, value: observed.append(name))
+
+    timings = StageTimings()
+    with timings.stage("stt"):
+        time.sleep(0.02)
+    with timings.stage("next_question"):
+        time.sleep(0.01)
+    with timings.stage("stt"):
+        time.sleep(0.02)
+    result = timings.as_dict()
+
+    assert list(result) == ["stt", "next_question", "critical_path"]
+    assert result["stt"] >= 40
+    # Arrotondamento a 0.1 ms per fase
+    assert result["critical_path"] >= result["stt"] + result["next_question"] - 0.1
+    assert observed == ["turn_stage_stt_seconds", "turn_stage_next_question_seconds", "turn_stage_stt_seconds"]
+
+
+@pytest.mark.asyncio
+async def test_background_errors_are_counted_not_raised(monkeypatch):
+    counted = []
+    monkeypatch.setattr(metrics, "increment", lambda name, value=1: counted.append(name))
+
+    async def failing():
+        raise RuntimeError("LLM non disponibile")
+
+    await run_in_background("reflection", failing())
+    assert counted == ["turn_background_reflection_errors"]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" - punto chiave "))])
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(interviewer_reflection, "client", fake)
+    return fake
+
+
+def _due_reflection():
+    rm = interviewer_reflection.InterviewerReflection()
+    rm.add_turn("user", "Ho lavorato tre anni come sviluppatore backend. " * 5, defer_reflection=True)
+    assert rm.reflection_due
+    return rm
+
+
+def test_deferred_reflection_merges_into_reloaded_state(llm):
+    rm = _due_reflection()
+    snapshot = rm.reflection_snapshot()
+
+    # Durante la chiamata (senza lock) arriva un altro turno e lo stato viene
+    # salvato e riletto dallo store
+    summary = rm.summarize(snapshot)
+    rm.add_turn("user", "Ultimamente mi occupo di code di messaggi.", defer_reflection=True)
+    reloaded = pickle.loads(pickle.dumps(rm))
+
+    assert reloaded.merge_reflection(snapshot, summary)
+    assert reloaded.reflections[-1] == "**Reflection 1:**\n- punto chiave"
+    # Il turno arrivato durante la chiamata resta materiale nuovo
+    assert reloaded._chars_since_last == len("Ultimamente mi occupo di code di messaggi.")
+    assert not reloaded.reflection_due
+    assert reloaded.reflection_snapshot() is None
+    assert len(llm.prompts) == 1
+
+
+def test_stale_reflection_is_discarded(llm):
+    rm = _due_reflection()
+    first = rm.reflection_snapshot()
+    second = rm.reflection_snapshot()
+
+    assert rm.merge_reflection(first, rm.summarize(first))
+    assert not rm.merge_reflection(second, rm.summarize(second))
+    assert rm.reflections.total == 1
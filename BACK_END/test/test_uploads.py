@@ -0,0 +1,71 @@
+"""
+Verifica dei limiti sugli upload: un corpo dichiarato troppo grande viene
+rifiutato con 413 senza essere letto, uno chunked appena supera il limite;
+i file entro il limite vengono copiati a blocchi.
+"""
+
+import io
+import os
+import sys
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, UploadFile
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+
+from Main.core.uploads import UploadLimitMiddleware, copy_upload, upload_digest
+
+LIMIT = 64 * 1024
+handled = []
+app = FastAPI()
+app.add_middleware(UploadLimitMiddleware, limits={"/upload": LIMIT})
+
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...)):
+    handled.append(file.filename)
+    destination = io.BytesIO()
+    size = await copy_upload(file, destination, LIMIT)
+    return {"size": size, "sha256": await upload_digest(file)}
+
+
+def client():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_small_upload_is_accepted():
+    async with client() as c:
+        response = await c.post("/upload", files={"file": ("a.webm", b"x" * 1000)})
+    assert response.status_code == 200
+    assert response.json()["size"] == 1000
+
+
+@pytest.mark.asyncio
+async def test_declared_oversized_body_rejected_before_handler():
+    handled.clear()
+    async with client() as c:
+        response = await c.post("/upload", files={"file": ("a.webm", b"x" * (LIMIT + 1))})
+    assert response.status_code == 413
+    assert handled == []
+
+
+@pytest.mark.asyncio
+async def test_chunked_oversized_body_rejected():
+    handled.clear()
+
+    async def body():
+        yield (b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.webm"\r\n'
+               b"Content-Type: audio/webm\r\n\r\n")
+        for _ in range(8):
+            yield b"x" * (LIMIT // 4)
+        yield b"\r\n--b--\r\n"
+
+    async with client() as c:
+        response = await c.post("/upload", content=body(),
+                                headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+    assert handled == []
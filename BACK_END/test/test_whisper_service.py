@@ -0,0 +1,38 @@
+"""
+Verifica dell'upload a Whisper: nome del file e MIME seguono il contenitore
+reale dell'audio (l'API riconosce il formato dall'estensione), sia per i
+bytes in memoria sia per un file-like, che resta alla posizione di partenza.
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+BACK_END_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACK_END_ROOT not in sys.path:
+    sys.path.insert(0, BACK_END_ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from Main.services.whisper_service import _named_upload
+
+
+@pytest.mark.parametrize("header, filename, content_type", [
+    (b"\x1aE\xdf\xa3\x9fB\x86\x81", "answer.webm", "audio/webm"),
+    (b"OggS\x00\x02\x00\x00", "answer.ogg", "audio/ogg"),
+    (b"\x00\x00\x00\x1cftypM4A ", "answer.mp4", "audio/mp4"),
+    (b"RIFF\x24\x08\x00\x00WAVE", "answer.wav", "audio/wav"),
+    (b"ID3\x04\x00\x00\x00\x00", "answer.mp3", "audio/mpeg"),
+    (b"\x00\x01\x02\x03", "answer.webm", "audio/webm"),
+])
+def test_upload_name_follows_container(header, filename, content_type):
+    audio = header + b"\x00" * 32
+    assert _named_upload(audio) == (filename, audio, content_type)
+
+
+def test_file_like_upload_is_left_at_its_position():
+    spool = io.BytesIO(b"OggS" + b"\x00" * 32)
+    name, upload, content_type = _named_upload(spool)
+    assert (name, content_type) == ("answer.ogg", "audio/ogg")
+    assert upload is spool and spool.tell() == 0
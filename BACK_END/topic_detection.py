@@ -60,6 +60,7 @@ from Main.services.nlp_services import NLPProcessor
 processor = NLPProcessor()
 
 from Main.core import config
+from Main.core.hedging import hedger
 from openai import OpenAI, AsyncOpenAI
 import openai
 
@@ -488,14 +489,15 @@ def covered_topics_with_gpt(user_text: str, topics: List[str], subtopic) -> Tupl
 
         logger.debug("LANCIO DEL PROMPT")
         # Invio del prompt a GPT-4
+        # Chiamata sul percorso critico del turno: con hedging se l'API tarda
         client = OpenAI()
-        response = client.chat.completions.create(
+        response = hedger("llm").run_sync(lambda: client.chat.completions.create(
             model="gpt-3.5-turbo",  # oppure "gpt-3.5-turbo" per un'alternativa più economica
             messages=[
                 {"role": "user", "content": prompt}
             ],
             temperature=0  # Imposta a 0 per massima coerenza e zero creatività
-        )
+        ))
         # Estrai la risposta
         output = response.choices[0].message.content
         logger.debug(f"Risposta output: {output}")
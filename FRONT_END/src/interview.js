@@ -15,6 +15,9 @@ const illustration = document.getElementById("illustration");
 // Stato globale minimale
 let mediaRecorder, audioCtx, analyser;
 let chunks = [];
+let answerSocket = null;          // WebSocket per l'invio in streaming della risposta
+let sentChunks = 0;               // chunk già inviati sul WebSocket
+let answerKey = null;             // chiave di idempotenza della risposta corrente
 let isListening = false;
 let isAISpeaking = false;
 let sessionUserId = null;  // Memorizza l'ID utente per la sessione corrente
@@ -677,14 +680,18 @@ async function startRecording() {
     /* MediaRecorder → blob con timeslice per invio progressivo */
     mediaRecorder = new MediaRecorder(stream, { mimeType: "audio/webm" });
     chunks = [];
-    mediaRecorder.ondataavailable = (e) => chunks.push(e.data);
-    mediaRecorder.onstop = uploadRecording;
+    sentChunks = 0;
+    answerKey = (crypto.randomUUID && crypto.randomUUID()) || String(Date.now());
+    answerSocket = openAnswerSocket();
+    mediaRecorder.ondataavailable = (e) => {
+      chunks.push(e.data);
+      flushChunksToSocket();
+    };
+    mediaRecorder.onstop = finishAnswer;
     
-    // Usa timeslice per registrare in blocchi di 1 secondo
-    // Questo consente di inviare l'audio più velocemente e iniziare a trascrivere prima
-    // Commentato per ora in attesa di implementare l'upload progressivo nel backend
-    // mediaRecorder.start(1000); // chunk ogni 1 secondo
-    mediaRecorder.start();
+    // Usa timeslice per registrare in blocchi di 1 secondo: i chunk vengono
+    // inviati al backend mentre il candidato parla e trascritti a segmenti
+    mediaRecorder.start(1000); // chunk ogni 1 secondo
 
     /* Aggiorna UI per lo stato di registrazione */
     isListening = true;
@@ -767,7 +774,58 @@ function resetUI() {
 }
 
 /* ------------------------------------------------------------
- * 3.  UPLOAD  (blob + user_id) → ricevi audio_url
+ * 3a. STREAMING  (chunk via WebSocket durante la registrazione)
+ * -----------------------------------------------------------*/
+function openAnswerSocket() {
+  try {
+    const wsUrl = BACKEND.replace(/^http/, 'ws') +
+      '/interview/transcribe/stream?user_id=' + encodeURIComponent(ensureSessionUserId());
+    const ws = new WebSocket(wsUrl);
+    ws.onopen = flushChunksToSocket;  // invia i chunk registrati prima dell'apertura
+    return ws;
+  } catch (err) {
+    console.warn("WebSocket non disponibile, uso l'upload classico:", err);
+    return null;
+  }
+}
+
+function flushChunksToSocket() {
+  if (answerSocket?.readyState !== WebSocket.OPEN) return;
+  while (sentChunks < chunks.length) {
+    answerSocket.send(chunks[sentChunks++]);
+  }
+}
+
+// Fine risposta: chiude lo stream e attende la prossima domanda;
+// se lo streaming non è riuscito ricade sull'upload del blob completo
+async function finishAnswer() {
+  const ws = answerSocket;
+  answerSocket = null;
+  if (ws && ws.readyState === WebSocket.OPEN) {
+    try {
+      while (sentChunks < chunks.length) ws.send(chunks[sentChunks++]);
+      const data = await new Promise((resolve, reject) => {
+        ws.onmessage = (ev) => resolve(JSON.parse(ev.data));
+        ws.onerror = () => reject(new Error("errore WebSocket"));
+        ws.onclose = () => reject(new Error("WebSocket chiuso"));
+        ws.send(JSON.stringify({ event: "end", idempotency_key: answerKey }));
+      });
+      if (data.status !== "error") {
+        await handleTurnResponse(data);
+        return;
+      }
+      console.warn("Streaming rifiutato dal backend, uso l'upload classico:", data.detail);
+    } catch (err) {
+      console.warn("Streaming non riuscito, uso l'upload classico:", err);
+    }
+  } else {
+    ws?.close();
+  }
+  await uploadRecording();
+}
+
+/* ------------------------------------------------------------
+ * 3b. UPLOAD  (blob + user_id) → ricevi audio_url
  * -----------------------------------------------------------*/
 async function uploadRecording() {
   const blob = new Blob(chunks, { type: "audio/webm" });
@@ -775,6 +833,8 @@ async function uploadRecording() {
   form.append("audio", blob, "answer.webm");
   form.append("user_id", ensureSessionUserId()); // Usa la funzione helper
   form.append("audio_only", "true"); // chiedi solo audio, niente testo
+  // Stessa chiave dello streaming: se il turno era già stato elaborato non viene ripetuto
+  if (answerKey) form.append("idempotency_key", answerKey);
   
   // Ottieni token dalla sessionStorage o genera uno fittizio se non esiste
   let token = sessionStorage.getItem('jwt_token');
@@ -805,7 +865,18 @@ async function uploadRecording() {
     
     const res = await fetch(`${BACKEND}/interview/transcribe`, { method: "POST", body: form });
     const data = await res.json(); // { audio_url, type }
+    await handleTurnResponse(data);
+
+  } catch (err) {
+    console.error("Upload error:", err);
+    alert("Errore backend: vedi console.");
+    resetUI();
+  }
+}
 
+// Riproduce la prossima domanda restituita dal backend e riavvia la registrazione
+async function handleTurnResponse(data) {
+  try {
     console.log("➡️  nuova domanda (" + data.type + ")");
     console.log(BACKEND + data.audio_url)
     console.log(paused, currentAudio)
@@ -845,7 +916,7 @@ async function uploadRecording() {
     await startRecording();
 
   } catch (err) {
-    console.error("Upload error:", err);
+    console.error("Errore nella riproduzione della domanda:", err);
     alert("Errore backend: vedi console.");
     resetUI();
   }